@@ -6,8 +6,11 @@ from typing import Callable, Optional
 from urllib.parse import parse_qs, urlparse
 
 from app.gmail.oauth import exchange_code_for_tokens, get_authorization_url, load_tokens
+from app.gmail.quota import quota_limiter
+from app.imap.yahoo_client import transfer_totals
 from app.log.logger import get_recent_log_lines, log_event
 from app.notify import alerts
+from app.sync.retry_worker import delivery_latency_summary
 
 
 def _parse_iso(ts: Optional[str]) -> Optional[datetime]:
@@ -112,6 +115,9 @@ def _fetch_status(conn, master_key: bytes) -> dict:
         "last_delete_error": last_delete_error,
         "mailboxes": mailboxes,
         "alerts": recent_alerts,
+        "imap_transfer": transfer_totals(),
+        "gmail_quota": quota_limiter().stats(),
+        "delivery_latency": delivery_latency_summary(),
     }
 
 
@@ -121,6 +127,24 @@ def _row_to_text(row) -> str:
     return " | ".join(str(value) for value in row)
 
 
+def _transfer_to_text(totals: dict) -> str:
+    return (
+        f"in {totals['wire_bytes_in']} wire / {totals['decoded_bytes_in']} decoded bytes, "
+        f"out {totals['wire_bytes_out']} wire / {totals['decoded_bytes_out']} decoded bytes"
+    )
+
+
+def _quota_to_text(stats: dict) -> str:
+    return f"{stats['rate']} of {stats['max_rate']} units/s, throttled {stats['throttled']} times"
+
+
+def _latency_to_text(summary: dict) -> str:
+    return "\n".join(
+        f"{bucket} | {stats['count']} delivered | avg {stats['avg_seconds']}s | max {stats['max_seconds']}s"
+        for bucket, stats in sorted(summary.items())
+    )
+
+
 def _render_page(status: dict, logs: list[str], auth_url: Optional[str], message: Optional[str]) -> bytes:
     logs_text = "\n".join(logs)
     alerts_text = "\n".join(" | ".join(str(v) for v in row) for row in status["alerts"])
@@ -153,11 +177,17 @@ def _render_page(status: dict, logs: list[str], auth_url: Optional[str], message
       <div><span class="label">Last Yahoo delete:</span> {html.escape(_row_to_text(status["last_delete"]))}</div>
       <div><span class="label">Last error:</span> {html.escape(_row_to_text(status["last_error"]))}</div>
       <div><span class="label">Last Yahoo delete error:</span> {html.escape(_row_to_text(status["last_delete_error"]))}</div>
+      <div><span class="label">IMAP transfer:</span> {html.escape(_transfer_to_text(status["imap_transfer"]))}</div>
+      <div><span class="label">Gmail quota:</span> {html.escape(_quota_to_text(status["gmail_quota"]))}</div>
     </div>
     <div class="section">
       <h2>Mailbox health</h2>
       <pre>{html.escape(mailbox_text)}</pre>
     </div>
+    <div class="section">
+      <h2>Delivery latency by size</h2>
+      <pre>{html.escape(_latency_to_text(status["delivery_latency"]))}</pre>
+    </div>
     <div class="section">
       <h2>OAuth</h2>
       <form method="post" action="/oauth_url">
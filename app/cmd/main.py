@@ -1,3 +1,4 @@
+import asyncio
 import os
 import sys
 import time
@@ -5,14 +6,19 @@ import time
 from app.config.config import ConfigError, config_summary, load_config
 from app.crypto.secretbox import load_master_key
 from app.gmail.labels import ensure_label, get_system_label_ids
+from app.gmail.mirror import GmailMirror
 from app.gmail.oauth import OAuthError, exchange_code_for_tokens, get_authorization_url
+from app.gmail.quota import configure_quota
 from app.gmail.service_manager import GmailServiceManager
+from app.imap.async_client import AsyncYahooIMAPClient
 from app.imap.mailbox_watcher import discover_mailboxes
 from app.imap.yahoo_client import YahooIMAPClient, load_or_store_app_password
 from app.log.logger import get_logger, log_event
 from app.notify.manager import AlertManager
 from app.store.db import connect
 from app.store.migrations import apply_migrations
+from app.store.spool import RFC822Spool, default_spool_dir
+from app.sync.async_orchestrator import run_async
 from app.sync.orchestrator import run
 from app.admin.server import start_admin_server
 
@@ -41,6 +47,7 @@ def main() -> int:
 
     logger = get_logger("y2g", config.log_level)
     log_event(logger, "startup", "starting yahoo2gmail-forwarder", **config_summary(config))
+    configure_quota(config.gmail_quota_units_per_second)
 
     master_key = load_master_key(config.app_master_key)
     conn = connect(config.sqlite_path)
@@ -139,6 +146,7 @@ def main() -> int:
             config.yahoo_imap_port,
             config.yahoo_email,
             app_password,
+            compress=config.yahoo_imap_compress,
         )
         client.connect()
         return client
@@ -153,8 +161,50 @@ def main() -> int:
 
     log_event(logger, "mailboxes", "watching mailboxes", mailboxes=watch_mailboxes)
 
+    spool = None
+    if config.spool_max_mb > 0:
+        spool = RFC822Spool(default_spool_dir(config.sqlite_path), config.spool_max_mb * 1024 * 1024)
+    mirror = GmailMirror(account_id, "me") if config.gmail_mirror_enabled else None
+
     conn.close()
 
+    if config.orchestrator_mode == "asyncio":
+
+        def async_imap_client_factory():
+            return AsyncYahooIMAPClient(
+                config.yahoo_imap_host,
+                config.yahoo_imap_port,
+                config.yahoo_email,
+                app_password,
+            )
+
+        asyncio.run(
+            run_async(
+                account_id,
+                imap_client_factory,
+                async_imap_client_factory,
+                service_manager,
+                "me",
+                label_id,
+                config.deliver_to_inbox,
+                system_labels["INBOX"],
+                system_labels["UNREAD"],
+                system_labels["SENT"],
+                config.gmail_delivery_mode,
+                watch_mailboxes,
+                config.yahoo_replay_window_uids,
+                logger=logger,
+                conn_factory=lambda: connect(config.sqlite_path),
+                alert_manager=alert_manager,
+                discovery_mode=config.yahoo_discovery_mode,
+                spool=spool,
+                imap_pool_size=config.yahoo_imap_pool_size,
+                delivery_concurrency=config.gmail_delivery_concurrency,
+                mirror=mirror,
+            )
+        )
+        return 0
+
     run(
         account_id,
         imap_client_factory,
@@ -171,6 +221,13 @@ def main() -> int:
         logger=logger,
         conn_factory=lambda: connect(config.sqlite_path),
         alert_manager=alert_manager,
+        discovery_mode=config.yahoo_discovery_mode,
+        spool=spool,
+        imap_pool_size=config.yahoo_imap_pool_size,
+        watch_mode=config.yahoo_watch_mode,
+        imap_standby=config.yahoo_imap_standby,
+        delivery_concurrency=config.gmail_delivery_concurrency,
+        mirror=mirror,
     )
     return 0
 
@@ -10,14 +10,24 @@ class AppConfig:
     yahoo_imap_host: str
     yahoo_imap_port: int
     yahoo_replay_window_uids: int
+    yahoo_discovery_mode: str
+    yahoo_imap_pool_size: int
+    yahoo_imap_compress: bool
+    yahoo_imap_standby: bool
+    yahoo_watch_mode: str
+    orchestrator_mode: str
     gmail_oauth_client_id: str
     gmail_oauth_client_secret: str
     gmail_oauth_redirect_uri: str
     gmail_label: str
     deliver_to_inbox: bool
     gmail_delivery_mode: str
+    gmail_delivery_concurrency: int
+    gmail_quota_units_per_second: int
+    gmail_mirror_enabled: bool
     watch_mailboxes: Optional[List[str]]
     sqlite_path: str
+    spool_max_mb: int
     app_master_key: str
     log_level: str
     admin_enabled: bool
@@ -96,9 +106,32 @@ def load_config() -> AppConfig:
     gmail_delivery_mode = (_get_env("GMAIL_DELIVERY_MODE", "insert") or "insert").strip().lower()
     if gmail_delivery_mode not in {"insert", "import"}:
         raise ConfigError("GMAIL_DELIVERY_MODE must be 'insert' or 'import'")
+    gmail_delivery_concurrency = _get_int("GMAIL_DELIVERY_CONCURRENCY", 4)
+    if gmail_delivery_concurrency < 1:
+        raise ConfigError("GMAIL_DELIVERY_CONCURRENCY must be at least 1")
+    gmail_quota_units_per_second = _get_int("GMAIL_QUOTA_UNITS_PER_SECOND", 250)
+    if gmail_quota_units_per_second < 1:
+        raise ConfigError("GMAIL_QUOTA_UNITS_PER_SECOND must be at least 1")
     yahoo_replay_window_uids = _get_int("YAHOO_REPLAY_WINDOW_UIDS", 500)
     if yahoo_replay_window_uids < 0:
         raise ConfigError("YAHOO_REPLAY_WINDOW_UIDS must be non-negative")
+    yahoo_imap_pool_size = _get_int("YAHOO_IMAP_POOL_SIZE", 2)
+    if yahoo_imap_pool_size < 1:
+        raise ConfigError("YAHOO_IMAP_POOL_SIZE must be at least 1")
+    spool_max_mb = _get_int("SPOOL_MAX_MB", 512)
+    if spool_max_mb < 0:
+        raise ConfigError("SPOOL_MAX_MB must be non-negative")
+    yahoo_discovery_mode = (_get_env("YAHOO_DISCOVERY_MODE", "headers") or "headers").strip().lower()
+    if yahoo_discovery_mode not in {"headers", "full"}:
+        raise ConfigError("YAHOO_DISCOVERY_MODE must be 'headers' or 'full'")
+    yahoo_watch_mode = (_get_env("YAHOO_WATCH_MODE", "per-mailbox") or "per-mailbox").strip().lower()
+    if yahoo_watch_mode not in {"per-mailbox", "shared"}:
+        raise ConfigError("YAHOO_WATCH_MODE must be 'per-mailbox' or 'shared'")
+    orchestrator_mode = (_get_env("ORCHESTRATOR_MODE", "threads") or "threads").strip().lower()
+    if orchestrator_mode not in {"threads", "asyncio"}:
+        raise ConfigError("ORCHESTRATOR_MODE must be 'threads' or 'asyncio'")
+    if orchestrator_mode == "asyncio" and yahoo_watch_mode == "shared":
+        raise ConfigError("YAHOO_WATCH_MODE=shared is only supported with ORCHESTRATOR_MODE=threads")
 
     return AppConfig(
         yahoo_email=yahoo_email,
@@ -106,14 +139,24 @@ def load_config() -> AppConfig:
         yahoo_imap_host=_get_env("YAHOO_IMAP_HOST", "imap.mail.yahoo.com"),
         yahoo_imap_port=_get_int("YAHOO_IMAP_PORT", 993),
         yahoo_replay_window_uids=yahoo_replay_window_uids,
+        yahoo_discovery_mode=yahoo_discovery_mode,
+        yahoo_imap_pool_size=yahoo_imap_pool_size,
+        yahoo_imap_compress=_get_bool("YAHOO_IMAP_COMPRESS", True),
+        yahoo_imap_standby=_get_bool("YAHOO_IMAP_STANDBY", False),
+        yahoo_watch_mode=yahoo_watch_mode,
+        orchestrator_mode=orchestrator_mode,
         gmail_oauth_client_id=gmail_oauth_client_id,
         gmail_oauth_client_secret=gmail_oauth_client_secret,
         gmail_oauth_redirect_uri=gmail_oauth_redirect_uri,
         gmail_label=gmail_label,
         deliver_to_inbox=_get_bool("DELIVER_TO_INBOX", True),
         gmail_delivery_mode=gmail_delivery_mode,
+        gmail_delivery_concurrency=gmail_delivery_concurrency,
+        gmail_quota_units_per_second=gmail_quota_units_per_second,
+        gmail_mirror_enabled=_get_bool("GMAIL_MIRROR_ENABLED", True),
         watch_mailboxes=_parse_mailboxes(_get_env("WATCH_MAILBOXES")),
         sqlite_path=_get_env("SQLITE_PATH", "/data/app.db"),
+        spool_max_mb=spool_max_mb,
         app_master_key=app_master_key,
         log_level=_get_env("LOG_LEVEL", "INFO"),
         admin_enabled=_get_bool("ADMIN_ENABLED", False),
@@ -133,14 +176,24 @@ def config_summary(config: AppConfig) -> dict:
         "yahoo_imap_host": config.yahoo_imap_host,
         "yahoo_imap_port": config.yahoo_imap_port,
         "yahoo_replay_window_uids": config.yahoo_replay_window_uids,
+        "yahoo_discovery_mode": config.yahoo_discovery_mode,
+        "yahoo_imap_pool_size": config.yahoo_imap_pool_size,
+        "yahoo_imap_compress": config.yahoo_imap_compress,
+        "yahoo_imap_standby": config.yahoo_imap_standby,
+        "yahoo_watch_mode": config.yahoo_watch_mode,
+        "orchestrator_mode": config.orchestrator_mode,
         "gmail_oauth_client_id": "set" if config.gmail_oauth_client_id else "not_set",
         "gmail_oauth_client_secret": "set" if config.gmail_oauth_client_secret else "not_set",
         "gmail_oauth_redirect_uri": config.gmail_oauth_redirect_uri,
         "gmail_label": config.gmail_label if config.gmail_label else "disabled",
         "deliver_to_inbox": config.deliver_to_inbox,
         "gmail_delivery_mode": config.gmail_delivery_mode,
+        "gmail_delivery_concurrency": config.gmail_delivery_concurrency,
+        "gmail_quota_units_per_second": config.gmail_quota_units_per_second,
+        "gmail_mirror_enabled": config.gmail_mirror_enabled,
         "watch_mailboxes": config.watch_mailboxes,
         "sqlite_path": config.sqlite_path,
+        "spool_max_mb": config.spool_max_mb,
         "app_master_key": "set" if config.app_master_key else "not_set",
         "log_level": config.log_level,
         "admin_enabled": config.admin_enabled,
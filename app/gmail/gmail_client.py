@@ -1,6 +1,12 @@
 import base64
+import os
+import re
+from typing import BinaryIO
 
 from googleapiclient.discovery import build
+from googleapiclient.http import MediaIoBaseUpload
+
+from app.gmail.quota import execute_request, is_throttled, report_batch_errors
 try:
     from googleapiclient.errors import HttpError
 except Exception:  # pragma: no cover
@@ -11,79 +17,241 @@ def build_service(credentials):
     return build("gmail", "v1", credentials=credentials, cache_discovery=False)
 
 
+# Smaller uploads go out as one multipart request; larger ones are resumable.
+RESUMABLE_UPLOAD_MIN_BYTES = 5 * 1024 * 1024
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+# Gmail accepts at most 100 calls per HTTP batch request.
+BATCH_MAX_REQUESTS = 100
+LIST_PAGE_SIZE = 500
+_MSG_ID_RE = re.compile(r"<[^>]+>")
+
+
+def _message_payload(raw_bytes: bytes | BinaryIO, body: dict) -> dict:
+    if isinstance(raw_bytes, (bytes, bytearray)):
+        body["raw"] = base64.urlsafe_b64encode(raw_bytes).decode("utf-8")
+        return {"body": body}
+    # File input is uploaded as message/rfc822 media instead of base64 in JSON.
+    raw_bytes.seek(0, os.SEEK_END)
+    size = raw_bytes.tell()
+    raw_bytes.seek(0)
+    media = MediaIoBaseUpload(
+        raw_bytes,
+        mimetype="message/rfc822",
+        chunksize=UPLOAD_CHUNK_BYTES,
+        resumable=size >= RESUMABLE_UPLOAD_MIN_BYTES,
+    )
+    return {"body": body, "media_body": media}
+
+
 def insert_raw_message(
     service,
     user_id: str,
-    raw_bytes: bytes,
+    raw_bytes: bytes | BinaryIO,
     label_ids: list[str],
     thread_id: str | None = None,
 ):
-    raw_b64 = base64.urlsafe_b64encode(raw_bytes).decode("utf-8")
     body = {
-        "raw": raw_b64,
         "labelIds": label_ids,
     }
     if thread_id:
         body["threadId"] = thread_id
-    result = (
-        service.users()
-        .messages()
-        .insert(userId=user_id, body=body)
-        .execute()
-    )
+    request = service.users().messages().insert(userId=user_id, **_message_payload(raw_bytes, body))
+    result = execute_request("messages.insert", request)
     return result.get("id"), result.get("threadId")
 
 
 def import_raw_message(
     service,
     user_id: str,
-    raw_bytes: bytes,
+    raw_bytes: bytes | BinaryIO,
     label_ids: list[str],
     internal_date_source: str = "dateHeader",
 ):
-    raw_b64 = base64.urlsafe_b64encode(raw_bytes).decode("utf-8")
     body = {
-        "raw": raw_b64,
         "labelIds": label_ids,
         "internalDateSource": internal_date_source,
     }
-    result = (
-        service.users()
-        .messages()
-        .import_(userId=user_id, body=body)
-        .execute()
-    )
+    request = service.users().messages().import_(userId=user_id, **_message_payload(raw_bytes, body))
+    result = execute_request("messages.import", request)
     return result.get("id"), result.get("threadId")
 
 
+def _first_match(result: dict) -> tuple[str, str] | None:
+    # messages.list already returns threadId, so no follow-up get is needed.
+    messages = result.get("messages", [])
+    if not messages:
+        return None
+    msg_id = messages[0].get("id")
+    thread_id = messages[0].get("threadId")
+    if not msg_id or not thread_id:
+        return None
+    return msg_id, thread_id
+
+
+def _http_status(exc: Exception) -> int | None:
+    if HttpError and isinstance(exc, HttpError):
+        return getattr(exc.resp, "status", None)
+    return None
+
+
+def _is_forbidden(exc: Exception) -> bool:
+    return _http_status(exc) == 403
+
+
+def _is_not_found(exc: Exception) -> bool:
+    return _http_status(exc) == 404
+
+
+def _list_by_rfc822msgid(service, user_id: str, msgid: str):
+    return service.users().messages().list(userId=user_id, q=f"rfc822msgid:{msgid}", maxResults=1)
+
+
 def find_message_by_rfc822msgid(service, user_id: str, msgid: str) -> tuple[str, str] | None:
     if not msgid:
         return None
     try:
-        query = f"rfc822msgid:{msgid}"
-        result = service.users().messages().list(userId=user_id, q=query, maxResults=1).execute()
-        messages = result.get("messages", [])
-        if not messages:
-            return None
-        msg_id = messages[0].get("id")
-        if not msg_id:
-            return None
-        msg = service.users().messages().get(userId=user_id, id=msg_id, format="metadata").execute()
-        thread_id = msg.get("threadId")
-        if not thread_id:
-            return None
-        return msg_id, thread_id
+        return _first_match(execute_request("messages.list", _list_by_rfc822msgid(service, user_id, msgid)))
     except Exception as exc:
-        if HttpError and isinstance(exc, HttpError):
-            status = getattr(exc.resp, "status", None)
-            if status == 403:
-                return None
+        if _is_forbidden(exc) and not is_throttled(exc):
+            return None
         raise
 
 
+def find_messages_by_rfc822msgids(service, user_id: str, msgids: list[str]) -> dict[str, tuple[str, str]]:
+    # One HTTP batch per BATCH_MAX_REQUESTS lookups instead of one round trip each.
+    msgids = list(dict.fromkeys(msgid for msgid in msgids if msgid))
+    if len(msgids) <= 1:
+        match = find_message_by_rfc822msgid(service, user_id, msgids[0]) if msgids else None
+        return {msgids[0]: match} if match else {}
+    matches: dict[str, tuple[str, str]] = {}
+    failed: list[str] = []
+    for start in range(0, len(msgids), BATCH_MAX_REQUESTS):
+        chunk = msgids[start : start + BATCH_MAX_REQUESTS]
+        errors: list[Exception] = []
+
+        def _callback(request_id, response, exception, chunk=chunk, errors=errors):
+            msgid = chunk[int(request_id)]
+            if exception is not None:
+                errors.append(exception)
+                if not _is_forbidden(exception) or is_throttled(exception):
+                    failed.append(msgid)
+                return
+            match = _first_match(response)
+            if match:
+                matches[msgid] = match
+
+        batch = service.new_batch_http_request(callback=_callback)
+        for idx, msgid in enumerate(chunk):
+            batch.add(_list_by_rfc822msgid(service, user_id, msgid), request_id=str(idx))
+        execute_request("messages.list", batch, calls=len(chunk))
+        report_batch_errors(errors)
+    # Parts of a batch that failed (throttled, 5xx) go through the limiter's own retries.
+    for msgid in failed:
+        match = find_message_by_rfc822msgid(service, user_id, msgid)
+        if match:
+            matches[msgid] = match
+    return matches
+
+
 def find_thread_id_by_rfc822msgid(service, user_id: str, msgid: str) -> str | None:
     match = find_message_by_rfc822msgid(service, user_id, msgid)
     if not match:
         return None
     _, thread_id = match
     return thread_id
+
+
+def thread_exists(service, user_id: str, thread_id: str) -> bool:
+    try:
+        execute_request("threads.get", service.users().threads().get(userId=user_id, id=thread_id, format="minimal"))
+    except Exception as exc:
+        if _is_not_found(exc):
+            return False
+        raise
+    return True
+
+
+def get_history_id(service, user_id: str) -> str:
+    return str(execute_request("users.getProfile", service.users().getProfile(userId=user_id))["historyId"])
+
+
+def list_message_page(
+    service,
+    user_id: str,
+    query: str | None = None,
+    page_token: str | None = None,
+    max_results: int = LIST_PAGE_SIZE,
+) -> dict:
+    kwargs = {"userId": user_id, "maxResults": max_results, "includeSpamTrash": True}
+    if query:
+        kwargs["q"] = query
+    if page_token:
+        kwargs["pageToken"] = page_token
+    return execute_request("messages.list", service.users().messages().list(**kwargs))
+
+
+def list_history_page(service, user_id: str, start_history_id: str, page_token: str | None = None) -> dict:
+    kwargs = {
+        "userId": user_id,
+        "startHistoryId": start_history_id,
+        "historyTypes": ["messageAdded", "messageDeleted"],
+        "maxResults": LIST_PAGE_SIZE,
+    }
+    if page_token:
+        kwargs["pageToken"] = page_token
+    return execute_request("history.list", service.users().history().list(**kwargs))
+
+
+def _get_message_id_header(service, user_id: str, gmail_id: str):
+    return service.users().messages().get(
+        userId=user_id, id=gmail_id, format="metadata", metadataHeaders=["Message-ID"]
+    )
+
+
+def _message_id_entry(response: dict) -> tuple[str | None, str] | None:
+    thread_id = response.get("threadId")
+    if not thread_id:
+        return None
+    for header in response.get("payload", {}).get("headers", []):
+        if header.get("name", "").lower() == "message-id":
+            match = _MSG_ID_RE.search(header.get("value", ""))
+            return (match.group(0) if match else header.get("value", "").strip() or None), thread_id
+    return None, thread_id
+
+
+def get_message_id_headers(service, user_id: str, gmail_ids: list[str]) -> dict[str, tuple[str | None, str]]:
+    # Message-ID and threadId for each Gmail id, fetched in HTTP batches.
+    entries: dict[str, tuple[str | None, str]] = {}
+    failed: list[str] = []
+    for start in range(0, len(gmail_ids), BATCH_MAX_REQUESTS):
+        chunk = gmail_ids[start : start + BATCH_MAX_REQUESTS]
+        errors: list[Exception] = []
+
+        def _callback(request_id, response, exception, chunk=chunk, errors=errors):
+            gmail_id = chunk[int(request_id)]
+            if exception is not None:
+                errors.append(exception)
+                if not _is_not_found(exception):
+                    failed.append(gmail_id)
+                return
+            entry = _message_id_entry(response)
+            if entry:
+                entries[gmail_id] = entry
+
+        batch = service.new_batch_http_request(callback=_callback)
+        for idx, gmail_id in enumerate(chunk):
+            batch.add(_get_message_id_header(service, user_id, gmail_id), request_id=str(idx))
+        execute_request("messages.get", batch, calls=len(chunk))
+        report_batch_errors(errors)
+    for gmail_id in failed:
+        try:
+            response = execute_request("messages.get", _get_message_id_header(service, user_id, gmail_id))
+        except Exception as exc:
+            # Deleted between listing and fetching; history will report it.
+            if _is_not_found(exc):
+                continue
+            raise
+        entry = _message_id_entry(response)
+        if entry:
+            entries[gmail_id] = entry
+    return entries
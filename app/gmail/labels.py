@@ -1,5 +1,7 @@
 from typing import Optional
 
+from app.gmail.quota import execute_request
+
 
 def _get_cached_label_id(conn, account_id: int, label_name: str) -> Optional[str]:
     row = conn.execute(
@@ -30,20 +32,20 @@ def ensure_label(service, conn, account_id: int, label_name: str) -> str:
     if cached:
         return cached
 
-    labels = service.users().labels().list(userId="me").execute().get("labels", [])
+    labels = execute_request("labels.list", service.users().labels().list(userId="me")).get("labels", [])
     for label in labels:
         if label.get("name") == label_name:
             _cache_label_id(conn, account_id, label_name, label.get("id"))
             return label.get("id")
 
-    created = (
+    created = execute_request(
+        "labels.create",
         service.users()
         .labels()
         .create(
             userId="me",
             body={"name": label_name, "labelListVisibility": "labelShow"},
-        )
-        .execute()
+        ),
     )
     label_id = created.get("id")
     _cache_label_id(conn, account_id, label_name, label_id)
@@ -51,7 +53,7 @@ def ensure_label(service, conn, account_id: int, label_name: str) -> str:
 
 
 def get_system_label_ids(service, names: list[str]) -> dict:
-    labels = service.users().labels().list(userId="me").execute().get("labels", [])
+    labels = execute_request("labels.list", service.users().labels().list(userId="me")).get("labels", [])
     by_name = {label.get("name"): label.get("id") for label in labels}
     missing = [name for name in names if name not in by_name]
     if missing:
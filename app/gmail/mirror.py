@@ -0,0 +1,230 @@
+import threading
+from datetime import datetime, timezone
+
+from app.gmail.gmail_client import get_history_id, get_message_id_headers, list_history_page, list_message_page
+from app.gmail.oauth import OAuthError
+from app.log.logger import log_event
+from app.store.db import utc_now_iso
+from app.store.lease import has_due_messages
+from app.store.message_index import forget_gmail_messages, record_gmail_message
+
+try:
+    from googleapiclient.errors import HttpError
+except Exception:  # pragma: no cover
+    HttpError = None
+
+MIRROR_SYNC_SECONDS = 60
+# Past this age a local miss is no longer trusted and Gmail is searched again.
+MIRROR_STALE_SECONDS = 10 * 60
+# One seed page is a single HTTP batch of metadata gets (about 500 quota
+# units), so delivery never waits long behind it.
+MIRROR_SEED_PAGE_SIZE = 100
+
+
+def _history_expired(exc: Exception) -> bool:
+    # Gmail keeps about a week of history; older start ids answer 404.
+    return bool(HttpError and isinstance(exc, HttpError) and getattr(exc.resp, "status", None) == 404)
+
+
+def _parse_iso(value) -> datetime | None:
+    try:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+class GmailMirror:
+    # Keeps gmail_message_index in step with the whole Gmail mailbox: a paged
+    # messages.list seeds it once, then history.list applies only the changes.
+    # A Message-ID missing locally is missing in Gmail only if a history pass
+    # started after the Yahoo row was discovered (see covers()).
+    def __init__(self, account_id: int, user_id: str = "me", stale_seconds: float = MIRROR_STALE_SECONDS):
+        self.account_id = account_id
+        self.user_id = user_id
+        self.stale_seconds = stale_seconds
+        # The background sync and delivery-triggered catch-ups share one cursor.
+        self._lock = threading.Lock()
+
+    def _state(self, conn):
+        return conn.execute(
+            "SELECT history_id, seed_page_token, seeded, synced_at FROM gmail_mirror_state WHERE account_id = ?",
+            (self.account_id,),
+        ).fetchone()
+
+    def covers(self, conn, since: str | None = None) -> bool:
+        # synced_at is when the last history pass started, so anything Gmail
+        # held before that moment is in the index.
+        state = self._state(conn)
+        if not state or not state[2]:
+            return False
+        synced_at = _parse_iso(state[3])
+        if synced_at is None:
+            return False
+        if (datetime.now(timezone.utc) - synced_at).total_seconds() > self.stale_seconds:
+            return False
+        if since is None:
+            return True
+        since_at = _parse_iso(since)
+        return since_at is not None and synced_at > since_at
+
+    def catch_up(self, conn, service, since: str | None, logger=None) -> bool:
+        # Called per delivery: applies history now when the last pass is older
+        # than the row, so mail sent from Gmail seconds ago is not missed.
+        if self.covers(conn, since):
+            return True
+        state = self._state(conn)
+        if not state or not state[2] or not state[3]:
+            return False
+        try:
+            with self._lock:
+                if self.covers(conn, since):
+                    return True
+                self._apply_history(conn, service, self._state(conn)[0])
+        except Exception as exc:
+            if logger:
+                log_event(
+                    logger,
+                    "gmail_mirror_catch_up_error",
+                    "gmail mirror catch-up failed; searching gmail instead",
+                    error=repr(exc),
+                    error_type=type(exc).__name__,
+                )
+            return False
+        # This pass started after the row was read, so it covers the row.
+        return True
+
+    def _record(self, conn, entries: dict) -> int:
+        recorded = 0
+        for gmail_id, (msgid, thread_id) in entries.items():
+            if msgid:
+                record_gmail_message(conn, self.account_id, msgid, gmail_id, thread_id)
+                recorded += 1
+        return recorded
+
+    def _start(self, conn, service) -> None:
+        # The start point is taken before seeding so history covers anything
+        # that changes while the pages are being read. The seed rebuilds the
+        # index, so rows whose deletion was never seen go with the old state.
+        history_id = get_history_id(service, self.user_id)
+        with conn:
+            conn.execute("DELETE FROM gmail_message_index WHERE account_id = ?", (self.account_id,))
+            conn.execute(
+                """
+                INSERT INTO gmail_mirror_state(account_id, history_id, seed_page_token, seeded, synced_at, updated_at)
+                VALUES (?, ?, NULL, 0, NULL, ?)
+                ON CONFLICT(account_id) DO UPDATE SET
+                  history_id=excluded.history_id,
+                  seed_page_token=NULL,
+                  seeded=0,
+                  synced_at=NULL,
+                  updated_at=excluded.updated_at
+                """,
+                (self.account_id, history_id, utc_now_iso()),
+            )
+
+    def _seed_page(self, conn, service, page_token: str | None) -> dict:
+        page = list_message_page(service, self.user_id, page_token=page_token, max_results=MIRROR_SEED_PAGE_SIZE)
+        gmail_ids = [message["id"] for message in page.get("messages", [])]
+        entries = get_message_id_headers(service, self.user_id, gmail_ids) if gmail_ids else {}
+        next_token = page.get("nextPageToken")
+        now = utc_now_iso()
+        with conn:
+            recorded = self._record(conn, entries)
+            conn.execute(
+                """
+                UPDATE gmail_mirror_state
+                   SET seed_page_token = ?, seeded = ?, updated_at = ?
+                 WHERE account_id = ?
+                """,
+                (next_token, 0 if next_token else 1, now, self.account_id),
+            )
+        return {"listed": len(gmail_ids), "recorded": recorded, "done": not next_token}
+
+    def _apply_history(self, conn, service, history_id: str) -> dict:
+        started = utc_now_iso()
+        added = {}
+        deleted = set()
+        latest = history_id
+        page_token = None
+        while True:
+            page = list_history_page(service, self.user_id, history_id, page_token=page_token)
+            for record in page.get("history", []):
+                for item in record.get("messagesAdded", []):
+                    added[item["message"]["id"]] = item["message"].get("threadId")
+                for item in record.get("messagesDeleted", []):
+                    deleted.add(item["message"]["id"])
+            latest = page.get("historyId") or latest
+            page_token = page.get("nextPageToken")
+            if not page_token:
+                break
+        gmail_ids = [gmail_id for gmail_id in added if gmail_id not in deleted]
+        entries = get_message_id_headers(service, self.user_id, gmail_ids) if gmail_ids else {}
+        with conn:
+            forget_gmail_messages(conn, self.account_id, deleted)
+            recorded = self._record(conn, entries)
+            conn.execute(
+                "UPDATE gmail_mirror_state SET history_id = ?, synced_at = ?, updated_at = ? WHERE account_id = ?",
+                (str(latest), started, utc_now_iso(), self.account_id),
+            )
+        return {"added": recorded, "deleted": len(deleted)}
+
+    def sync_once(self, conn, service, logger=None, seed: bool = True) -> bool:
+        with self._lock:
+            return self._sync_once(conn, service, logger=logger, seed=seed)
+
+    def _sync_once(self, conn, service, logger=None, seed: bool = True) -> bool:
+        # Returns True while seeding, so callers loop without sleeping until
+        # the first history pass has run.
+        state = self._state(conn)
+        if not seed and (state is None or not state[2]):
+            return False
+        if state is None:
+            self._start(conn, service)
+            state = self._state(conn)
+        history_id, page_token, seeded, _ = state
+        if not seeded:
+            result = self._seed_page(conn, service, page_token)
+            if logger:
+                log_event(logger, "gmail_mirror_seed", "seeded gmail mirror page", **result)
+            return True
+        try:
+            result = self._apply_history(conn, service, history_id)
+        except Exception as exc:
+            if not _history_expired(exc):
+                raise
+            if logger:
+                log_event(
+                    logger,
+                    "gmail_mirror_reseed",
+                    "gmail history expired; reseeding mirror",
+                    history_id=history_id,
+                )
+            self._start(conn, service)
+            return True
+        if logger and (result["added"] or result["deleted"]):
+            log_event(logger, "gmail_mirror_sync", "applied gmail history", **result)
+        return False
+
+
+def run_mirror_step(conn, service_manager, mirror: GmailMirror, logger=None) -> bool:
+    try:
+        service = service_manager.get_service(conn)
+        # Seeding shares the Gmail quota with delivery, so it waits for an
+        # idle moment; history passes are cheap and always run.
+        return mirror.sync_once(conn, service, logger=logger, seed=not has_due_messages(conn))
+    except OAuthError:
+        # The delivery worker already reports OAuth problems.
+        return False
+    except Exception as exc:
+        if logger:
+            log_event(
+                logger,
+                "gmail_mirror_error",
+                "gmail mirror sync failed",
+                error=repr(exc),
+                error_type=type(exc).__name__,
+            )
+        return False
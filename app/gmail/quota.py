@@ -0,0 +1,190 @@
+import random
+import threading
+import time
+from typing import Callable, Optional, Tuple
+
+try:
+    from googleapiclient.errors import HttpError
+except Exception:  # pragma: no cover
+    HttpError = None
+
+# Gmail API cost per call in quota units; the per-user limit is a moving
+# average of 250 units per second.
+QUOTA_UNITS = {
+    "history.list": 2,
+    "labels.create": 5,
+    "labels.list": 1,
+    "messages.get": 5,
+    "messages.import": 25,
+    "messages.insert": 25,
+    "messages.list": 5,
+    "threads.get": 10,
+    "users.getProfile": 1,
+}
+DEFAULT_QUOTA_UNITS = 5
+USER_QUOTA_UNITS_PER_SECOND = 250
+MIN_QUOTA_UNITS_PER_SECOND = 10
+# Throttled calls are retried here, after the limiter has slowed down, before
+# the error reaches the caller's retry schedule.
+THROTTLE_RETRIES = 3
+# Without Retry-After every caller pauses base * 2**attempt seconds, jittered
+# down by up to half so parallel workers do not retry in lockstep.
+THROTTLE_BACKOFF_BASE_SECONDS = 1.0
+THROTTLE_BACKOFF_MAX_SECONDS = 60.0
+# A 5xx does not say whether these were applied, so a retry could deliver a
+# second copy; they go back to the row retry schedule instead. 429 and 403
+# rate limits are rejected before the call runs and are safe to retry.
+NON_IDEMPOTENT_METHODS = {"messages.import", "messages.insert"}
+_THROTTLE_STATUSES = {429, 503}
+_THROTTLE_REASONS = ("rateLimitExceeded", "userRateLimitExceeded")
+
+
+def _throttle_info(exc: Exception) -> Tuple[bool, Optional[float]]:
+    if not (HttpError and isinstance(exc, HttpError)):
+        return False, None
+    status = getattr(exc.resp, "status", None)
+    if status == 403:
+        content = exc.content
+        if isinstance(content, bytes):
+            content = content.decode("utf-8", errors="replace")
+        throttled = any(reason in str(content) for reason in _THROTTLE_REASONS)
+    else:
+        throttled = status in _THROTTLE_STATUSES
+    if not throttled:
+        return False, None
+    try:
+        retry_after = float(exc.resp.get("retry-after"))
+    except (TypeError, ValueError):
+        retry_after = None
+    return True, retry_after
+
+
+def is_throttled(exc: Exception) -> bool:
+    return _throttle_info(exc)[0]
+
+
+class GmailQuotaLimiter:
+    # Token bucket over quota units. The refill rate grows additively after
+    # each success and is cut multiplicatively on 429/503 (AIMD); Retry-After
+    # pauses every caller sharing the limiter.
+    def __init__(
+        self,
+        max_rate: float = USER_QUOTA_UNITS_PER_SECOND,
+        min_rate: float = MIN_QUOTA_UNITS_PER_SECOND,
+        increase: float = 1.0,
+        decrease: float = 0.5,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+        jitter: Callable[[], float] = random.random,
+    ):
+        self.max_rate = float(max_rate)
+        self.min_rate = min(float(min_rate), self.max_rate)
+        self.increase = increase
+        self.decrease = decrease
+        self.capacity = self.max_rate
+        self._clock = clock
+        self._sleep = sleep
+        self._jitter = jitter
+        self._lock = threading.Lock()
+        self._rate = self.max_rate
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._paused_until = 0.0
+        self._throttled = 0
+
+    @property
+    def rate(self) -> float:
+        with self._lock:
+            return self._rate
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"rate": round(self._rate, 1), "max_rate": self.max_rate, "throttled": self._throttled}
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    def acquire(self, units: float) -> float:
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._refill(now)
+                delay = self._paused_until - now
+                if delay <= 0:
+                    # Calls larger than the bucket may borrow against it.
+                    needed = min(units, self.capacity)
+                    if self._tokens >= needed:
+                        self._tokens -= units
+                        return waited
+                    delay = (needed - self._tokens) / self._rate
+            self._sleep(delay)
+            waited += delay
+
+    def on_success(self) -> None:
+        with self._lock:
+            self._rate = min(self.max_rate, self._rate + self.increase)
+
+    def _backoff(self, attempt: int) -> float:
+        delay = min(THROTTLE_BACKOFF_MAX_SECONDS, THROTTLE_BACKOFF_BASE_SECONDS * 2**attempt)
+        return delay * (0.5 + self._jitter() / 2)
+
+    def on_throttle(self, retry_after: Optional[float] = None, attempt: int = 0) -> None:
+        with self._lock:
+            now = self._clock()
+            self._refill(now)
+            self._rate = max(self.min_rate, self._rate * self.decrease)
+            self._tokens = min(self._tokens, 0.0)
+            self._throttled += 1
+            pause = retry_after if retry_after else self._backoff(attempt)
+            self._paused_until = max(self._paused_until, now + pause)
+
+    def on_batch_errors(self, errors) -> None:
+        # Parts of an HTTP batch fail on their own while the batch itself
+        # succeeds, so execute() never sees them. One throttle per batch.
+        retry_afters = [retry_after for throttled, retry_after in map(_throttle_info, errors) if throttled]
+        if retry_afters:
+            self.on_throttle(max((value for value in retry_afters if value), default=None))
+
+    def execute(self, method: str, request, calls: int = 1):
+        # A batch request is charged for every call it carries.
+        units = QUOTA_UNITS.get(method, DEFAULT_QUOTA_UNITS) * calls
+        attempt = 0
+        while True:
+            self.acquire(units)
+            try:
+                result = request.execute()
+            except Exception as exc:
+                throttled, retry_after = _throttle_info(exc)
+                if not throttled:
+                    raise
+                self.on_throttle(retry_after, attempt)
+                attempt += 1
+                if attempt > THROTTLE_RETRIES:
+                    raise
+                if method in NON_IDEMPOTENT_METHODS and (getattr(exc.resp, "status", None) or 0) >= 500:
+                    raise
+                continue
+            self.on_success()
+            return result
+
+
+_limiter = GmailQuotaLimiter()
+
+
+def configure_quota(units_per_second: float) -> None:
+    global _limiter
+    _limiter = GmailQuotaLimiter(max_rate=units_per_second)
+
+
+def quota_limiter() -> GmailQuotaLimiter:
+    return _limiter
+
+
+def execute_request(method: str, request, calls: int = 1):
+    return _limiter.execute(method, request, calls=calls)
+
+
+def report_batch_errors(errors) -> None:
+    _limiter.on_batch_errors(errors)
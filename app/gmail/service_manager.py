@@ -1,3 +1,5 @@
+import threading
+
 from app.gmail.gmail_client import build_service
 from app.gmail.oauth import OAuthError, TOKEN_SECRET_KEY, build_credentials
 from app.log.logger import log_event
@@ -20,8 +22,8 @@ class GmailServiceManager:
         self.redirect_uri = redirect_uri
         self.alert_manager = alert_manager
         self.logger = logger
-        self._service = None
-        self._token_created_at = None
+        # httplib2 transports are not thread-safe, so each thread gets its own.
+        self._local = threading.local()
 
     def _token_timestamp(self, conn):
         return secrets.get_secret_created_at(conn, TOKEN_SECRET_KEY)
@@ -39,15 +41,16 @@ class GmailServiceManager:
         return build_service(creds)
 
     def get_service(self, conn):
+        local = self._local
         token_created_at = self._token_timestamp(conn)
-        if self._service is None:
-            self._service = self._build(conn)
-            self._token_created_at = token_created_at
-            return self._service
-        if token_created_at and token_created_at != self._token_created_at:
+        if getattr(local, "service", None) is None:
+            local.service = self._build(conn)
+            local.token_created_at = token_created_at
+            return local.service
+        if token_created_at and token_created_at != local.token_created_at:
             try:
-                self._service = self._build(conn)
-                self._token_created_at = token_created_at
+                local.service = self._build(conn)
+                local.token_created_at = token_created_at
                 if self.logger:
                     log_event(self.logger, "oauth_reloaded", "gmail oauth tokens reloaded")
             except OAuthError as exc:
@@ -58,4 +61,4 @@ class GmailServiceManager:
                         "gmail oauth reload failed; keeping existing service",
                         error=str(exc),
                     )
-        return self._service
+        return local.service
@@ -0,0 +1,435 @@
+import asyncio
+import inspect
+import re
+import ssl
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+from .uidset import UIDSet
+from .yahoo_client import (
+    DISCOVERY_HEADER_FIELDS,
+    FETCH_BATCH_MAX_BYTES,
+    HEADER_FETCH_BATCH_UIDS,
+    IDLE_MAX_SECONDS,
+    IdleResult,
+    MailboxStatus,
+    YahooIMAPError,
+    _batch_uids_by_size,
+    _parse_fetch_meta,
+    _parse_idle_line,
+    _uid_set,
+)
+
+_LITERAL_RE = re.compile(rb"\{(\d+)\}$")
+_TAGGED_RE = re.compile(rb"^(\S+) (OK|NO|BAD)\b", re.IGNORECASE)
+_UNTAGGED_COUNT_RE = re.compile(rb"^\* (\d+) (EXISTS|EXPUNGE|FETCH)\b", re.IGNORECASE)
+_RESPONSE_CODE_RE = re.compile(rb"\[(UIDVALIDITY|UIDNEXT|HIGHESTMODSEQ) (\d+)\]", re.IGNORECASE)
+_CAPABILITY_RE = re.compile(rb"CAPABILITY ([^\]\r\n]*)", re.IGNORECASE)
+_ESEARCH_ALL_RE = re.compile(rb"\bALL\s+([0-9:,]+)", re.IGNORECASE)
+_FETCH_SIZE_RE = re.compile(rb"RFC822\.SIZE\s+(\d+)", re.IGNORECASE)
+_STATUS_ITEM_RE = re.compile(rb"\b(MESSAGES|UIDNEXT|UIDVALIDITY|HIGHESTMODSEQ)\s+(\d+)", re.IGNORECASE)
+# A plain SEARCH over a large mailbox is one line of several hundred KB;
+# longer lines are still read, in pieces of this size.
+STREAM_LIMIT_BYTES = 1024 * 1024
+# The timeout applies to each piece of a literal, so a large message on a
+# slow link is not cut off as long as bytes keep arriving.
+LITERAL_CHUNK_BYTES = 64 * 1024
+
+
+class IMAPAbort(YahooIMAPError):
+    pass
+
+
+def _quote(value: str) -> str:
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+class AsyncYahooIMAPClient:
+    def __init__(self, host: str, port: int, email: str, app_password: str, timeout: int = 30):
+        self.host = host
+        self.port = port
+        self.email = email
+        self.app_password = app_password
+        self.timeout = timeout
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._tag = 0
+        self._lock = asyncio.Lock()
+        self._selected: Optional[MailboxStatus] = None
+        self.capabilities: Tuple[str, ...] = ()
+        self.condstore_enabled = False
+
+    async def connect(self) -> None:
+        self._selected = None
+        self.condstore_enabled = False
+        context = ssl.create_default_context()
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=context, limit=STREAM_LIMIT_BYTES),
+            self.timeout,
+        )
+        greeting, _ = await self._read_response()
+        if not greeting.upper().startswith(b"* OK"):
+            raise YahooIMAPError(f"unexpected IMAP greeting: {greeting!r}")
+        await self._refresh_capabilities()
+        status, _ = await self._command(f"LOGIN {_quote(self.email)} {_quote(self.app_password)}")
+        if status != "OK":
+            raise YahooIMAPError("IMAP login failed")
+        await self._refresh_capabilities()
+        if self.has_capability("ENABLE"):
+            for extension in ("QRESYNC", "CONDSTORE"):
+                if self.has_capability(extension):
+                    status, _ = await self._command(f"ENABLE {extension}")
+                    if status == "OK":
+                        self.condstore_enabled = True
+                        break
+
+    async def close(self) -> None:
+        if self._writer is None:
+            return
+        try:
+            await asyncio.wait_for(self._command("LOGOUT"), self.timeout)
+        except (YahooIMAPError, OSError, asyncio.TimeoutError):
+            pass
+        finally:
+            self._writer.close()
+            self._reader = None
+            self._writer = None
+            self._selected = None
+
+    def has_capability(self, name: str) -> bool:
+        return name.upper() in self.capabilities
+
+    def has_idle(self) -> bool:
+        return self.has_capability("IDLE")
+
+    @property
+    def selected_mailbox(self) -> Optional[str]:
+        return self._selected.name if self._selected else None
+
+    async def _refresh_capabilities(self) -> None:
+        _, responses = await self._command("CAPABILITY")
+        for line, _ in responses:
+            match = _CAPABILITY_RE.search(line)
+            if match:
+                self.capabilities = tuple(match.group(1).decode("ascii", errors="ignore").upper().split())
+
+    async def _readline(self, timeout: Optional[float] = None) -> bytes:
+        if self._reader is None:
+            raise YahooIMAPError("IMAP connection not initialized")
+        parts: List[bytes] = []
+        while True:
+            try:
+                line = await asyncio.wait_for(self._reader.readuntil(b"\n"), timeout or self.timeout)
+            except asyncio.LimitOverrunError as exc:
+                # readuntil() leaves the data buffered; take what it has
+                # scanned and keep looking for the end of the line.
+                parts.append(await self._reader.readexactly(exc.consumed))
+                continue
+            except asyncio.IncompleteReadError:
+                raise IMAPAbort("IMAP connection closed") from None
+            parts.append(line)
+            return b"".join(parts).rstrip(b"\r\n")
+
+    async def _read_literal(self, size: int) -> bytes:
+        parts: List[bytes] = []
+        remaining = size
+        while remaining:
+            chunk = await asyncio.wait_for(self._reader.read(min(remaining, LITERAL_CHUNK_BYTES)), self.timeout)
+            if not chunk:
+                raise IMAPAbort("IMAP connection closed")
+            parts.append(chunk)
+            remaining -= len(chunk)
+        return b"".join(parts)
+
+    async def _read_response(self, timeout: Optional[float] = None) -> Tuple[bytes, List[bytes]]:
+        line = await self._readline(timeout)
+        text = line
+        literals: List[bytes] = []
+        match = _LITERAL_RE.search(line)
+        while match:
+            literals.append(await self._read_literal(int(match.group(1))))
+            line = await self._readline()
+            text += line
+            match = _LITERAL_RE.search(line)
+        return text, literals
+
+    def _send(self, data: bytes) -> None:
+        if self._writer is None:
+            raise YahooIMAPError("IMAP connection not initialized")
+        self._writer.write(data)
+
+    def _track_untagged(self, line: bytes) -> None:
+        match = _UNTAGGED_COUNT_RE.match(line)
+        if not match or self._selected is None:
+            return
+        kind = match.group(2).upper()
+        if kind == b"EXISTS":
+            self._selected.exists = int(match.group(1))
+        elif kind == b"EXPUNGE":
+            self._selected.exists = max(0, self._selected.exists - 1)
+
+    async def _iter_command(self, command: str, outcome: List[str]) -> AsyncIterator[Tuple[bytes, List[bytes]]]:
+        # Yields untagged responses as they arrive and appends the tagged
+        # status to outcome. Callers must drain the iterator.
+        async with self._lock:
+            self._tag += 1
+            tag = f"Y{self._tag}".encode("ascii")
+            self._send(tag + b" " + command.encode("utf-8") + b"\r\n")
+            await self._writer.drain()
+            while True:
+                text, literals = await self._read_response()
+                if text.startswith(tag + b" "):
+                    match = _TAGGED_RE.match(text)
+                    outcome.append(match.group(2).decode("ascii").upper() if match else "BAD")
+                    return
+                if text.startswith(b"* BYE"):
+                    raise IMAPAbort(f"server closed connection: {text!r}")
+                self._track_untagged(text)
+                yield text, literals
+
+    async def _command(self, command: str) -> Tuple[str, List[Tuple[bytes, List[bytes]]]]:
+        outcome: List[str] = []
+        responses = [response async for response in self._iter_command(command, outcome)]
+        return (outcome[0] if outcome else "BAD"), responses
+
+    async def noop(self) -> None:
+        await self._command("NOOP")
+
+    async def select_status(self, mailbox: str, readonly: bool = True, force: bool = False) -> MailboxStatus:
+        selected = self._selected
+        if selected and not force and selected.name == mailbox and (readonly or not selected.readonly):
+            return selected
+        self._selected = None
+        verb = "EXAMINE" if readonly else "SELECT"
+        status, responses = await self._command(f"{verb} {_quote(mailbox)}")
+        if status != "OK":
+            raise YahooIMAPError(f"SELECT failed for {mailbox}")
+        codes: Dict[str, int] = {}
+        exists = 0
+        for text, _ in responses:
+            match = _UNTAGGED_COUNT_RE.match(text)
+            if match and match.group(2).upper() == b"EXISTS":
+                exists = int(match.group(1))
+            for name, value in _RESPONSE_CODE_RE.findall(text):
+                codes[name.decode("ascii").upper()] = int(value)
+        if "UIDVALIDITY" not in codes:
+            raise YahooIMAPError(f"UIDVALIDITY missing from SELECT {mailbox}")
+        self._selected = MailboxStatus(
+            name=mailbox,
+            readonly=readonly,
+            uidvalidity=codes["UIDVALIDITY"],
+            exists=exists,
+            uidnext=codes.get("UIDNEXT"),
+            highest_modseq=codes.get("HIGHESTMODSEQ"),
+        )
+        return self._selected
+
+    async def select(self, mailbox: str, readonly: bool = True, force: bool = False) -> Tuple[int, int]:
+        selected = await self.select_status(mailbox, readonly=readonly, force=force)
+        return selected.uidvalidity, selected.exists
+
+    async def mailbox_status(self, mailbox: str) -> MailboxStatus:
+        if self.selected_mailbox == mailbox:
+            return await self.select_status(mailbox, force=True)
+        items = "MESSAGES UIDNEXT UIDVALIDITY"
+        if self.condstore_enabled:
+            items += " HIGHESTMODSEQ"
+        status, responses = await self._command(f"STATUS {_quote(mailbox)} ({items})")
+        if status != "OK":
+            raise YahooIMAPError(f"STATUS failed for {mailbox}")
+        values: Dict[str, int] = {}
+        for text, _ in responses:
+            for name, value in _STATUS_ITEM_RE.findall(text):
+                values[name.decode("ascii").upper()] = int(value)
+        if "UIDVALIDITY" not in values:
+            raise YahooIMAPError(f"UIDVALIDITY not found in STATUS for {mailbox}")
+        return MailboxStatus(
+            name=mailbox,
+            readonly=True,
+            uidvalidity=values["UIDVALIDITY"],
+            exists=values.get("MESSAGES", 0),
+            uidnext=values.get("UIDNEXT"),
+            highest_modseq=values.get("HIGHESTMODSEQ"),
+        )
+
+    async def search_uids(self, since_uid: int) -> UIDSet:
+        esearch = self.has_capability("ESEARCH")
+        returning = "RETURN (ALL) " if esearch else ""
+        status, responses = await self._command(f"UID SEARCH {returning}UID {since_uid}:*")
+        if status != "OK":
+            raise YahooIMAPError("UID SEARCH failed")
+        uids = UIDSet()
+        for text, _ in responses:
+            upper = text.upper()
+            if upper.startswith(b"* SEARCH"):
+                uids = uids | UIDSet.from_uids(int(uid) for uid in text[8:].split())
+            elif upper.startswith(b"* ESEARCH"):
+                match = _ESEARCH_ALL_RE.search(text)
+                if match:
+                    uids = uids | UIDSet.parse(match.group(1))
+        return uids
+
+    async def _uid_fetch(self, uid_set: str, items: str) -> AsyncIterator[Tuple[bytes, Optional[bytes]]]:
+        outcome: List[str] = []
+        async for text, literals in self._iter_command(f"UID FETCH {uid_set} {items}", outcome):
+            match = _UNTAGGED_COUNT_RE.match(text)
+            if match and match.group(2).upper() == b"FETCH":
+                yield text, literals[0] if literals else None
+        if outcome != ["OK"]:
+            raise YahooIMAPError("UID FETCH failed")
+
+    async def fetch_rfc822(self, uid: int) -> Tuple[bytes, List[str], Optional[str]]:
+        found = None
+        async for meta, body in self._uid_fetch(str(uid), "(UID BODY.PEEK[] FLAGS INTERNALDATE)"):
+            parsed_uid, flags, internaldate = _parse_fetch_meta(meta)
+            if parsed_uid == uid and body:
+                found = body, flags, internaldate
+        if found is None:
+            raise YahooIMAPError("RFC822 body missing")
+        return found
+
+    async def fetch_sizes(self, uids: Iterable[int]) -> Dict[int, int]:
+        uid_set = _uid_set(uids)
+        sizes: Dict[int, int] = {}
+        if not uid_set:
+            return sizes
+        async for meta, _ in self._uid_fetch(uid_set, "(UID RFC822.SIZE)"):
+            uid, _, _ = _parse_fetch_meta(meta)
+            size_match = _FETCH_SIZE_RE.search(meta)
+            if uid is not None and size_match:
+                sizes[uid] = int(size_match.group(1))
+        return sizes
+
+    async def fetch_many(
+        self,
+        uids: Iterable[int],
+        sizes: Optional[Dict[int, int]] = None,
+        max_batch_bytes: int = FETCH_BATCH_MAX_BYTES,
+    ) -> AsyncIterator[Tuple[int, bytes, List[str], Optional[str]]]:
+        wanted = sorted(set(uids))
+        if not wanted:
+            return
+        if sizes is None:
+            sizes = await self.fetch_sizes(wanted)
+        wanted.sort(key=lambda uid: (sizes.get(uid, 0), uid))
+        for batch in _batch_uids_by_size(wanted, sizes, max_batch_bytes):
+            batch_uids = set(batch)
+            async for meta, body in self._uid_fetch(_uid_set(batch), "(UID BODY.PEEK[] FLAGS INTERNALDATE)"):
+                uid, flags, internaldate = _parse_fetch_meta(meta)
+                if uid in batch_uids and body:
+                    yield uid, body, flags, internaldate
+
+    async def fetch_headers_many(
+        self,
+        uids: Iterable[int],
+        batch_size: int = HEADER_FETCH_BATCH_UIDS,
+    ) -> AsyncIterator[Tuple[int, bytes, List[str], Optional[str], Optional[int]]]:
+        wanted = sorted(set(uids))
+        items = f"(UID RFC822.SIZE FLAGS INTERNALDATE BODY.PEEK[HEADER.FIELDS ({DISCOVERY_HEADER_FIELDS})])"
+        for idx in range(0, len(wanted), batch_size):
+            batch = wanted[idx : idx + batch_size]
+            batch_uids = set(batch)
+            async for meta, headers in self._uid_fetch(_uid_set(batch), items):
+                uid, flags, internaldate = _parse_fetch_meta(meta)
+                if uid not in batch_uids:
+                    continue
+                size_match = _FETCH_SIZE_RE.search(meta)
+                yield uid, headers or b"", flags, internaldate, int(size_match.group(1)) if size_match else None
+
+    async def delete_uids(self, mailbox: str, uidvalidity: int, uids: Iterable[int]) -> None:
+        uid_set = _uid_set(uids)
+        if not uid_set:
+            return
+        current_uidvalidity, _ = await self.select(mailbox, readonly=False)
+        if current_uidvalidity != uidvalidity:
+            raise YahooIMAPError("UIDVALIDITY changed; refusing to delete")
+        status, _ = await self._command(f"UID STORE {uid_set} +FLAGS.SILENT (\\Deleted)")
+        if status != "OK":
+            raise YahooIMAPError("UID STORE \\Deleted failed")
+        if self.has_capability("UIDPLUS"):
+            status, _ = await self._command(f"UID EXPUNGE {uid_set}")
+            if status != "OK":
+                raise YahooIMAPError("UID EXPUNGE failed")
+            return
+        status, _ = await self._command("EXPUNGE")
+        if status != "OK":
+            raise YahooIMAPError("EXPUNGE failed")
+
+    async def delete_uid(self, mailbox: str, uidvalidity: int, uid: int) -> None:
+        await self.delete_uids(mailbox, uidvalidity, [uid])
+
+    async def idle(self, timeout_seconds: float = IDLE_MAX_SECONDS) -> IdleResult:
+        timeout_seconds = min(timeout_seconds, IDLE_MAX_SECONDS)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout_seconds
+        result = IdleResult()
+        async with self._lock:
+            exists = self._selected.exists if self._selected else None
+            self._tag += 1
+            tag = f"Y{self._tag}".encode("ascii")
+            self._send(tag + b" IDLE\r\n")
+            await self._writer.drain()
+            line = await self._readline()
+            if not line.startswith(b"+"):
+                raise YahooIMAPError(f"IDLE rejected: {line!r}")
+            while not result.new_mail:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    # Cancelling readline() leaves partial data buffered, so a
+                    # timeout here is safe, unlike imaplib's socket timeouts.
+                    line = await self._readline(remaining)
+                except asyncio.TimeoutError:
+                    break
+                event = _parse_idle_line(line)
+                result.events.append(event)
+                if event.kind == "BYE":
+                    raise IMAPAbort(f"server closed IDLE: {line!r}")
+                if event.kind == "EXPUNGE" and exists is not None:
+                    exists -= 1
+                elif event.kind == "EXISTS":
+                    result.new_mail = exists is None or event.number > exists
+                    exists = event.number
+            if self._selected and exists is not None:
+                self._selected.exists = exists
+            self._send(b"DONE\r\n")
+            await self._writer.drain()
+            while True:
+                text, _ = await self._read_response()
+                if text.startswith(tag + b" "):
+                    break
+                self._track_untagged(text)
+        return result
+
+
+class BlockingIMAPClient:
+    # Lets synchronous code running in an executor thread drive an async
+    # client whose connection lives on the event loop.
+    def __init__(self, client: AsyncYahooIMAPClient, loop: asyncio.AbstractEventLoop):
+        self._client = client
+        self._loop = loop
+
+    def _call(self, awaitable):
+        async def _await():
+            return await awaitable
+
+        return asyncio.run_coroutine_threadsafe(_await(), self._loop).result()
+
+    def _iterate(self, agen):
+        try:
+            while True:
+                try:
+                    item = self._call(agen.__anext__())
+                except StopAsyncIteration:
+                    return
+                yield item
+        finally:
+            self._call(agen.aclose())
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if inspect.iscoroutinefunction(attr):
+            return lambda *args, **kwargs: self._call(attr(*args, **kwargs))
+        if inspect.isasyncgenfunction(attr):
+            return lambda *args, **kwargs: self._iterate(attr(*args, **kwargs))
+        return attr
@@ -0,0 +1,90 @@
+import json
+import re
+from dataclasses import asdict, dataclass
+from email.header import decode_header, make_header
+from typing import Dict, List, Optional, Tuple
+
+_BLANK_LINE_RE = re.compile(rb"\r?\n\r?\n")
+_MSG_ID_RE = re.compile(r"<[^>]+>")
+_SUMMARY_FIELDS = ("message-id", "in-reply-to", "references", "date")
+
+
+@dataclass(frozen=True)
+class HeaderSummary:
+    message_id: Optional[str] = None
+    in_reply_to: Optional[str] = None
+    references: Tuple[str, ...] = ()
+    date: Optional[str] = None
+    size: Optional[int] = None
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self), separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, text: Optional[str]) -> Optional["HeaderSummary"]:
+        if not text:
+            return None
+        try:
+            data = json.loads(text)
+            return cls(
+                message_id=data.get("message_id"),
+                in_reply_to=data.get("in_reply_to"),
+                references=tuple(data.get("references") or ()),
+                date=data.get("date"),
+                size=data.get("size"),
+            )
+        except (ValueError, TypeError, AttributeError):
+            return None
+
+
+def _header_block(data: bytes) -> bytes:
+    if data.startswith((b"\n", b"\r\n")):
+        return b""
+    match = _BLANK_LINE_RE.search(data)
+    return data[: match.start()] if match else data
+
+
+def _decode(parts: List[bytes]) -> Optional[str]:
+    # Unfolding only drops the line breaks; the leading whitespace stays.
+    text = b"".join(parts).decode("utf-8", errors="replace")
+    if "=?" in text:
+        try:
+            text = str(make_header(decode_header(text)))
+        except Exception:
+            pass
+    return text.strip() or None
+
+
+def _msg_id(value: Optional[str]) -> Optional[str]:
+    if not value:
+        return None
+    match = _MSG_ID_RE.search(value)
+    return match.group(0) if match else value
+
+
+def scan_headers(data: bytes, size: Optional[int] = None) -> HeaderSummary:
+    # Only the header block is read; body and MIME parts are never touched.
+    fields: Dict[str, List[bytes]] = {}
+    current: Optional[List[bytes]] = None
+    for line in _header_block(data).splitlines():
+        if line[:1] in (b" ", b"\t"):
+            if current is not None:
+                current.append(line)
+            continue
+        name, sep, value = line.partition(b":")
+        current = None
+        if not sep:
+            continue
+        key = name.strip().lower().decode("ascii", errors="replace")
+        # The first occurrence wins, as with email.message.Message.get().
+        if key in _SUMMARY_FIELDS and key not in fields:
+            current = fields[key] = [value]
+    values = {key: _decode(parts) for key, parts in fields.items()}
+    references = values.get("references") or ""
+    return HeaderSummary(
+        message_id=_msg_id(values.get("message-id")),
+        in_reply_to=_msg_id(values.get("in-reply-to")),
+        references=tuple(_MSG_ID_RE.findall(references) or references.split()),
+        date=values.get("date"),
+        size=size,
+    )
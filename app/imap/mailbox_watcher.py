@@ -2,21 +2,30 @@ import hashlib
 import imaplib
 import json
 import time
-import re
-from email.parser import BytesParser
-from email.policy import compat32
-from typing import List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 
-from app.store.models import MessageState
+from app.store.models import RFC822_SHA256_PENDING, MessageState
 from app.log.logger import log_event
 from app.store.db import utc_now_iso
 
-from .yahoo_client import YahooIMAPClient, YahooIMAPError
+from .headers import scan_headers
+from .standby import StandbyConnection
+from .uidset import UIDSet
+from .yahoo_client import FETCH_BATCH_MAX_BYTES, MailboxStatus, YahooIMAPClient, YahooIMAPError
 
 
 EXCLUDE_MAILBOX_SUBSTRINGS = ["draft", "trash", "deleted", "archive"]
 INCLUDE_MAILBOX_SUBSTRINGS = ["bulk", "junk", "spam"]
 SENT_MAILBOX_SUBSTRINGS = ["sent"]
+DISCOVERY_MODE_FULL = "full"
+DISCOVERY_MODE_HEADERS = "headers"
+WATCH_MODE_PER_MAILBOX = "per-mailbox"
+WATCH_MODE_SHARED = "shared"
+SHARED_STATUS_MAX_INTERVAL = 300
+HEARTBEAT_FLUSH_SECONDS = 60
+# A catch-up commits (and wakes delivery) every this many rows, or every
+# fetch_batch_bytes of downloaded mail, instead of once at the end.
+DISCOVERY_COMMIT_ROWS = 200
 
 
 def discover_mailboxes(all_mailboxes: List[str]) -> List[str]:
@@ -47,102 +56,83 @@ def _parse_internaldate(value: Optional[str]) -> Optional[str]:
     return value
 
 
-def _get_message_id(rfc822_bytes: bytes) -> Optional[str]:
-    # Use a lenient policy to avoid crashes on malformed Message-ID headers.
-    try:
-        msg = BytesParser(policy=compat32).parsebytes(rfc822_bytes)
-        value = msg.get("Message-ID")
-    except Exception:
-        return None
-    if not value:
-        return None
-    value_text = str(value)
-    match = re.search(r"<[^>]+>", value_text)
-    return match.group(0) if match else value_text.strip() or None
-
-
 def _sha256_hex(payload: bytes) -> str:
     return hashlib.sha256(payload).hexdigest()
 
 
 def _get_or_create_mailbox(conn, account_id: int, name: str, uidvalidity: int, last_seen_uid: int) -> None:
     now = utc_now_iso()
-    with conn:
-        conn.execute(
-            """
-            INSERT INTO mailboxes(
-              account_id, name, uidvalidity, last_seen_uid,
-              last_poll_at, last_success_at, last_error, last_error_at,
-              created_at, updated_at
-            )
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ON CONFLICT(account_id, name) DO UPDATE SET
-              uidvalidity=excluded.uidvalidity,
-              last_seen_uid=excluded.last_seen_uid,
-              last_poll_at=excluded.last_poll_at,
-              last_success_at=excluded.last_success_at,
-              last_error=excluded.last_error,
-              last_error_at=excluded.last_error_at,
-              updated_at=excluded.updated_at
-            """,
-            (account_id, name, uidvalidity, last_seen_uid, now, now, None, None, now, now),
+    conn.execute(
+        """
+        INSERT INTO mailboxes(
+          account_id, name, uidvalidity, last_seen_uid,
+          last_poll_at, last_success_at, last_error, last_error_at,
+          created_at, updated_at
         )
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(account_id, name) DO UPDATE SET
+          uidvalidity=excluded.uidvalidity,
+          last_seen_uid=excluded.last_seen_uid,
+          last_poll_at=excluded.last_poll_at,
+          last_success_at=excluded.last_success_at,
+          last_error=excluded.last_error,
+          last_error_at=excluded.last_error_at,
+          updated_at=excluded.updated_at
+        """,
+        (account_id, name, uidvalidity, last_seen_uid, now, now, None, None, now, now),
+    )
 
 
-def _mark_mailbox_poll(conn, account_id: int, name: str) -> None:
+def _mark_mailbox_poll(conn, account_id: int, name: str, polled_at: Optional[str] = None) -> None:
     now = utc_now_iso()
-    with conn:
-        conn.execute(
-            """
-            UPDATE mailboxes
-               SET last_poll_at = ?, updated_at = ?
-             WHERE account_id = ? AND name = ?
-            """,
-            (now, now, account_id, name),
-        )
+    conn.execute(
+        """
+        UPDATE mailboxes
+           SET last_poll_at = ?, updated_at = ?
+         WHERE account_id = ? AND name = ?
+        """,
+        (polled_at or now, now, account_id, name),
+    )
 
 
 def _mark_mailbox_success(conn, account_id: int, name: str) -> None:
     now = utc_now_iso()
-    with conn:
-        conn.execute(
-            """
-            UPDATE mailboxes
-               SET last_success_at = ?,
-                   last_error = NULL,
-                   last_error_at = NULL,
-                   updated_at = ?
-             WHERE account_id = ? AND name = ?
-            """,
-            (now, now, account_id, name),
-        )
+    conn.execute(
+        """
+        UPDATE mailboxes
+           SET last_success_at = ?,
+               last_error = NULL,
+               last_error_at = NULL,
+               updated_at = ?
+         WHERE account_id = ? AND name = ?
+        """,
+        (now, now, account_id, name),
+    )
 
 
 def _mark_mailbox_error(conn, account_id: int, name: str, error: str) -> None:
     now = utc_now_iso()
-    with conn:
-        conn.execute(
-            """
-            UPDATE mailboxes
-               SET last_error = ?,
-                   last_error_at = ?,
-                   updated_at = ?
-             WHERE account_id = ? AND name = ?
-            """,
-            (error, now, now, account_id, name),
-        )
+    conn.execute(
+        """
+        UPDATE mailboxes
+           SET last_error = ?,
+               last_error_at = ?,
+               updated_at = ?
+         WHERE account_id = ? AND name = ?
+        """,
+        (error, now, now, account_id, name),
+    )
 
 
 def _update_last_seen(conn, account_id: int, name: str, last_seen_uid: int) -> None:
-    with conn:
-        conn.execute(
-            """
-            UPDATE mailboxes
-               SET last_seen_uid = ?, updated_at = ?
-             WHERE account_id = ? AND name = ?
-            """,
-            (last_seen_uid, utc_now_iso(), account_id, name),
-        )
+    conn.execute(
+        """
+        UPDATE mailboxes
+           SET last_seen_uid = ?, updated_at = ?
+         WHERE account_id = ? AND name = ?
+        """,
+        (last_seen_uid, utc_now_iso(), account_id, name),
+    )
 
 
 def _get_last_seen(conn, account_id: int, name: str) -> Optional[int]:
@@ -169,26 +159,136 @@ def _get_mailbox_state(conn, account_id: int, name: str) -> Optional[Tuple[int,
     return int(row[0]), int(row[1])
 
 
-def _message_exists(conn, account_id: int, mailbox_name: str, uidvalidity: int, uid: int) -> bool:
-    row = conn.execute(
+def _get_change_markers(conn, account_id: int, name: str):
+    return conn.execute(
         """
-        SELECT 1 FROM messages
+        SELECT uidvalidity, uidnext, highest_modseq, exists_count FROM mailboxes
+         WHERE account_id = ? AND name = ?
+        """,
+        (account_id, name),
+    ).fetchone()
+
+
+def _update_change_markers(conn, account_id: int, name: str, status: MailboxStatus) -> None:
+    conn.execute(
+        """
+        UPDATE mailboxes
+           SET uidnext = ?, highest_modseq = ?, exists_count = ?, updated_at = ?
+         WHERE account_id = ? AND name = ? AND uidvalidity = ?
+        """,
+        (
+            status.uidnext,
+            status.highest_modseq,
+            status.exists,
+            utc_now_iso(),
+            account_id,
+            name,
+            status.uidvalidity,
+        ),
+    )
+
+
+class MailboxHeartbeats:
+    # Polls that find nothing new only move last_poll_at/last_success_at.
+    # Keep those in memory and write them at most every flush_interval seconds
+    # per mailbox; polls that write anything else carry them along for free.
+    def __init__(self, flush_interval: float = HEARTBEAT_FLUSH_SECONDS):
+        self.flush_interval = flush_interval
+        self._pending: Dict[Tuple[int, str], str] = {}
+        self._flushed_at: Dict[Tuple[int, str], float] = {}
+
+    def record(self, conn, account_id: int, name: str, polled_at: str) -> None:
+        key = (account_id, name)
+        self._pending[key] = polled_at
+        flushed_at = self._flushed_at.get(key)
+        if flushed_at is None or time.monotonic() - flushed_at >= self.flush_interval:
+            with conn:
+                self.write(conn, account_id, name)
+
+    def write(self, conn, account_id: int, name: str, polled_at: Optional[str] = None) -> None:
+        key = (account_id, name)
+        polled_at = polled_at or self._pending.get(key)
+        self._pending.pop(key, None)
+        _mark_mailbox_poll(conn, account_id, name, polled_at)
+        _mark_mailbox_success(conn, account_id, name)
+        self._flushed_at[key] = time.monotonic()
+
+
+def _write_heartbeat(
+    conn, account_id: int, name: str, polled_at: str, heartbeats: Optional[MailboxHeartbeats] = None
+) -> None:
+    if heartbeats is not None:
+        heartbeats.write(conn, account_id, name, polled_at)
+        return
+    _mark_mailbox_poll(conn, account_id, name, polled_at)
+    _mark_mailbox_success(conn, account_id, name)
+
+
+def _mailbox_unchanged(markers, status: MailboxStatus) -> bool:
+    if markers is None or markers["uidvalidity"] != status.uidvalidity:
+        return False
+    if status.highest_modseq is not None and markers["highest_modseq"] == status.highest_modseq:
+        return True
+    # Only new messages advance UIDNEXT; flag changes and expunges never do.
+    if status.uidnext is not None and markers["uidnext"] is not None:
+        return markers["uidnext"] == status.uidnext
+    # EXISTS alone cannot tell an arrival from our own deletes, so keep searching.
+    return False
+
+
+def _known_uids(conn, account_id: int, mailbox_name: str, uidvalidity: int, uids: UIDSet) -> UIDSet:
+    if not uids:
+        return UIDSet()
+    rows = conn.execute(
+        """
+        SELECT uid FROM messages
          WHERE account_id = ?
            AND mailbox_name = ?
            AND uidvalidity = ?
-           AND uid = ?
+           AND uid BETWEEN ? AND ?
         """,
-        (account_id, mailbox_name, uidvalidity, uid),
-    ).fetchone()
-    return row is not None
+        (account_id, mailbox_name, uidvalidity, uids.first, uids.last),
+    ).fetchall()
+    return UIDSet.from_uids(row[0] for row in rows)
+
+
+class KnownUIDIndex:
+    # UIDs already in `messages`, per (account, mailbox, uidvalidity). Only the
+    # watchers insert message rows and none are ever deleted, so after one cold
+    # load the index is kept current by add() and polls never query per UID.
+    def __init__(self):
+        self._known: Dict[Tuple[int, str, int], UIDSet] = {}
+
+    def get(self, conn, account_id: int, mailbox_name: str, uidvalidity: int) -> UIDSet:
+        key = (account_id, mailbox_name, uidvalidity)
+        known = self._known.get(key)
+        if known is None:
+            for stale in [k for k in self._known if k[:2] == key[:2]]:
+                del self._known[stale]
+            rows = conn.execute(
+                """
+                SELECT uid FROM messages
+                 WHERE account_id = ?
+                   AND mailbox_name = ?
+                   AND uidvalidity = ?
+                """,
+                key,
+            )
+            known = UIDSet.from_uids(row[0] for row in rows)
+            self._known[key] = known
+        return known
+
+    def add(self, account_id: int, mailbox_name: str, uidvalidity: int, uid: int) -> None:
+        known = self._known.get((account_id, mailbox_name, uidvalidity))
+        if known is not None:
+            known.add(uid)
 
 
 def _replay_start_uid(last_seen_uid: int, replay_window_uids: int) -> int:
     return max(1, last_seen_uid - replay_window_uids)
 
 
-def _store_message(
-    conn,
+def _message_row(
     account_id: int,
     mailbox_name: str,
     uidvalidity: int,
@@ -196,36 +296,46 @@ def _store_message(
     rfc822_bytes: bytes,
     flags_list: List[str],
     internaldate_value: Optional[str],
-) -> None:
+    headers_only: bool = False,
+    spool=None,
+    size: Optional[int] = None,
+) -> tuple:
     now = utc_now_iso()
-    message_id = _get_message_id(rfc822_bytes)
-    sha256_hex = _sha256_hex(rfc822_bytes)
+    headers = scan_headers(rfc822_bytes, size)
+    sha256_hex = RFC822_SHA256_PENDING if headers_only else _sha256_hex(rfc822_bytes)
     flags_json = _parse_flags(flags_list)
     internaldate = _parse_internaldate(internaldate_value)
-    with conn:
-        conn.execute(
-            """
-            INSERT INTO messages(
-              account_id, mailbox_name, uidvalidity, uid, message_id,
-              rfc822_sha256, imap_internaldate, imap_flags_json, state,
-              created_at, updated_at
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ON CONFLICT(account_id, mailbox_name, uidvalidity, uid) DO NOTHING
-            """,
-            (
-                account_id,
-                mailbox_name,
-                uidvalidity,
-                uid,
-                message_id,
-                sha256_hex,
-                internaldate,
-                flags_json,
-                MessageState.FETCHED,
-                now,
-                now,
-            ),
-        )
+    if spool and not headers_only:
+        spool.put(sha256_hex, rfc822_bytes)
+    return (
+        account_id,
+        mailbox_name,
+        uidvalidity,
+        uid,
+        headers.message_id,
+        sha256_hex,
+        size,
+        headers.to_json(),
+        internaldate,
+        flags_json,
+        MessageState.FETCHED,
+        now,
+        now,
+    )
+
+
+def _insert_message_rows(conn, rows: List[tuple]) -> None:
+    conn.executemany(
+        """
+        INSERT INTO messages(
+          account_id, mailbox_name, uidvalidity, uid, message_id,
+          rfc822_sha256, rfc822_size, headers_json, imap_internaldate, imap_flags_json,
+          state, created_at, updated_at
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(account_id, mailbox_name, uidvalidity, uid) DO NOTHING
+        """,
+        rows,
+    )
 
 
 def initialize_mailbox_state(
@@ -235,14 +345,21 @@ def initialize_mailbox_state(
     mailbox: str,
 ) -> Tuple[int, int]:
     uidvalidity, _ = client.select(mailbox)
-    uids = client.search_uids(1)
-    last_seen = max(uids) if uids else 0
-    _get_or_create_mailbox(conn, account_id, mailbox, uidvalidity, last_seen)
-    _mark_mailbox_poll(conn, account_id, mailbox)
-    _mark_mailbox_success(conn, account_id, mailbox)
+    uids = UIDSet.from_uids(client.search_uids(1))
+    last_seen = uids.last or 0
+    with conn:
+        _get_or_create_mailbox(conn, account_id, mailbox, uidvalidity, last_seen)
     return uidvalidity, last_seen
 
 
+def _discover_messages(client: YahooIMAPClient, uids: List[int], discovery_mode: str, fetch_batch_bytes: int):
+    if discovery_mode == DISCOVERY_MODE_HEADERS:
+        yield from client.fetch_headers_many(uids)
+        return
+    for uid, rfc822, flags_list, internal_value in client.fetch_many(uids, max_batch_bytes=fetch_batch_bytes):
+        yield uid, rfc822, flags_list, internal_value, len(rfc822)
+
+
 def process_new_messages(
     client: YahooIMAPClient,
     conn,
@@ -252,22 +369,40 @@ def process_new_messages(
     last_seen_uid: int,
     replay_window_uids: int = 0,
     logger=None,
+    fetch_batch_bytes: int = FETCH_BATCH_MAX_BYTES,
+    discovery_mode: str = DISCOVERY_MODE_FULL,
+    spool=None,
+    known_uids: Optional[KnownUIDIndex] = None,
+    heartbeats: Optional[MailboxHeartbeats] = None,
+    wakeup=None,
+    commit_rows: int = DISCOVERY_COMMIT_ROWS,
 ) -> int:
-    _mark_mailbox_poll(conn, account_id, mailbox)
-    try:
-        client.noop()
-    except Exception:
-        pass
-    uids = client.search_uids(_replay_start_uid(last_seen_uid, replay_window_uids))
+    polled_at = utc_now_iso()
+    # A fresh SELECT doubles as the old NOOP and reports UIDNEXT/HIGHESTMODSEQ.
+    status = client.select_status(mailbox, force=True)
+    if status.uidvalidity == uidvalidity and _mailbox_unchanged(
+        _get_change_markers(conn, account_id, mailbox), status
+    ):
+        if heartbeats is not None:
+            heartbeats.record(conn, account_id, mailbox, polled_at)
+        else:
+            with conn:
+                _write_heartbeat(conn, account_id, mailbox, polled_at)
+        return last_seen_uid
+    uids = UIDSet.from_uids(client.search_uids(_replay_start_uid(last_seen_uid, replay_window_uids)))
     if not uids:
-        _mark_mailbox_success(conn, account_id, mailbox)
+        with conn:
+            _update_change_markers(conn, account_id, mailbox, status)
+            _write_heartbeat(conn, account_id, mailbox, polled_at, heartbeats)
         return last_seen_uid
-    max_seen = last_seen_uid
-    for uid in uids:
-        if uid > max_seen:
-            max_seen = uid
-        if _message_exists(conn, account_id, mailbox, uidvalidity, uid):
-            continue
+    max_seen = max(last_seen_uid, uids.last)
+    if known_uids is not None:
+        known = known_uids.get(conn, account_id, mailbox, uidvalidity)
+    else:
+        known = _known_uids(conn, account_id, mailbox, uidvalidity, uids)
+    # Only UIDs missing from the store are ever expanded.
+    missing = list(uids - known)
+    for uid in missing:
         if logger:
             log_event(
                 logger,
@@ -278,66 +413,112 @@ def process_new_messages(
                 uid=uid,
                 uidvalidity=uidvalidity,
             )
-        try:
-            rfc822, flags_list, internal_value = client.fetch_rfc822(uid)
-        except Exception as exc:
-            _mark_mailbox_error(conn, account_id, mailbox, repr(exc))
-            if logger:
-                log_event(
-                    logger,
-                    "message_fetch_failure",
-                    "message fetch failed",
-                    correlation_id=f"{mailbox}|{uidvalidity}|{uid}",
-                    mailbox=mailbox,
-                    uid=uid,
-                    uidvalidity=uidvalidity,
-                    error=repr(exc),
-                    error_type=type(exc).__name__,
+    fetched = set()
+    rows: List[tuple] = []
+    stored = 0
+    chunk_bytes = 0
+    errors: List[str] = []
+    fetch_error: Optional[Exception] = None
+
+    def _commit_rows(final: bool = False) -> None:
+        nonlocal rows, stored, chunk_bytes
+        with conn:
+            if final and errors:
+                _mark_mailbox_error(conn, account_id, mailbox, errors[-1])
+            _insert_message_rows(conn, rows)
+            if final:
+                # Fetches run smallest first, so until the pass ends a higher
+                # UID being stored says nothing about the lower ones.
+                _update_last_seen(conn, account_id, mailbox, max_seen)
+                if stored + len(rows) == len(missing):
+                    # Otherwise keep the old markers so the next poll searches again.
+                    _update_change_markers(conn, account_id, mailbox, status)
+                _write_heartbeat(conn, account_id, mailbox, polled_at, heartbeats)
+        if known_uids is not None:
+            for row in rows:
+                known_uids.add(account_id, mailbox, uidvalidity, row[3])
+        if rows and wakeup is not None:
+            wakeup.notify()
+        stored += len(rows)
+        rows = []
+        chunk_bytes = 0
+
+    try:
+        headers_only = discovery_mode == DISCOVERY_MODE_HEADERS
+        discovered = _discover_messages(client, missing, discovery_mode, fetch_batch_bytes)
+        for uid, payload, flags_list, internal_value, size in discovered:
+            fetched.add(uid)
+            try:
+                rows.append(
+                    _message_row(
+                        account_id,
+                        mailbox,
+                        uidvalidity,
+                        uid,
+                        payload,
+                        flags_list,
+                        internal_value,
+                        headers_only=headers_only,
+                        spool=spool,
+                        size=size,
+                    )
                 )
-            continue
-        try:
-            _store_message(conn, account_id, mailbox, uidvalidity, uid, rfc822, flags_list, internal_value)
-        except Exception as exc:
-            _mark_mailbox_error(conn, account_id, mailbox, repr(exc))
+            except Exception as exc:
+                errors.append(repr(exc))
+                if logger:
+                    log_event(
+                        logger,
+                        "message_store_failure",
+                        "message store failed",
+                        correlation_id=f"{mailbox}|{uidvalidity}|{uid}",
+                        mailbox=mailbox,
+                        uid=uid,
+                        uidvalidity=uidvalidity,
+                        error=repr(exc),
+                        error_type=type(exc).__name__,
+                    )
+                continue
             if logger:
                 log_event(
                     logger,
-                    "message_store_failure",
-                    "message store failed",
+                    "message_fetched",
+                    "message fetched",
                     correlation_id=f"{mailbox}|{uidvalidity}|{uid}",
                     mailbox=mailbox,
                     uid=uid,
                     uidvalidity=uidvalidity,
-                    error=repr(exc),
-                    error_type=type(exc).__name__,
+                    size=size,
+                    discovery_mode=discovery_mode,
                 )
+            chunk_bytes += size or 0
+            if len(rows) >= commit_rows or chunk_bytes >= fetch_batch_bytes:
+                _commit_rows()
+    except Exception as exc:
+        fetch_error = exc
+    for uid in missing:
+        if uid in fetched:
             continue
+        # UIDs the server skipped (or never reached) are left for the replay window.
+        exc = fetch_error or YahooIMAPError("RFC822 body missing")
+        errors.append(repr(exc))
         if logger:
             log_event(
                 logger,
-                "message_fetched",
-                "message fetched",
+                "message_fetch_failure",
+                "message fetch failed",
                 correlation_id=f"{mailbox}|{uidvalidity}|{uid}",
                 mailbox=mailbox,
                 uid=uid,
                 uidvalidity=uidvalidity,
-                size=len(rfc822),
+                error=repr(exc),
+                error_type=type(exc).__name__,
             )
-    _update_last_seen(conn, account_id, mailbox, max_seen)
-    _mark_mailbox_success(conn, account_id, mailbox)
+    # The last transaction also moves the change markers and the heartbeat.
+    _commit_rows(final=True)
     return max_seen
 
 
-def watch_mailbox(
-    client: YahooIMAPClient,
-    conn,
-    account_id: int,
-    mailbox: str,
-    replay_window_uids: int = 0,
-    idle_timeout: int = 900,
-    poll_interval: int = 30,
-    logger=None,
-) -> None:
+def _prepare_mailbox(client: YahooIMAPClient, conn, account_id: int, mailbox: str, logger=None) -> Tuple[int, int]:
     uidvalidity, _ = client.select(mailbox)
     if logger:
         log_event(
@@ -349,22 +530,57 @@ def watch_mailbox(
         )
     stored = _get_mailbox_state(conn, account_id, mailbox)
     if stored is None:
-        uidvalidity, last_seen = initialize_mailbox_state(client, conn, account_id, mailbox)
-    else:
-        stored_uidvalidity, last_seen = stored
-        if stored_uidvalidity != uidvalidity:
-            if logger:
-                log_event(
-                    logger,
-                    "imap_uidvalidity_reset",
-                    "uidvalidity changed; resetting last_seen_uid",
-                    correlation_id=f"{mailbox}|{uidvalidity}|0",
-                    mailbox=mailbox,
-                    old_uidvalidity=stored_uidvalidity,
-                    new_uidvalidity=uidvalidity,
-                )
+        return initialize_mailbox_state(client, conn, account_id, mailbox)
+    stored_uidvalidity, last_seen = stored
+    if stored_uidvalidity != uidvalidity:
+        if logger:
+            log_event(
+                logger,
+                "imap_uidvalidity_reset",
+                "uidvalidity changed; resetting last_seen_uid",
+                correlation_id=f"{mailbox}|{uidvalidity}|0",
+                mailbox=mailbox,
+                old_uidvalidity=stored_uidvalidity,
+                new_uidvalidity=uidvalidity,
+            )
+        with conn:
             _get_or_create_mailbox(conn, account_id, mailbox, uidvalidity, 0)
-            last_seen = 0
+        last_seen = 0
+    return uidvalidity, last_seen
+
+
+def _reconnect(
+    client: YahooIMAPClient, mailbox: str, standby: Optional[StandbyConnection] = None
+) -> Tuple[int, int, bool]:
+    started = time.monotonic()
+    from_standby = False
+    if standby is not None:
+        spare, from_standby = standby.take()
+        client.adopt(spare)
+    else:
+        client.close()
+        client.connect()
+    uidvalidity, _ = client.select(mailbox)
+    return uidvalidity, int((time.monotonic() - started) * 1000), from_standby
+
+
+def watch_mailbox(
+    client: YahooIMAPClient,
+    conn,
+    account_id: int,
+    mailbox: str,
+    replay_window_uids: int = 0,
+    idle_timeout: int = 900,
+    poll_interval: int = 30,
+    logger=None,
+    discovery_mode: str = DISCOVERY_MODE_FULL,
+    spool=None,
+    standby: Optional[StandbyConnection] = None,
+    wakeup=None,
+) -> None:
+    uidvalidity, last_seen = _prepare_mailbox(client, conn, account_id, mailbox, logger=logger)
+    known_uids = KnownUIDIndex()
+    heartbeats = MailboxHeartbeats()
 
     # Startup catch-up to process messages received while the watcher was down.
     last_seen = process_new_messages(
@@ -376,6 +592,11 @@ def watch_mailbox(
         last_seen,
         replay_window_uids=replay_window_uids,
         logger=logger,
+        discovery_mode=discovery_mode,
+        spool=spool,
+        known_uids=known_uids,
+        heartbeats=heartbeats,
+        wakeup=wakeup,
     )
 
     while True:
@@ -389,7 +610,7 @@ def watch_mailbox(
                         correlation_id=f"{mailbox}|{uidvalidity}|{last_seen}",
                         mailbox=mailbox,
                     )
-                line = client.idle_wait(timeout_seconds=idle_timeout)
+                result = client.idle(timeout_seconds=idle_timeout)
                 if logger:
                     log_event(
                         logger,
@@ -397,88 +618,33 @@ def watch_mailbox(
                         "exited idle",
                         correlation_id=f"{mailbox}|{uidvalidity}|{last_seen}",
                         mailbox=mailbox,
-                        notified=bool(line),
-                    )
-                if line is not None:
-                    if logger:
-                        log_event(
-                            logger,
-                            "imap_idle_reconnect",
-                            "idle ended; reconnecting",
-                            correlation_id=f"{mailbox}|{uidvalidity}|{last_seen}",
-                            mailbox=mailbox,
-                        )
-                    try:
-                        client.close()
-                        client.connect()
-                        uidvalidity, _ = client.select(mailbox)
-                        if logger:
-                            log_event(
-                                logger,
-                                "imap_reconnect",
-                                "imap reconnected",
-                                correlation_id=f"{mailbox}|{uidvalidity}|{last_seen}",
-                                mailbox=mailbox,
-                            )
-                    except YahooIMAPError:
-                        time.sleep(poll_interval)
-                        continue
-                if line is None:
-                    if logger:
-                        log_event(
-                            logger,
-                            "imap_idle_timeout",
-                            "idle timeout; reconnecting",
-                            correlation_id=f"{mailbox}|{uidvalidity}|{last_seen}",
-                            mailbox=mailbox,
-                        )
-                    try:
-                        client.close()
-                        client.connect()
-                        uidvalidity, _ = client.select(mailbox)
-                        if logger:
-                            log_event(
-                                logger,
-                                "imap_reconnect",
-                                "imap reconnected",
-                                correlation_id=f"{mailbox}|{uidvalidity}|{last_seen}",
-                                mailbox=mailbox,
-                            )
-                    except YahooIMAPError:
-                        pass
-                    time.sleep(poll_interval)
-                    continue
-                if line and (b"EXISTS" in line or b"RECENT" in line):
-                    if logger:
-                        log_event(
-                            logger,
-                            "imap_idle",
-                            "idle notified of new messages",
-                            correlation_id=f"{mailbox}|{uidvalidity}|{last_seen}",
-                            mailbox=mailbox,
-                        )
-                    last_seen = process_new_messages(
-                        client,
-                        conn,
-                        account_id,
-                        mailbox,
-                        uidvalidity,
-                        last_seen,
-                        replay_window_uids=replay_window_uids,
-                        logger=logger,
+                        notified=result.new_mail,
+                        events=[event.kind for event in result.events],
                     )
-                else:
-                    # periodic refresh
-                    last_seen = process_new_messages(
-                        client,
-                        conn,
-                        account_id,
-                        mailbox,
-                        uidvalidity,
-                        last_seen,
-                        replay_window_uids=replay_window_uids,
-                        logger=logger,
+                if result.new_mail and logger:
+                    log_event(
+                        logger,
+                        "imap_idle",
+                        "idle notified of new messages",
+                        correlation_id=f"{mailbox}|{uidvalidity}|{last_seen}",
+                        mailbox=mailbox,
                     )
+                # Either new mail or the periodic refresh; IDLE resumes on this connection.
+                last_seen = process_new_messages(
+                    client,
+                    conn,
+                    account_id,
+                    mailbox,
+                    uidvalidity,
+                    last_seen,
+                    replay_window_uids=replay_window_uids,
+                    logger=logger,
+                    discovery_mode=discovery_mode,
+                    spool=spool,
+                    known_uids=known_uids,
+                    heartbeats=heartbeats,
+                    wakeup=wakeup,
+                )
             else:
                 time.sleep(poll_interval)
                 last_seen = process_new_messages(
@@ -490,6 +656,11 @@ def watch_mailbox(
                     last_seen,
                     replay_window_uids=replay_window_uids,
                     logger=logger,
+                    discovery_mode=discovery_mode,
+                    spool=spool,
+                    known_uids=known_uids,
+                    heartbeats=heartbeats,
+                    wakeup=wakeup,
                 )
         except (OSError, imaplib.IMAP4.abort, imaplib.IMAP4.error) as exc:
             if logger:
@@ -502,9 +673,7 @@ def watch_mailbox(
                     error=str(exc),
                 )
             try:
-                client.close()
-                client.connect()
-                uidvalidity, _ = client.select(mailbox)
+                uidvalidity, reconnect_ms, from_standby = _reconnect(client, mailbox, standby)
                 if logger:
                     log_event(
                         logger,
@@ -512,10 +681,12 @@ def watch_mailbox(
                         "imap reconnected",
                         correlation_id=f"{mailbox}|{uidvalidity}|{last_seen}",
                         mailbox=mailbox,
+                        reconnect_ms=reconnect_ms,
+                        standby=from_standby,
+                        tls_resumed=client.tls_session_reused,
                     )
             except YahooIMAPError:
-                pass
-            time.sleep(poll_interval)
+                time.sleep(poll_interval)
         except YahooIMAPError as exc:
             if logger:
                 log_event(
@@ -527,9 +698,7 @@ def watch_mailbox(
                     error=str(exc),
                 )
             try:
-                client.close()
-                client.connect()
-                uidvalidity, _ = client.select(mailbox)
+                uidvalidity, reconnect_ms, from_standby = _reconnect(client, mailbox, standby)
                 if logger:
                     log_event(
                         logger,
@@ -537,7 +706,111 @@ def watch_mailbox(
                         "imap reconnected",
                         correlation_id=f"{mailbox}|{uidvalidity}|{last_seen}",
                         mailbox=mailbox,
+                        reconnect_ms=reconnect_ms,
+                        standby=from_standby,
+                        tls_resumed=client.tls_session_reused,
                     )
             except YahooIMAPError:
-                pass
-            time.sleep(poll_interval)
+                time.sleep(poll_interval)
+
+
+def _primary_mailbox(mailboxes: List[str]) -> str:
+    for name in mailboxes:
+        if name.lower() == "inbox":
+            return name
+    return mailboxes[0]
+
+
+def watch_mailboxes_shared(
+    client: YahooIMAPClient,
+    conn,
+    account_id: int,
+    mailboxes: List[str],
+    replay_window_uids: int = 0,
+    idle_timeout: int = 900,
+    poll_interval: int = 30,
+    status_max_interval: int = SHARED_STATUS_MAX_INTERVAL,
+    logger=None,
+    discovery_mode: str = DISCOVERY_MODE_FULL,
+    spool=None,
+    wakeup=None,
+) -> None:
+    # One connection for every mailbox: IDLE on INBOX, STATUS for the rest.
+    # IMAP errors propagate so the caller reconnects with a fresh client.
+    primary = _primary_mailbox(mailboxes)
+    others = [name for name in mailboxes if name != primary]
+    state = {}
+    known_uids = KnownUIDIndex()
+    heartbeats = MailboxHeartbeats()
+
+    def _poll(mailbox: str) -> bool:
+        uidvalidity, last_seen = state[mailbox]
+        max_seen = process_new_messages(
+            client,
+            conn,
+            account_id,
+            mailbox,
+            uidvalidity,
+            last_seen,
+            replay_window_uids=replay_window_uids,
+            logger=logger,
+            discovery_mode=discovery_mode,
+            spool=spool,
+            known_uids=known_uids,
+            heartbeats=heartbeats,
+            wakeup=wakeup,
+        )
+        state[mailbox] = (uidvalidity, max_seen)
+        return max_seen > last_seen
+
+    for mailbox in mailboxes:
+        state[mailbox] = _prepare_mailbox(client, conn, account_id, mailbox, logger=logger)
+        _poll(mailbox)
+
+    primary_period = idle_timeout if client.has_idle() else poll_interval
+    now = time.monotonic()
+    primary_due = now + primary_period
+    intervals = {name: poll_interval for name in others}
+    due = {name: now + poll_interval for name in others}
+
+    while True:
+        now = time.monotonic()
+        wait = min([primary_due] + list(due.values())) - now
+        new_mail = False
+        if wait > 0:
+            if client.has_idle():
+                client.select(primary)
+                result = client.idle(timeout_seconds=wait)
+                new_mail = result.new_mail
+                if new_mail and logger:
+                    uidvalidity, last_seen = state[primary]
+                    log_event(
+                        logger,
+                        "imap_idle",
+                        "idle notified of new messages",
+                        correlation_id=f"{primary}|{uidvalidity}|{last_seen}",
+                        mailbox=primary,
+                    )
+            else:
+                time.sleep(wait)
+        if new_mail or time.monotonic() >= primary_due:
+            _poll(primary)
+            primary_due = time.monotonic() + primary_period
+
+        for mailbox in others:
+            if time.monotonic() < due[mailbox]:
+                continue
+            uidvalidity, _ = state[mailbox]
+            status = client.mailbox_status(mailbox)
+            if status.uidvalidity != uidvalidity:
+                state[mailbox] = _prepare_mailbox(client, conn, account_id, mailbox, logger=logger)
+            elif _mailbox_unchanged(_get_change_markers(conn, account_id, mailbox), status):
+                heartbeats.record(conn, account_id, mailbox, utc_now_iso())
+                intervals[mailbox] = min(intervals[mailbox] * 2, status_max_interval)
+                due[mailbox] = time.monotonic() + intervals[mailbox]
+                continue
+            if _poll(mailbox):
+                intervals[mailbox] = poll_interval
+            else:
+                intervals[mailbox] = min(intervals[mailbox] * 2, status_max_interval)
+            due[mailbox] = time.monotonic() + intervals[mailbox]
@@ -0,0 +1,138 @@
+import imaplib
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Deque, Iterator, Optional, Tuple
+
+from app.log.logger import log_event
+
+from .yahoo_client import YahooIMAPClient, YahooIMAPError
+
+STALE_CONNECTION_ERRORS = (OSError, imaplib.IMAP4.error)
+
+
+class IMAPSessionPool:
+    def __init__(
+        self,
+        client_factory: Callable[[], YahooIMAPClient],
+        max_size: int = 2,
+        health_check_after: float = 30.0,
+        max_idle_seconds: float = 600.0,
+        logger=None,
+    ):
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        self.client_factory = client_factory
+        self.max_size = max_size
+        self.health_check_after = health_check_after
+        self.max_idle_seconds = max_idle_seconds
+        self.logger = logger
+        self._cond = threading.Condition()
+        self._idle: Deque[Tuple[YahooIMAPClient, float]] = deque()
+        self._open = 0
+
+    @property
+    def open_count(self) -> int:
+        with self._cond:
+            return self._open
+
+    def acquire(self, timeout: Optional[float] = None) -> YahooIMAPClient:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                if self._idle:
+                    client, released_at = self._idle.pop()
+                    break
+                if self._open < self.max_size:
+                    self._open += 1
+                    client, released_at = None, None
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise YahooIMAPError("timed out waiting for a pooled IMAP session")
+                self._cond.wait(remaining)
+        try:
+            if client is None:
+                return self.client_factory()
+            return self._revalidate(client, released_at)
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+
+    def _revalidate(self, client: YahooIMAPClient, released_at: float) -> YahooIMAPClient:
+        idle_for = time.monotonic() - released_at
+        if idle_for < self.health_check_after:
+            return client
+        if idle_for < self.max_idle_seconds:
+            try:
+                client.noop()
+                return client
+            except STALE_CONNECTION_ERRORS + (YahooIMAPError,) as exc:
+                if self.logger:
+                    log_event(
+                        self.logger,
+                        "imap_pool_stale",
+                        "pooled imap session failed health check; reconnecting",
+                        error=repr(exc),
+                        idle_seconds=int(idle_for),
+                    )
+        _close_quietly(client)
+        return self.client_factory()
+
+    def release(self, client: YahooIMAPClient, discard: bool = False) -> None:
+        if discard:
+            _close_quietly(client)
+        with self._cond:
+            if discard:
+                self._open -= 1
+            else:
+                self._idle.append((client, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def session(self) -> Iterator[YahooIMAPClient]:
+        client = self.acquire()
+        discard = False
+        try:
+            yield client
+        except STALE_CONNECTION_ERRORS:
+            discard = True
+            raise
+        finally:
+            self.release(client, discard=discard)
+
+    def prune(self) -> int:
+        cutoff = time.monotonic() - self.max_idle_seconds
+        expired = []
+        with self._cond:
+            kept: Deque[Tuple[YahooIMAPClient, float]] = deque()
+            for client, released_at in self._idle:
+                if released_at <= cutoff:
+                    expired.append(client)
+                else:
+                    kept.append((client, released_at))
+            self._idle = kept
+            self._open -= len(expired)
+            self._cond.notify_all()
+        for client in expired:
+            _close_quietly(client)
+        return len(expired)
+
+    def close(self) -> None:
+        with self._cond:
+            idle = [client for client, _ in self._idle]
+            self._idle.clear()
+            self._open -= len(idle)
+            self._cond.notify_all()
+        for client in idle:
+            _close_quietly(client)
+
+
+def _close_quietly(client: YahooIMAPClient) -> None:
+    try:
+        client.close()
+    except Exception:
+        pass
@@ -0,0 +1,94 @@
+import threading
+import time
+from typing import Callable, Optional, Tuple
+
+from app.log.logger import log_event
+
+from .pool import STALE_CONNECTION_ERRORS, _close_quietly
+from .yahoo_client import YahooIMAPClient, YahooIMAPError
+
+
+class StandbyConnection:
+    # Keeps one authenticated spare connection warm in the background so a
+    # watcher that loses its session can swap it in without a fresh TLS
+    # handshake and LOGIN on the hot path.
+    def __init__(
+        self,
+        client_factory: Callable[[], YahooIMAPClient],
+        health_check_after: float = 60.0,
+        logger=None,
+    ):
+        self.client_factory = client_factory
+        self.health_check_after = health_check_after
+        self.logger = logger
+        self._cond = threading.Condition()
+        self._spare: Optional[Tuple[YahooIMAPClient, float]] = None
+        self._refilling = False
+        self._closed = False
+
+    def start(self) -> None:
+        self._refill_async()
+
+    def take(self) -> Tuple[YahooIMAPClient, bool]:
+        with self._cond:
+            spare, self._spare = self._spare, None
+        client = None
+        if spare is not None:
+            client, ready_at = spare
+            if time.monotonic() - ready_at >= self.health_check_after:
+                try:
+                    client.noop()
+                except STALE_CONNECTION_ERRORS + (YahooIMAPError,) as exc:
+                    if self.logger:
+                        log_event(
+                            self.logger,
+                            "imap_standby_stale",
+                            "standby imap session failed health check; connecting inline",
+                            error=repr(exc),
+                        )
+                    _close_quietly(client)
+                    client = None
+        self._refill_async()
+        if client is not None:
+            return client, True
+        return self.client_factory(), False
+
+    def _refill_async(self) -> None:
+        with self._cond:
+            if self._closed or self._refilling or self._spare is not None:
+                return
+            self._refilling = True
+        threading.Thread(target=self._refill, name="y2g-imap-standby", daemon=True).start()
+
+    def _refill(self) -> None:
+        client = None
+        try:
+            client = self.client_factory()
+        except Exception as exc:
+            if self.logger:
+                log_event(
+                    self.logger,
+                    "imap_standby_error",
+                    "standby imap connection failed",
+                    error=repr(exc),
+                    error_type=type(exc).__name__,
+                )
+        with self._cond:
+            self._refilling = False
+            if client is not None and not self._closed and self._spare is None:
+                self._spare = (client, time.monotonic())
+                client = None
+                self._cond.notify_all()
+        if client is not None:
+            _close_quietly(client)
+
+    def wait_ready(self, timeout: float) -> bool:
+        with self._cond:
+            return self._cond.wait_for(lambda: self._spare is not None, timeout)
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            spare, self._spare = self._spare, None
+        if spare is not None:
+            _close_quietly(spare[0])
@@ -0,0 +1,128 @@
+import bisect
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+
+Range = Tuple[int, int]
+
+
+def _merge(ranges: Iterable[Range]) -> List[Range]:
+    merged: List[Range] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+            continue
+        merged.append((start, end))
+    return merged
+
+
+class UIDSet:
+    # Sorted, merged inclusive UID ranges, i.e. an IMAP sequence-set.
+    __slots__ = ("_ranges",)
+
+    def __init__(self, ranges: Iterable[Range] = ()):
+        self._ranges: List[Range] = _merge((min(a, b), max(a, b)) for a, b in ranges)
+
+    @classmethod
+    def from_uids(cls, uids: Iterable[int]) -> "UIDSet":
+        if isinstance(uids, UIDSet):
+            return uids
+        ranges: List[Range] = []
+        for uid in sorted(set(uids)):
+            if ranges and uid == ranges[-1][1] + 1:
+                ranges[-1] = (ranges[-1][0], uid)
+            else:
+                ranges.append((uid, uid))
+        result = cls()
+        result._ranges = ranges
+        return result
+
+    @classmethod
+    def parse(cls, text: Union[str, bytes]) -> "UIDSet":
+        if isinstance(text, bytes):
+            text = text.decode("ascii")
+        ranges: List[Range] = []
+        for part in text.strip().split(","):
+            if not part:
+                continue
+            start, _, end = part.partition(":")
+            ranges.append((int(start), int(end or start)))
+        return cls(ranges)
+
+    @property
+    def ranges(self) -> Tuple[Range, ...]:
+        return tuple(self._ranges)
+
+    @property
+    def first(self) -> Optional[int]:
+        return self._ranges[0][0] if self._ranges else None
+
+    @property
+    def last(self) -> Optional[int]:
+        return self._ranges[-1][1] if self._ranges else None
+
+    def __len__(self) -> int:
+        return sum(end - start + 1 for start, end in self._ranges)
+
+    def __bool__(self) -> bool:
+        return bool(self._ranges)
+
+    def __iter__(self) -> Iterator[int]:
+        for start, end in self._ranges:
+            yield from range(start, end + 1)
+
+    def __contains__(self, uid: object) -> bool:
+        if not isinstance(uid, int):
+            return False
+        idx = bisect.bisect_right(self._ranges, (uid, float("inf"))) - 1
+        return idx >= 0 and self._ranges[idx][1] >= uid
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, UIDSet):
+            return NotImplemented
+        return self._ranges == other._ranges
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __repr__(self) -> str:
+        return f"UIDSet({str(self)!r})"
+
+    def __str__(self) -> str:
+        return ",".join(str(start) if start == end else f"{start}:{end}" for start, end in self._ranges)
+
+    def __or__(self, other: "UIDSet") -> "UIDSet":
+        return UIDSet(self._ranges + other._ranges)
+
+    def __sub__(self, other: "UIDSet") -> "UIDSet":
+        result: List[Range] = []
+        others = other._ranges
+        j = 0
+        for start, end in self._ranges:
+            while j < len(others) and others[j][1] < start:
+                j += 1
+            k = j
+            while k < len(others) and others[k][0] <= end:
+                if others[k][0] > start:
+                    result.append((start, others[k][0] - 1))
+                start = max(start, others[k][1] + 1)
+                k += 1
+            if start <= end:
+                result.append((start, end))
+        difference = UIDSet()
+        difference._ranges = result
+        return difference
+
+    def add(self, uid: int) -> None:
+        ranges = self._ranges
+        idx = bisect.bisect_right(ranges, (uid, float("inf")))
+        if idx > 0 and ranges[idx - 1][1] >= uid:
+            return
+        joins_left = idx > 0 and ranges[idx - 1][1] == uid - 1
+        joins_right = idx < len(ranges) and ranges[idx][0] == uid + 1
+        if joins_left and joins_right:
+            ranges[idx - 1 : idx + 1] = [(ranges[idx - 1][0], ranges[idx][1])]
+        elif joins_left:
+            ranges[idx - 1] = (ranges[idx - 1][0], uid)
+        elif joins_right:
+            ranges[idx] = (uid, ranges[idx][1])
+        else:
+            ranges.insert(idx, (uid, uid))
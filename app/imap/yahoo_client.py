@@ -1,7 +1,17 @@
+import hashlib
 import imaplib
 import re
+import select
+import shutil
 import ssl
-from typing import List, Optional, Tuple
+import tempfile
+import threading
+import time
+import zlib
+from dataclasses import dataclass, field
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .uidset import UIDSet
 
 
 class YahooIMAPError(Exception):
@@ -9,23 +19,319 @@ class YahooIMAPError(Exception):
 
 
 YAHOO_APP_PASSWORD_SECRET_KEY = "yahoo_app_password"
+FETCH_BATCH_MAX_BYTES = 8 * 1024 * 1024
+HEADER_FETCH_BATCH_UIDS = 200
+DISCOVERY_HEADER_FIELDS = "MESSAGE-ID IN-REPLY-TO REFERENCES DATE"
+RFC822_READ_CHUNK_BYTES = 64 * 1024
+# Downloads larger than this spill from memory to a temporary file.
+RFC822_MEMORY_MAX_BYTES = 1024 * 1024
+SOCKET_READ_BYTES = 64 * 1024
+# Servers drop IDLE after ~29 minutes (RFC 2177); re-issue well before that.
+IDLE_MAX_SECONDS = 25 * 60
+
+_FETCH_UID_RE = re.compile(rb"UID\s+(\d+)", re.IGNORECASE)
+_FETCH_SIZE_RE = re.compile(rb"RFC822\.SIZE\s+(\d+)", re.IGNORECASE)
+_FETCH_INTERNALDATE_RE = re.compile(rb'INTERNALDATE\s+"([^"]+)"', re.IGNORECASE)
+_LITERAL_RE = re.compile(rb"\{(\d+)\}$")
+_STATUS_ITEM_RE = re.compile(r"\b(MESSAGES|UIDNEXT|UIDVALIDITY|HIGHESTMODSEQ)\s+(\d+)", re.IGNORECASE)
+_ESEARCH_ALL_RE = re.compile(rb"\bALL\s+([0-9:,]+)", re.IGNORECASE)
+_IDLE_UNTAGGED_RE = re.compile(rb"^\*\s+(\d+)\s+(EXISTS|EXPUNGE|RECENT|FETCH)\b", re.IGNORECASE)
+
+
+@dataclass(frozen=True)
+class IdleEvent:
+    kind: str
+    number: Optional[int]
+    raw: bytes
+
+
+@dataclass
+class IdleResult:
+    new_mail: bool = False
+    events: List[IdleEvent] = field(default_factory=list)
+
+
+@dataclass
+class RFC822Download:
+    file: BinaryIO
+    size: int
+    sha256_hex: str
+    flags: List[str] = field(default_factory=list)
+    internaldate: Optional[str] = None
+
+
+@dataclass
+class MailboxStatus:
+    name: str
+    readonly: bool
+    uidvalidity: int
+    exists: int
+    uidnext: Optional[int] = None
+    highest_modseq: Optional[int] = None
+
+
+def _last_int(values) -> Optional[int]:
+    for value in reversed(values or []):
+        if isinstance(value, bytes):
+            value = value.decode("ascii", errors="ignore")
+        match = re.match(r"\s*(\d+)", str(value or ""))
+        if match:
+            return int(match.group(1))
+    return None
+
+
+def _parse_idle_line(line: bytes) -> IdleEvent:
+    match = _IDLE_UNTAGGED_RE.match(line)
+    if match:
+        return IdleEvent(match.group(2).decode("ascii").upper(), int(match.group(1)), line)
+    if line[:5].upper() == b"* BYE":
+        return IdleEvent("BYE", None, line)
+    return IdleEvent("OTHER", None, line)
+
+
+def _uid_set(uids: Iterable[int]) -> str:
+    return str(UIDSet.from_uids(uids))
+
+
+def _batch_uids_by_size(uids: List[int], sizes: Dict[int, int], max_batch_bytes: int) -> List[List[int]]:
+    batches: List[List[int]] = []
+    current: List[int] = []
+    current_bytes = 0
+    for uid in uids:
+        size = sizes.get(uid, 0)
+        if current and current_bytes + size > max_batch_bytes:
+            batches.append(current)
+            current = []
+            current_bytes = 0
+        current.append(uid)
+        current_bytes += size
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _parse_fetch_meta(meta: bytes) -> Tuple[Optional[int], List[str], Optional[str]]:
+    uid_match = _FETCH_UID_RE.search(meta)
+    uid = int(uid_match.group(1)) if uid_match else None
+    flags: List[str] = []
+    parsed_flags = imaplib.ParseFlags(meta)
+    if parsed_flags:
+        flags = [f.decode("utf-8", errors="ignore") for f in parsed_flags]
+    date_match = _FETCH_INTERNALDATE_RE.search(meta)
+    internaldate = date_match.group(1).decode("utf-8", errors="ignore") if date_match else None
+    return uid, flags, internaldate
+
+
+_ssl_context: Optional[ssl.SSLContext] = None
+_tls_sessions: Dict[Tuple[str, int], ssl.SSLSession] = {}
+_tls_lock = threading.Lock()
+
+
+def _shared_ssl_context() -> ssl.SSLContext:
+    # TLS sessions can only be resumed on the context that created them.
+    global _ssl_context
+    with _tls_lock:
+        if _ssl_context is None:
+            _ssl_context = ssl.create_default_context()
+        return _ssl_context
+
+
+_transfer_totals = {"wire_bytes_in": 0, "decoded_bytes_in": 0, "wire_bytes_out": 0, "decoded_bytes_out": 0}
+_transfer_totals_lock = threading.Lock()
+
+
+def transfer_totals() -> Dict[str, int]:
+    with _transfer_totals_lock:
+        return dict(_transfer_totals)
+
+
+def _add_transfer_totals(**counts: int) -> None:
+    with _transfer_totals_lock:
+        for name, value in counts.items():
+            _transfer_totals[name] += value
+
+
+class _MeteredIMAP4_SSL(imaplib.IMAP4_SSL):
+    # Reads go through our own buffer instead of imaplib's file object so we can
+    # count bytes on the wire, tell IDLE about buffered lines, and switch the
+    # stream to raw DEFLATE after COMPRESS (RFC 4978).
+    def open(self, host="", port=imaplib.IMAP4_SSL_PORT, timeout=None):
+        self._inbuf = bytearray()
+        self._compressor = None
+        self._decompressor = None
+        self.wire_bytes_in = 0
+        self.decoded_bytes_in = 0
+        self.wire_bytes_out = 0
+        self.decoded_bytes_out = 0
+        super().open(host, port, timeout)
+
+    @property
+    def compressed(self) -> bool:
+        return self._compressor is not None
+
+    def _create_socket(self, timeout):
+        sock = imaplib.IMAP4._create_socket(self, timeout)
+        with _tls_lock:
+            session = _tls_sessions.get((self.host, self.port))
+        return self.ssl_context.wrap_socket(sock, server_hostname=self.host, session=session)
+
+    def remember_tls_session(self) -> None:
+        session = getattr(self.sock, "session", None)
+        if session is not None:
+            with _tls_lock:
+                _tls_sessions[(self.host, self.port)] = session
+
+    def start_compression(self) -> None:
+        self._compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+        self._decompressor = zlib.decompressobj(-15)
+        # Anything read past the tagged OK is already compressed.
+        leftover = bytes(self._inbuf)
+        self._inbuf = bytearray(self._decompressor.decompress(leftover))
+        self.decoded_bytes_in += len(self._inbuf) - len(leftover)
+        _add_transfer_totals(decoded_bytes_in=len(self._inbuf) - len(leftover))
+
+    def has_buffered_input(self) -> bool:
+        return bool(self._inbuf) or bool(self.sock.pending())
+
+    def _fill(self) -> bool:
+        data = self.sock.recv(SOCKET_READ_BYTES)
+        if not data:
+            return False
+        wire = len(data)
+        if self._decompressor is not None:
+            data = self._decompressor.decompress(data)
+        self.wire_bytes_in += wire
+        self.decoded_bytes_in += len(data)
+        _add_transfer_totals(wire_bytes_in=wire, decoded_bytes_in=len(data))
+        self._inbuf += data
+        return True
+
+    def _take(self, size: int) -> bytes:
+        data = bytes(self._inbuf[:size])
+        del self._inbuf[:size]
+        return data
+
+    def read(self, size):
+        while len(self._inbuf) < size:
+            if not self._fill():
+                break
+        return self._take(size)
+
+    def readline(self):
+        scanned = 0
+        while True:
+            idx = self._inbuf.find(b"\n", scanned)
+            if idx != -1:
+                return self._take(idx + 1)
+            if len(self._inbuf) > imaplib._MAXLINE:
+                raise self.error("got more than %d bytes" % imaplib._MAXLINE)
+            scanned = len(self._inbuf)
+            if not self._fill():
+                return self._take(len(self._inbuf))
+
+    def send(self, data):
+        decoded = len(data)
+        if self._compressor is not None:
+            data = self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        self.wire_bytes_out += len(data)
+        self.decoded_bytes_out += decoded
+        _add_transfer_totals(wire_bytes_out=len(data), decoded_bytes_out=decoded)
+        self.sock.sendall(data)
 
 
 class YahooIMAPClient:
-    def __init__(self, host: str, port: int, email: str, app_password: str, timeout: int = 30):
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        email: str,
+        app_password: str,
+        timeout: int = 30,
+        compress: bool = True,
+    ):
         self.host = host
         self.port = port
         self.email = email
         self.app_password = app_password
         self.timeout = timeout
+        self.compress = compress
         self._imap: Optional[imaplib.IMAP4_SSL] = None
+        self._selected: Optional[MailboxStatus] = None
+        self.condstore_enabled = False
 
     def connect(self) -> None:
-        context = ssl.create_default_context()
-        self._imap = imaplib.IMAP4_SSL(self.host, self.port, ssl_context=context, timeout=self.timeout)
+        self._selected = None
+        self.condstore_enabled = False
+        context = _shared_ssl_context()
+        self._imap = _MeteredIMAP4_SSL(self.host, self.port, ssl_context=context, timeout=self.timeout)
         status, _ = self._imap.login(self.email, self.app_password)
         if status != "OK":
             raise YahooIMAPError("IMAP login failed")
+        # TLS 1.3 tickets arrive after the handshake, so save the session now.
+        remember_tls_session = getattr(self._imap, "remember_tls_session", None)
+        if remember_tls_session is not None:
+            remember_tls_session()
+        self._enable_condstore()
+        if self.compress:
+            self._start_compression()
+
+    def _start_compression(self) -> None:
+        # imaplib has no COMPRESS command; send it by hand like IDLE.
+        if not self.has_capability("COMPRESS=DEFLATE"):
+            return
+        start_compression = getattr(self.imap, "start_compression", None)
+        if start_compression is None:
+            return
+        tag = self.imap._new_tag()  # type: ignore[attr-defined]
+        self.imap.send(tag + b" COMPRESS DEFLATE\r\n")
+        while True:
+            line = self.imap._get_line()  # type: ignore[attr-defined]
+            if line.startswith(tag + b" "):
+                break
+        if line[len(tag) + 1 :].upper().startswith(b"OK"):
+            start_compression()
+
+    @property
+    def compressed(self) -> bool:
+        return bool(getattr(self._imap, "compressed", False))
+
+    def transfer_stats(self) -> Dict[str, int]:
+        imap = self._imap
+        return {
+            name: int(getattr(imap, name, 0) or 0)
+            for name in ("wire_bytes_in", "decoded_bytes_in", "wire_bytes_out", "decoded_bytes_out")
+        }
+
+    def _enable_condstore(self) -> None:
+        # With CONDSTORE enabled every SELECT reports HIGHESTMODSEQ.
+        if not self.has_capability("ENABLE"):
+            return
+        for extension in ("QRESYNC", "CONDSTORE"):
+            if not self.has_capability(extension):
+                continue
+            try:
+                status, _ = self.imap.enable(extension)
+            except imaplib.IMAP4.error:
+                continue
+            if status == "OK":
+                self.condstore_enabled = True
+                return
+
+    @property
+    def tls_session_reused(self) -> bool:
+        return bool(getattr(getattr(self._imap, "sock", None), "session_reused", False))
+
+    def adopt(self, other: "YahooIMAPClient") -> None:
+        # Take over another client's authenticated session (see StandbyConnection).
+        # The old session is presumed broken: drop the socket without LOGOUT.
+        previous, self._imap, other._imap = self._imap, other._imap, None
+        self._selected, other._selected = None, None
+        self.condstore_enabled = other.condstore_enabled
+        if previous is not None:
+            try:
+                previous.shutdown()
+            except (imaplib.IMAP4.error, OSError):
+                pass
 
     def close(self) -> None:
         if self._imap is None:
@@ -36,6 +342,7 @@ class YahooIMAPClient:
             pass
         finally:
             self._imap = None
+            self._selected = None
 
     @property
     def imap(self) -> imaplib.IMAP4_SSL:
@@ -43,9 +350,12 @@ class YahooIMAPClient:
             raise YahooIMAPError("IMAP connection not initialized")
         return self._imap
 
-    def has_idle(self) -> bool:
+    def has_capability(self, name: str) -> bool:
         capabilities = getattr(self.imap, "capabilities", ())
-        return b"IDLE" in capabilities or "IDLE" in capabilities
+        return name.encode("ascii") in capabilities or name in capabilities
+
+    def has_idle(self) -> bool:
+        return self.has_capability("IDLE")
 
     def list_mailboxes(self) -> List[str]:
         status, data = self.imap.list()
@@ -65,15 +375,40 @@ class YahooIMAPClient:
                     mailboxes.append(mailbox)
         return mailboxes
 
-    def select(self, mailbox: str, readonly: bool = True) -> Tuple[int, int]:
+    @property
+    def selected_mailbox(self) -> Optional[str]:
+        return self._selected.name if self._selected else None
+
+    def select(self, mailbox: str, readonly: bool = True, force: bool = False) -> Tuple[int, int]:
+        selected = self.select_status(mailbox, readonly=readonly, force=force)
+        return selected.uidvalidity, selected.exists
+
+    def select_status(self, mailbox: str, readonly: bool = True, force: bool = False) -> MailboxStatus:
+        selected = self._selected
+        # A read-write selection also serves read-only callers; fetches use BODY.PEEK.
+        if selected and not force and selected.name == mailbox and (readonly or not selected.readonly):
+            return selected
+        self._selected = None
         status, data = self.imap.select(f'"{mailbox}"', readonly=readonly)
         if status != "OK":
             raise YahooIMAPError(f"SELECT failed for {mailbox}")
-        uidvalidity = self._extract_uidvalidity_from_select(data)
+        # Response codes from the SELECT's untagged OKs (RFC 3501, RFC 7162).
+        untagged = getattr(self.imap, "untagged_responses", {})
+        uidvalidity = _last_int(untagged.get("UIDVALIDITY"))
+        if uidvalidity is None:
+            uidvalidity = self._extract_uidvalidity_from_select(data)
         if uidvalidity is None:
             uidvalidity = self._get_uidvalidity(mailbox)
         exists = int(data[0]) if data and data[0] else 0
-        return uidvalidity, exists
+        self._selected = MailboxStatus(
+            name=mailbox,
+            readonly=readonly,
+            uidvalidity=uidvalidity,
+            exists=exists,
+            uidnext=_last_int(untagged.get("UIDNEXT")),
+            highest_modseq=_last_int(untagged.get("HIGHESTMODSEQ")),
+        )
+        return self._selected
 
     def _extract_uidvalidity_from_select(self, data) -> Optional[int]:
         if not data:
@@ -125,20 +460,58 @@ class YahooIMAPClient:
             return int(digits)
         raise YahooIMAPError(f"UIDVALIDITY not found in STATUS: {raw}")
 
-    def search_uids(self, since_uid: int) -> List[int]:
+    def mailbox_status(self, mailbox: str) -> MailboxStatus:
+        # STATUS on the selected mailbox is unreliable (RFC 3501 6.3.10); use SELECT there.
+        if self.selected_mailbox == mailbox:
+            return self.select_status(mailbox, force=True)
+        items = "MESSAGES UIDNEXT UIDVALIDITY"
+        if self.condstore_enabled:
+            items += " HIGHESTMODSEQ"
+        status, data = self.imap.status(f'"{mailbox}"', f"({items})")
+        if status != "OK":
+            raise YahooIMAPError(f"STATUS failed for {mailbox}")
+        raw = b" ".join(item for item in data or [] if isinstance(item, bytes)).decode("utf-8", errors="ignore")
+        values = {name.upper(): int(value) for name, value in _STATUS_ITEM_RE.findall(raw)}
+        if "UIDVALIDITY" not in values:
+            raise YahooIMAPError(f"UIDVALIDITY not found in STATUS: {raw}")
+        return MailboxStatus(
+            name=mailbox,
+            readonly=True,
+            uidvalidity=values["UIDVALIDITY"],
+            exists=values.get("MESSAGES", 0),
+            uidnext=values.get("UIDNEXT"),
+            highest_modseq=values.get("HIGHESTMODSEQ"),
+        )
+
+    def search_uids(self, since_uid: int) -> UIDSet:
         query = f"UID {since_uid}:*"
+        if self.has_capability("ESEARCH"):
+            return self._esearch_uids(query)
         status, data = self.imap.uid("SEARCH", None, query)
         if status != "OK":
             raise YahooIMAPError("UID SEARCH failed")
         if not data or not data[0]:
-            return []
-        return [int(uid) for uid in data[0].split()]
+            return UIDSet()
+        return UIDSet.from_uids(int(uid) for uid in data[0].split())
+
+    def _esearch_uids(self, query: str) -> UIDSet:
+        # RFC 4731: the server answers with a sequence-set such as "4:480,482".
+        self.imap.untagged_responses.pop("ESEARCH", None)
+        status, _ = self.imap.uid("SEARCH", "RETURN", "(ALL)", query)
+        if status != "OK":
+            raise YahooIMAPError("UID SEARCH failed")
+        uids = UIDSet()
+        for line in self.imap.untagged_responses.pop("ESEARCH", None) or []:
+            match = _ESEARCH_ALL_RE.search(line or b"")
+            if match:
+                uids = uids | UIDSet.parse(match.group(1))
+        return uids
 
     def noop(self) -> None:
         self.imap.noop()
 
     def fetch_rfc822(self, uid: int) -> Tuple[bytes, List[str], Optional[str]]:
-        status, data = self.imap.uid("FETCH", str(uid), "(RFC822 FLAGS INTERNALDATE)")
+        status, data = self.imap.uid("FETCH", str(uid), "(BODY.PEEK[] FLAGS INTERNALDATE)")
         if status != "OK" or not data:
             raise YahooIMAPError("FETCH failed")
         rfc822 = b""
@@ -151,55 +524,299 @@ class YahooIMAPClient:
             if body:
                 rfc822 = body
             if meta:
-                parsed_flags = imaplib.ParseFlags(meta)
+                _, parsed_flags, parsed_internaldate = _parse_fetch_meta(meta)
                 if parsed_flags:
-                    flags = [f.decode("utf-8", errors="ignore") for f in parsed_flags]
-                meta_str = meta.decode("utf-8", errors="ignore")
-                match = re.search(r"INTERNALDATE\\s+\"([^\"]+)\"", meta_str)
-                if match:
-                    internaldate = match.group(1)
+                    flags = parsed_flags
+                if parsed_internaldate:
+                    internaldate = parsed_internaldate
         if not rfc822:
             raise YahooIMAPError("RFC822 body missing")
         return rfc822, flags, internaldate
 
+    def fetch_rfc822_file(self, uid: int, max_memory_bytes: int = RFC822_MEMORY_MAX_BYTES) -> RFC822Download:
+        # imaplib reads a literal into one bytes object; read it off the wire in
+        # chunks instead so peak memory does not grow with the message size.
+        status, download, meta = self._fetch_body_literal(
+            uid,
+            "(UID BODY.PEEK[] FLAGS INTERNALDATE)",
+            lambda size: self._read_literal(size, max_memory_bytes),
+            lambda body: body.file.close(),
+        )
+        if status != b"OK":
+            if download is not None:
+                download.file.close()
+            raise YahooIMAPError("FETCH failed")
+        if download is None or not download.size:
+            if download is not None:
+                download.file.close()
+            raise YahooIMAPError("RFC822 body missing")
+        _, download.flags, download.internaldate = _parse_fetch_meta(meta)
+        return download
+
+    def fetch_partial(self, uid: int, offset: int, length: int, sink: BinaryIO) -> int:
+        # BODY.PEEK[]<offset.length> (RFC 3501 6.4.5); a short read means the end.
+        # The literal is staged first: the server may push a BODY literal for
+        # another UID, and that must never land in the sink.
+        status, download, _ = self._fetch_body_literal(
+            uid,
+            f"(UID BODY.PEEK[]<{offset}.{length}>)",
+            lambda size: self._read_literal(size, length),
+            lambda body: body.file.close(),
+        )
+        if download is None:
+            if status != b"OK":
+                raise YahooIMAPError("FETCH failed")
+            return 0
+        with download.file:
+            if status != b"OK":
+                raise YahooIMAPError("FETCH failed")
+            shutil.copyfileobj(download.file, sink, RFC822_READ_CHUNK_BYTES)
+        return download.size
+
+    def _fetch_body_literal(self, uid: int, items: str, read_body, discard_body):
+        imap = self.imap
+        tag = imap._command("UID", "FETCH", str(uid), items)  # type: ignore[attr-defined]
+        result = None
+        result_meta = b""
+        try:
+            while True:
+                line = imap._get_line()  # type: ignore[attr-defined]
+                if line.startswith(tag + b" "):
+                    status = line[len(tag) + 1 :].split(b" ", 1)[0].upper()
+                    break
+                meta = line
+                body = None
+                while True:
+                    match = _LITERAL_RE.search(line)
+                    if not match:
+                        break
+                    size = int(match.group(1))
+                    if body is None and b"BODY[" in line.upper():
+                        body = read_body(size)
+                    else:
+                        self._skip_literal(size)
+                    line = imap._get_line()  # type: ignore[attr-defined]
+                    meta += line
+                if body is None:
+                    continue
+                parsed_uid, _, _ = _parse_fetch_meta(meta)
+                if parsed_uid != uid or result is not None:
+                    discard_body(body)
+                    continue
+                result, result_meta = body, meta
+        except BaseException:
+            if result is not None:
+                discard_body(result)
+            raise
+        finally:
+            imap.tagged_commands.pop(tag, None)  # type: ignore[attr-defined]
+        return status, result, result_meta
+
+    def _copy_literal(self, size: int, sink: BinaryIO, digest=None) -> int:
+        remaining = size
+        while remaining:
+            chunk = self.imap.read(min(RFC822_READ_CHUNK_BYTES, remaining))
+            if not chunk:
+                raise imaplib.IMAP4.abort("connection closed while reading literal")
+            if digest is not None:
+                digest.update(chunk)
+            sink.write(chunk)
+            remaining -= len(chunk)
+        return size
+
+    def _skip_literal(self, size: int) -> None:
+        remaining = size
+        while remaining:
+            chunk = self.imap.read(min(RFC822_READ_CHUNK_BYTES, remaining))
+            if not chunk:
+                raise imaplib.IMAP4.abort("connection closed while reading literal")
+            remaining -= len(chunk)
+
+    def _read_literal(self, size: int, max_memory_bytes: int) -> RFC822Download:
+        handle = tempfile.SpooledTemporaryFile(max_size=max_memory_bytes)
+        digest = hashlib.sha256()
+        try:
+            self._copy_literal(size, handle, digest)
+        except BaseException:
+            handle.close()
+            raise
+        handle.seek(0)
+        return RFC822Download(handle, size, digest.hexdigest())
+
+    def fetch_sizes(self, uids: Iterable[int]) -> Dict[int, int]:
+        uid_set = _uid_set(uids)
+        if not uid_set:
+            return {}
+        status, data = self.imap.uid("FETCH", uid_set, "(UID RFC822.SIZE)")
+        if status != "OK":
+            raise YahooIMAPError("FETCH RFC822.SIZE failed")
+        sizes: Dict[int, int] = {}
+        for item in data or []:
+            meta = item[0] if isinstance(item, tuple) else item
+            if not meta:
+                continue
+            uid_match = _FETCH_UID_RE.search(meta)
+            size_match = _FETCH_SIZE_RE.search(meta)
+            if uid_match and size_match:
+                sizes[int(uid_match.group(1))] = int(size_match.group(1))
+        return sizes
+
+    def fetch_many(
+        self,
+        uids: Iterable[int],
+        sizes: Optional[Dict[int, int]] = None,
+        max_batch_bytes: int = FETCH_BATCH_MAX_BYTES,
+    ) -> Iterator[Tuple[int, bytes, List[str], Optional[str]]]:
+        wanted = sorted(set(uids))
+        if not wanted:
+            return
+        if sizes is None:
+            sizes = self.fetch_sizes(wanted)
+        # Small messages first so one huge attachment does not hold up the rest.
+        wanted.sort(key=lambda uid: (sizes.get(uid, 0), uid))
+        for batch in _batch_uids_by_size(wanted, sizes, max_batch_bytes):
+            batch_uids = set(batch)
+            for meta, body in self._stream_uid_fetch(_uid_set(batch), "(UID BODY.PEEK[] FLAGS INTERNALDATE)"):
+                uid, flags, internaldate = _parse_fetch_meta(meta)
+                if uid not in batch_uids or not body:
+                    continue
+                yield uid, body, flags, internaldate
+
+    def fetch_headers_many(
+        self,
+        uids: Iterable[int],
+        batch_size: int = HEADER_FETCH_BATCH_UIDS,
+    ) -> Iterator[Tuple[int, bytes, List[str], Optional[str], Optional[int]]]:
+        wanted = sorted(set(uids))
+        items = f"(UID RFC822.SIZE FLAGS INTERNALDATE BODY.PEEK[HEADER.FIELDS ({DISCOVERY_HEADER_FIELDS})])"
+        for idx in range(0, len(wanted), batch_size):
+            batch = wanted[idx : idx + batch_size]
+            batch_uids = set(batch)
+            for meta, headers in self._stream_uid_fetch(_uid_set(batch), items):
+                uid, flags, internaldate = _parse_fetch_meta(meta)
+                if uid not in batch_uids:
+                    continue
+                size_match = _FETCH_SIZE_RE.search(meta)
+                size = int(size_match.group(1)) if size_match else None
+                yield uid, headers or b"", flags, internaldate, size
+
+    def _stream_uid_fetch(self, uid_set: str, items: str) -> Iterator[Tuple[bytes, bytes]]:
+        # imaplib.uid() buffers every literal until the tagged reply; drive the
+        # response loop directly so each message is handed over as it arrives.
+        imap = self.imap
+        tag = imap._command("UID", "FETCH", uid_set, items)  # type: ignore[attr-defined]
+        while imap.tagged_commands.get(tag) is None:  # type: ignore[attr-defined]
+            imap._get_response()  # type: ignore[attr-defined]
+            pending = None
+            for item in imap.untagged_responses.pop("FETCH", []):
+                if isinstance(item, tuple):
+                    if pending is not None:
+                        yield pending
+                    pending = item
+                elif pending is not None:
+                    # FLAGS/INTERNALDATE may trail the literal on the same response.
+                    yield pending[0] + item, pending[1]
+                    pending = None
+            if pending is not None:
+                yield pending
+        status, _ = imap.tagged_commands.pop(tag)  # type: ignore[attr-defined]
+        if status != "OK":
+            raise YahooIMAPError("UID FETCH failed")
+
     def delete_uid(self, mailbox: str, uidvalidity: int, uid: int) -> None:
+        self.delete_uids(mailbox, uidvalidity, [uid])
+
+    def delete_uids(self, mailbox: str, uidvalidity: int, uids: Iterable[int]) -> None:
+        uid_set = _uid_set(uids)
+        if not uid_set:
+            return
         current_uidvalidity, _ = self.select(mailbox, readonly=False)
         if current_uidvalidity != uidvalidity:
             raise YahooIMAPError("UIDVALIDITY changed; refusing to delete")
-        status, _ = self.imap.uid("STORE", str(uid), "+FLAGS.SILENT", r"(\Deleted)")
+        status, _ = self.imap.uid("STORE", uid_set, "+FLAGS.SILENT", r"(\Deleted)")
         if status != "OK":
             raise YahooIMAPError("UID STORE \\Deleted failed")
+        if self.has_capability("UIDPLUS"):
+            # Only expunge our own UIDs, not anything else flagged \Deleted.
+            status, _ = self.imap.uid("EXPUNGE", uid_set)
+            if status != "OK":
+                raise YahooIMAPError("UID EXPUNGE failed")
+            return
         status, _ = self.imap.expunge()
         if status != "OK":
             raise YahooIMAPError("EXPUNGE failed")
 
-    def idle_wait(self, timeout_seconds: int = 60) -> Optional[bytes]:
-        if not self.has_idle():
-            return None
-        # imaplib has no public IDLE API; fall back to polling if this fails.
-        try:
-            tag = self.imap._new_tag()  # type: ignore[attr-defined]
-            self.imap.send(f"{tag} IDLE\r\n".encode("utf-8"))
-            _ = self.imap._get_line()  # type: ignore[attr-defined]
-            old_timeout = self.imap.sock.gettimeout()
-            self.imap.sock.settimeout(timeout_seconds)
-            try:
-                line = self.imap.readline()  # type: ignore[attr-defined]
-            except Exception:
-                line = None
-            finally:
-                try:
-                    self.imap.sock.settimeout(old_timeout)
-                except Exception:
-                    pass
-                try:
-                    self.imap.send(b"DONE\r\n")
-                    self.imap._get_tagged_response(tag)  # type: ignore[attr-defined]
-                except Exception:
-                    pass
-            return line
-        except Exception:
-            return None
+    def idle(self, timeout_seconds: float = IDLE_MAX_SECONDS) -> IdleResult:
+        timeout_seconds = min(timeout_seconds, IDLE_MAX_SECONDS)
+        deadline = time.monotonic() + timeout_seconds
+        exists = self._pending_exists_count()
+        result = IdleResult()
+        tag = self._idle_start()
+        while not result.new_mail:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            event = self._idle_read(remaining)
+            if event is None:
+                break
+            result.events.append(event)
+            if event.kind == "BYE":
+                raise imaplib.IMAP4.abort(f"server closed IDLE: {event.raw!r}")
+            if event.kind == "EXPUNGE" and exists is not None:
+                exists -= 1
+            elif event.kind == "EXISTS":
+                # EXISTS also follows expunges; only a higher count means new mail.
+                result.new_mail = exists is None or event.number > exists
+                exists = event.number
+        self._idle_done(tag)
+        if self._selected and exists is not None:
+            self._selected.exists = exists
+        return result
+
+    def _pending_exists_count(self) -> Optional[int]:
+        # Fold EXISTS/EXPUNGE seen during earlier commands into the baseline so
+        # IDLE compares against the current count. Undercounting only costs an
+        # extra poll.
+        exists = self._selected.exists if self._selected else None
+        untagged = self.imap.untagged_responses
+        reported = [value for value in untagged.pop("EXISTS", []) if value]
+        if reported:
+            exists = int(reported[-1])
+        expunged = len(untagged.pop("EXPUNGE", []))
+        if exists is not None:
+            exists = max(0, exists - expunged)
+        return exists
+
+    def _idle_start(self) -> bytes:
+        # imaplib has no IDLE API before Python 3.14.
+        tag = self.imap._new_tag()  # type: ignore[attr-defined]
+        self.imap.send(tag + b" IDLE\r\n")
+        line = self.imap._get_line()  # type: ignore[attr-defined]
+        if not line.startswith(b"+"):
+            raise YahooIMAPError(f"IDLE rejected: {line!r}")
+        return tag
+
+    def _idle_read(self, timeout_seconds: float) -> Optional[IdleEvent]:
+        # Wait with select() instead of a socket timeout: imaplib's buffered
+        # reader refuses all further reads once a timeout fires.
+        sock = self.imap.sock
+        has_buffered_input = getattr(self.imap, "has_buffered_input", None)
+        if has_buffered_input is None:
+            has_buffered_input = getattr(sock, "pending", None)
+        if not (has_buffered_input and has_buffered_input()):
+            readable, _, _ = select.select([sock], [], [], timeout_seconds)
+            if not readable:
+                return None
+        return _parse_idle_line(self.imap._get_line())  # type: ignore[attr-defined]
+
+    def _idle_done(self, tag: bytes) -> None:
+        self.imap.send(b"DONE\r\n")
+        status, _ = self.imap._get_tagged_response(tag)  # type: ignore[attr-defined]
+        # EXISTS/EXPUNGE stay queued for the next baseline; the rest is noise.
+        for name in ("RECENT", "FETCH"):
+            self.imap.untagged_responses.pop(name, None)
+        if status != "OK":
+            raise YahooIMAPError(f"IDLE ended with {status}")
 
 
 def load_or_store_app_password(conn, master_key: bytes, env_password: Optional[str]) -> str:
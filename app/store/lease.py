@@ -1,6 +1,7 @@
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 
+from .message_index import record_gmail_message
 from .models import MessageState
 
 
@@ -8,6 +9,19 @@ def _utc_now() -> str:
     return datetime.now(timezone.utc).replace(microsecond=0).isoformat().replace("+00:00", "Z")
 
 
+def has_due_messages(conn) -> bool:
+    row = conn.execute(
+        """
+        SELECT 1 FROM messages
+         WHERE state IN (?, ?)
+           AND (next_attempt_at IS NULL OR next_attempt_at <= ?)
+         LIMIT 1
+        """,
+        (MessageState.FETCHED, MessageState.FAILED_RETRY, _utc_now()),
+    ).fetchone()
+    return row is not None
+
+
 def acquire_insert_lease(conn, message_id: int, now_iso: Optional[str] = None) -> bool:
     now_iso = now_iso or _utc_now()
     with conn:
@@ -31,9 +45,18 @@ def acquire_insert_lease(conn, message_id: int, now_iso: Optional[str] = None) -
         return cur.rowcount == 1
 
 
-def mark_inserted(conn, message_id: int, gmail_message_id: str, gmail_thread_id: str) -> None:
+def mark_inserted(
+    conn,
+    message_id: int,
+    gmail_message_id: str,
+    gmail_thread_id: str,
+    account_id: Optional[int] = None,
+    rfc822_message_id: Optional[str] = None,
+) -> None:
     now_iso = _utc_now()
     with conn:
+        if rfc822_message_id and gmail_message_id and gmail_thread_id:
+            record_gmail_message(conn, account_id, rfc822_message_id, gmail_message_id, gmail_thread_id)
         conn.execute(
             """
             UPDATE messages
@@ -0,0 +1,96 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+from app.store.db import utc_now_iso
+
+# Gmail searches that found nothing are not repeated for this long.
+MISSING_TTL_SECONDS = 15 * 60
+MISSING_MAX_ENTRIES = 10000
+
+
+def record_gmail_message(
+    conn, account_id: int, rfc822_message_id: str, gmail_message_id: str, gmail_thread_id: str
+) -> None:
+    conn.execute(
+        """
+        INSERT INTO gmail_message_index(
+          account_id, rfc822_message_id, gmail_message_id, gmail_thread_id, created_at
+        ) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(account_id, gmail_message_id) DO UPDATE SET
+          rfc822_message_id=excluded.rfc822_message_id,
+          gmail_thread_id=excluded.gmail_thread_id
+        """,
+        (account_id, rfc822_message_id, gmail_message_id, gmail_thread_id, utc_now_iso()),
+    )
+
+
+def lookup_gmail_messages(conn, account_id: int, rfc822_message_ids: Iterable[str]) -> Dict[str, Tuple[str, str]]:
+    # One entry per Message-ID; with several Gmail copies the oldest wins.
+    msgids = [msgid for msgid in dict.fromkeys(rfc822_message_ids) if msgid]
+    if not msgids:
+        return {}
+    placeholders = ",".join("?" for _ in msgids)
+    rows = conn.execute(
+        f"""
+        SELECT rfc822_message_id, gmail_message_id, gmail_thread_id
+          FROM gmail_message_index
+         WHERE account_id = ? AND rfc822_message_id IN ({placeholders})
+         ORDER BY created_at DESC, gmail_message_id DESC
+        """,
+        (account_id, *msgids),
+    ).fetchall()
+    return {row[0]: (row[1], row[2]) for row in rows}
+
+
+def lookup_gmail_message(conn, account_id: int, rfc822_message_id: Optional[str]) -> Optional[Tuple[str, str]]:
+    if not rfc822_message_id:
+        return None
+    return lookup_gmail_messages(conn, account_id, [rfc822_message_id]).get(rfc822_message_id)
+
+
+def forget_gmail_messages(conn, account_id: int, gmail_message_ids: Iterable[str]) -> None:
+    conn.executemany(
+        "DELETE FROM gmail_message_index WHERE account_id = ? AND gmail_message_id = ?",
+        [(account_id, gmail_id) for gmail_id in gmail_message_ids],
+    )
+
+
+def forget_gmail_thread(conn, account_id: int, gmail_thread_id: str) -> None:
+    conn.execute(
+        "DELETE FROM gmail_message_index WHERE account_id = ? AND gmail_thread_id = ?",
+        (account_id, gmail_thread_id),
+    )
+
+
+class MissingMessageIDCache:
+    # Bounded LRU of Message-IDs Gmail recently did not know, with a TTL so a
+    # parent that arrives later is found again.
+    def __init__(self, ttl_seconds: float = MISSING_TTL_SECONDS, max_entries: int = MISSING_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, msgid: object) -> bool:
+        with self._lock:
+            expires_at = self._entries.get(msgid)
+            if expires_at is None:
+                return False
+            if expires_at <= time.monotonic():
+                del self._entries[msgid]
+                return False
+            self._entries.move_to_end(msgid)
+            return True
+
+    def add(self, msgid: str) -> None:
+        with self._lock:
+            self._entries[msgid] = time.monotonic() + self.ttl_seconds
+            self._entries.move_to_end(msgid)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, msgid: Optional[str]) -> None:
+        with self._lock:
+            self._entries.pop(msgid, None)
@@ -6,3 +6,7 @@ class MessageState:
     SUPPRESSED_DUPLICATE = "SUPPRESSED_DUPLICATE"
     FAILED_RETRY = "FAILED_RETRY"
     FAILED_PERM = "FAILED_PERM"
+
+
+# Header-only discovery defers hashing to the first full download.
+RFC822_SHA256_PENDING = ""
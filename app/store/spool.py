@@ -0,0 +1,142 @@
+import io
+import os
+import re
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import BinaryIO, Optional
+
+_SHA256_RE = re.compile(r"[0-9a-f]{64}")
+
+
+def default_spool_dir(sqlite_path: str) -> str:
+    return os.path.join(os.path.dirname(sqlite_path), "spool")
+
+
+class RFC822Spool:
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._total_bytes = 0
+        os.makedirs(self.root, exist_ok=True)
+        self._load_index()
+
+    def _path(self, sha256_hex: str) -> str:
+        return os.path.join(self.root, sha256_hex[:2], sha256_hex)
+
+    def _load_index(self) -> None:
+        found = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if not _SHA256_RE.fullmatch(name):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(dirpath, name))
+                except OSError:
+                    continue
+                found.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(found):
+            self._entries[name] = size
+            self._total_bytes += size
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    def get(self, sha256_hex: str) -> Optional[bytes]:
+        handle = self.open(sha256_hex)
+        if handle is None:
+            return None
+        with handle:
+            return handle.read()
+
+    def open(self, sha256_hex: str) -> Optional[BinaryIO]:
+        if not sha256_hex or not _SHA256_RE.fullmatch(sha256_hex):
+            return None
+        path = self._path(sha256_hex)
+        with self._lock:
+            if sha256_hex not in self._entries:
+                return None
+            try:
+                handle = open(path, "rb")
+                os.utime(path)
+            except OSError:
+                self._forget(sha256_hex)
+                return None
+            self._entries.move_to_end(sha256_hex)
+            return handle
+
+    def put(self, sha256_hex: str, payload: bytes) -> bool:
+        return self.put_file(sha256_hex, io.BytesIO(payload))
+
+    def put_file(self, sha256_hex: str, source: BinaryIO) -> bool:
+        if not sha256_hex or not _SHA256_RE.fullmatch(sha256_hex):
+            return False
+        source.seek(0, os.SEEK_END)
+        size = source.tell()
+        source.seek(0)
+        if size > self.max_bytes:
+            return False
+        path = self._path(sha256_hex)
+        with self._lock:
+            if sha256_hex in self._entries:
+                self._entries.move_to_end(sha256_hex)
+                return True
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as handle:
+                    shutil.copyfileobj(source, handle)
+                os.replace(tmp_path, path)
+            except OSError:
+                try:
+                    os.unlink(tmp_path)
+                except OSError:
+                    pass
+                return False
+            finally:
+                source.seek(0)
+            self._entries[sha256_hex] = size
+            self._total_bytes += size
+            self._evict()
+            return True
+
+    def partial_path(self, name: str) -> str:
+        # Resumable downloads in progress; not counted against max_bytes.
+        directory = os.path.join(self.root, "partial")
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, f"{name}.part")
+
+    def discard_partial(self, name: str) -> None:
+        try:
+            os.unlink(self.partial_path(name))
+        except OSError:
+            pass
+
+    def discard(self, sha256_hex: str) -> None:
+        if not sha256_hex or not _SHA256_RE.fullmatch(sha256_hex):
+            return
+        with self._lock:
+            if sha256_hex not in self._entries:
+                return
+            self._remove(sha256_hex)
+
+    def _evict(self) -> None:
+        while self._total_bytes > self.max_bytes and self._entries:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+
+    def _remove(self, sha256_hex: str) -> None:
+        try:
+            os.unlink(self._path(sha256_hex))
+        except OSError:
+            pass
+        self._forget(sha256_hex)
+
+    def _forget(self, sha256_hex: str) -> None:
+        size = self._entries.pop(sha256_hex, None)
+        if size is not None:
+            self._total_bytes -= size
@@ -0,0 +1,287 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from app.gmail.mirror import MIRROR_SYNC_SECONDS, run_mirror_step
+from app.gmail.oauth import OAuthError
+from app.imap.async_client import AsyncYahooIMAPClient, BlockingIMAPClient
+from app.imap.mailbox_watcher import (
+    DISCOVERY_MODE_FULL,
+    KnownUIDIndex,
+    MailboxHeartbeats,
+    _prepare_mailbox,
+    process_new_messages,
+)
+from app.imap.pool import IMAPSessionPool
+from app.imap.yahoo_client import YahooIMAPError
+from app.log.logger import log_event
+from app.sync.retry_worker import DeliveryPool, prepare_retry_worker, run_delete_pass, run_delivery_pass
+from app.sync.wakeup import AsyncDeliveryWakeup
+
+WATCHER_RESTART_SECONDS = 5
+
+
+class ConnectionExecutor:
+    # Blocking work runs on a few threads, each with its own SQLite connection
+    # (sqlite3 connections are bound to the thread that created them).
+    def __init__(self, conn_factory, max_workers: int = 1, name: str = "y2g"):
+        self._conn_factory = conn_factory
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._local = threading.local()
+        self._conns = []
+        self._conns_lock = threading.Lock()
+
+    def _call(self, func, *args, **kwargs):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._conn_factory()
+            self._local.conn = conn
+            with self._conns_lock:
+                self._conns.append(conn)
+        return func(conn, *args, **kwargs)
+
+    async def run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(self._call, func, *args, **kwargs))
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True)
+        with self._conns_lock:
+            conns, self._conns = self._conns, []
+        for conn in conns:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+
+async def watch_mailbox_async(
+    client: AsyncYahooIMAPClient,
+    db: ConnectionExecutor,
+    account_id: int,
+    mailbox: str,
+    replay_window_uids: int = 0,
+    idle_timeout: int = 900,
+    poll_interval: int = 30,
+    logger=None,
+    discovery_mode: str = DISCOVERY_MODE_FULL,
+    spool=None,
+    wakeup=None,
+) -> None:
+    # IDLE waits on the event loop; only the processing burst borrows a thread.
+    blocking = BlockingIMAPClient(client, asyncio.get_running_loop())
+    uidvalidity, last_seen = await db.run(
+        lambda conn: _prepare_mailbox(blocking, conn, account_id, mailbox, logger=logger)
+    )
+    known_uids = KnownUIDIndex()
+    heartbeats = MailboxHeartbeats()
+
+    def _process(conn, last_seen_uid: int) -> int:
+        return process_new_messages(
+            blocking,
+            conn,
+            account_id,
+            mailbox,
+            uidvalidity,
+            last_seen_uid,
+            replay_window_uids=replay_window_uids,
+            logger=logger,
+            discovery_mode=discovery_mode,
+            spool=spool,
+            known_uids=known_uids,
+            heartbeats=heartbeats,
+            wakeup=wakeup,
+        )
+
+    last_seen = await db.run(_process, last_seen)
+    while True:
+        if client.has_idle():
+            await client.select(mailbox)
+            result = await client.idle(timeout_seconds=idle_timeout)
+            if result.new_mail and logger:
+                log_event(
+                    logger,
+                    "imap_idle",
+                    "idle notified of new messages",
+                    correlation_id=f"{mailbox}|{uidvalidity}|{last_seen}",
+                    mailbox=mailbox,
+                )
+        else:
+            await asyncio.sleep(poll_interval)
+        last_seen = await db.run(_process, last_seen)
+
+
+async def _supervise_watcher(label: str, client_factory, watch, logger=None) -> None:
+    while True:
+        client = client_factory()
+        try:
+            await client.connect()
+            await watch(client)
+        except asyncio.CancelledError:
+            raise
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, YahooIMAPError) as exc:
+            if logger:
+                log_event(
+                    logger,
+                    "imap_watch_error",
+                    "imap watcher error; restarting",
+                    correlation_id=f"{label}|0|0",
+                    mailbox=label,
+                    error=str(exc),
+                    error_type=type(exc).__name__,
+                )
+        except Exception as exc:
+            if logger:
+                log_event(
+                    logger,
+                    "imap_watch_crash",
+                    "imap watcher crashed; restarting",
+                    correlation_id=f"{label}|0|0",
+                    mailbox=label,
+                    error=str(exc),
+                    error_type=type(exc).__name__,
+                )
+        finally:
+            try:
+                await client.close()
+            except Exception:
+                pass
+        await asyncio.sleep(WATCHER_RESTART_SECONDS)
+
+
+def _delivery_step(conn, service_manager, imap_pool, logger=None, **delivery_kwargs) -> bool:
+    try:
+        gmail_service = service_manager.get_service(conn)
+    except OAuthError as exc:
+        if logger:
+            log_event(
+                logger,
+                "oauth_unavailable",
+                "gmail oauth unavailable; waiting for new tokens",
+                error=str(exc),
+            )
+        return False
+    return run_delivery_pass(conn, gmail_service, imap_pool=imap_pool, logger=logger, **delivery_kwargs)
+
+
+def _delete_step(conn, imap_pool, logger=None, spool=None) -> bool:
+    if run_delete_pass(conn, imap_pool, logger=logger, spool=spool):
+        return True
+    imap_pool.prune()
+    return False
+
+
+async def _run_periodically(
+    worker: ConnectionExecutor, step, poll_interval: int, *args, wakeup=None, **kwargs
+) -> None:
+    while True:
+        worked = await worker.run(step, *args, **kwargs)
+        if worked:
+            continue
+        if wakeup is not None:
+            await wakeup.wait(poll_interval)
+        else:
+            await asyncio.sleep(poll_interval)
+
+
+async def run_async(
+    account_id: int,
+    imap_client_factory,
+    async_imap_client_factory,
+    service_manager,
+    gmail_user_id: str,
+    label_id: str | None,
+    deliver_to_inbox: bool,
+    inbox_label_id: str,
+    unread_label_id: str,
+    sent_label_id: str,
+    delivery_mode: str,
+    watch_mailboxes: List[str],
+    replay_window_uids: int = 0,
+    logger=None,
+    conn_factory=None,
+    alert_manager=None,
+    discovery_mode: str = DISCOVERY_MODE_FULL,
+    spool=None,
+    imap_pool_size: int = 2,
+    poll_interval: int = 10,
+    delivery_concurrency: int = 1,
+    mirror=None,
+):
+    if conn_factory is None:
+        raise ValueError("conn_factory is required")
+    watch_db = ConnectionExecutor(conn_factory, max_workers=max(1, min(4, len(watch_mailboxes))), name="y2g-watch")
+    # Delivery and deletes share one thread so they keep one SQLite connection.
+    worker = ConnectionExecutor(conn_factory, max_workers=1, name="y2g-worker")
+    imap_pool = IMAPSessionPool(imap_client_factory, max_size=imap_pool_size, logger=logger)
+    # The mirror pages through Gmail on its own thread so it never holds up delivery.
+    mirror_db = ConnectionExecutor(conn_factory, max_workers=1, name="y2g-mirror") if mirror is not None else None
+    delivery_pool = None
+    if delivery_concurrency > 1:
+        delivery_pool = DeliveryPool(conn_factory, service_manager, max_workers=delivery_concurrency)
+    await worker.run(prepare_retry_worker, logger=logger, alert_manager=alert_manager)
+    wakeup = AsyncDeliveryWakeup(asyncio.get_running_loop())
+
+    tasks = []
+    for mailbox in watch_mailboxes:
+        watch = functools.partial(
+            watch_mailbox_async,
+            db=watch_db,
+            account_id=account_id,
+            mailbox=mailbox,
+            replay_window_uids=replay_window_uids,
+            logger=logger,
+            discovery_mode=discovery_mode,
+            spool=spool,
+            wakeup=wakeup,
+        )
+        tasks.append(asyncio.create_task(_supervise_watcher(mailbox, async_imap_client_factory, watch, logger=logger)))
+    tasks.append(
+        asyncio.create_task(
+            _run_periodically(
+                worker,
+                _delivery_step,
+                poll_interval,
+                service_manager,
+                imap_pool,
+                wakeup=wakeup,
+                logger=logger,
+                gmail_user_id=gmail_user_id,
+                label_id=label_id,
+                deliver_to_inbox=deliver_to_inbox,
+                inbox_label_id=inbox_label_id,
+                unread_label_id=unread_label_id,
+                sent_label_id=sent_label_id,
+                delivery_mode=delivery_mode,
+                alert_manager=alert_manager,
+                spool=spool,
+                delivery_pool=delivery_pool,
+                mirror=mirror,
+            )
+        )
+    )
+    if mirror_db is not None:
+        tasks.append(
+            asyncio.create_task(
+                _run_periodically(
+                    mirror_db, run_mirror_step, MIRROR_SYNC_SECONDS, service_manager, mirror, logger=logger
+                )
+            )
+        )
+    tasks.append(
+        asyncio.create_task(_run_periodically(worker, _delete_step, poll_interval, imap_pool, logger=logger, spool=spool))
+    )
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await worker.run(lambda conn: imap_pool.close())
+        watch_db.shutdown()
+        worker.shutdown()
+        if mirror_db is not None:
+            mirror_db.shutdown()
+        if delivery_pool is not None:
+            delivery_pool.shutdown()
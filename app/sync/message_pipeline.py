@@ -1,11 +1,10 @@
 import hashlib
 import json
-import re
-from email.parser import BytesParser
-from email.policy import default
-from typing import Dict, List, Tuple
+import tempfile
+from typing import BinaryIO, Dict, List, Tuple
 
 from app.gmail.gmail_client import import_raw_message, insert_raw_message
+from app.imap.yahoo_client import RFC822_MEMORY_MAX_BYTES, RFC822_READ_CHUNK_BYTES
 
 
 class PipelineError(Exception):
@@ -24,27 +23,6 @@ def _extract_seen_flag(flags_json: str) -> bool:
     return "\\Seen" in flags
 
 
-def _parse_headers(raw_bytes: bytes):
-    msg = BytesParser(policy=default).parsebytes(raw_bytes)
-    return msg
-
-
-def extract_in_reply_to(raw_bytes: bytes) -> str | None:
-    msg = _parse_headers(raw_bytes)
-    value = msg.get("In-Reply-To")
-    if not value:
-        return None
-    return value.strip()
-
-
-def extract_references(raw_bytes: bytes) -> List[str]:
-    msg = _parse_headers(raw_bytes)
-    value = msg.get("References")
-    if not value:
-        return []
-    return [part.strip() for part in re.split(r"\\s+", value) if part.strip()]
-
-
 def add_headers(raw_bytes: bytes, headers: Dict[str, str]) -> bytes:
     if b"\r\n\r\n" in raw_bytes:
         sep = b"\r\n"
@@ -63,6 +41,16 @@ def add_headers(raw_bytes: bytes, headers: Dict[str, str]) -> bytes:
     return new_header_block + marker + body
 
 
+def _provenance_headers(mailbox_name: str, uidvalidity: int, uid: int, sha256_hex: str) -> Dict[str, str]:
+    return {
+        "X-Y2G-Source": "yahoo",
+        "X-Y2G-Mailbox": mailbox_name,
+        "X-Y2G-UIDValidity": str(uidvalidity),
+        "X-Y2G-UID": str(uid),
+        "X-Y2G-RFC822-SHA256": sha256_hex,
+    }
+
+
 def prepare_raw_message(
     raw_bytes: bytes,
     mailbox_name: str,
@@ -73,16 +61,60 @@ def prepare_raw_message(
     actual = _sha256_hex(raw_bytes)
     if actual != sha256_hex:
         raise PipelineError("RFC822 SHA256 mismatch")
-    headers = {
-        "X-Y2G-Source": "yahoo",
-        "X-Y2G-Mailbox": mailbox_name,
-        "X-Y2G-UIDValidity": str(uidvalidity),
-        "X-Y2G-UID": str(uid),
-        "X-Y2G-RFC822-SHA256": sha256_hex,
-    }
+    headers = _provenance_headers(mailbox_name, uidvalidity, uid, sha256_hex)
     return add_headers(raw_bytes, headers)
 
 
+def read_header_block(raw_file: BinaryIO) -> bytes:
+    raw_file.seek(0)
+    lines = []
+    for line in raw_file:
+        lines.append(line)
+        if line in (b"\r\n", b"\n"):
+            break
+    raw_file.seek(0)
+    return b"".join(lines)
+
+
+def prepare_raw_message_file(
+    raw_file: BinaryIO,
+    mailbox_name: str,
+    uidvalidity: int,
+    uid: int,
+    sha256_hex: str,
+    max_memory_bytes: int = RFC822_MEMORY_MAX_BYTES,
+) -> BinaryIO:
+    header_block = read_header_block(raw_file)
+    if header_block.endswith(b"\r\n\r\n") or header_block == b"\r\n":
+        sep = b"\r\n"
+    elif header_block.endswith(b"\n\n") or header_block == b"\n":
+        sep = b"\n"
+    else:
+        raise PipelineError("RFC822 headers/body separator not found")
+    headers = _provenance_headers(mailbox_name, uidvalidity, uid, sha256_hex)
+    extra = b"".join(f"{key}: {value}".encode("utf-8") + sep for key, value in headers.items())
+    digest = hashlib.sha256(header_block)
+    out = tempfile.SpooledTemporaryFile(max_size=max_memory_bytes)
+    try:
+        out.write(header_block[: -len(sep)] + extra + sep)
+        raw_file.seek(len(header_block))
+        while True:
+            chunk = raw_file.read(RFC822_READ_CHUNK_BYTES)
+            if not chunk:
+                break
+            digest.update(chunk)
+            out.write(chunk)
+        if digest.hexdigest() != sha256_hex:
+            raise PipelineError("RFC822 SHA256 mismatch")
+    except BaseException:
+        out.close()
+        raise
+    finally:
+        raw_file.seek(0)
+    out.seek(0)
+    return out
+
+
 def build_label_ids(
     label_id: str | None,
     deliver_to_inbox: bool,
@@ -107,7 +139,7 @@ def build_sent_label_ids(sent_label_id: str) -> List[str]:
 def insert_message(
     service,
     user_id: str,
-    raw_bytes: bytes,
+    raw_bytes: bytes | BinaryIO,
     label_id: str | None,
     deliver_to_inbox: bool,
     flags_json: str,
@@ -128,7 +160,7 @@ def insert_message(
 def insert_sent_message(
     service,
     user_id: str,
-    raw_bytes: bytes,
+    raw_bytes: bytes | BinaryIO,
     sent_label_id: str,
     thread_id: str | None = None,
 ) -> Tuple[str, str]:
@@ -144,7 +176,7 @@ def insert_sent_message(
 def import_message(
     service,
     user_id: str,
-    raw_bytes: bytes,
+    raw_bytes: bytes | BinaryIO,
     label_id: str | None,
     deliver_to_inbox: bool,
     flags_json: str,
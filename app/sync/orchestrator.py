@@ -3,9 +3,100 @@ import threading
 import time
 from typing import List
 
-from app.imap.mailbox_watcher import watch_mailbox
+from app.gmail.mirror import MIRROR_SYNC_SECONDS, run_mirror_step
+from app.imap.mailbox_watcher import (
+    DISCOVERY_MODE_FULL,
+    WATCH_MODE_PER_MAILBOX,
+    WATCH_MODE_SHARED,
+    watch_mailbox,
+    watch_mailboxes_shared,
+)
+from app.imap.standby import StandbyConnection
 from app.log.logger import log_event
 from app.sync.retry_worker import run_retry_loop
+from app.sync.wakeup import DeliveryWakeup
+
+WATCHER_RESTART_SECONDS = 5
+# A watcher that ran at least this long before failing restarts immediately.
+WATCHER_HEALTHY_SECONDS = 60
+
+
+def _start_watcher_thread(label: str, watch, imap_client_factory, logger=None, conn_factory=None, standby=None):
+    def _runner():
+        conn = conn_factory() if conn_factory else None
+        try:
+            while True:
+                client = None
+                started = time.monotonic()
+                try:
+                    if standby is not None:
+                        client, _ = standby.take()
+                    else:
+                        client = imap_client_factory()
+                    watch(client, conn)
+                    if logger:
+                        log_event(
+                            logger,
+                            "imap_watch_exit",
+                            "imap watcher exited; restarting",
+                            correlation_id=f"{label}|0|0",
+                            mailbox=label,
+                        )
+                except (OSError, imaplib.IMAP4.abort, imaplib.IMAP4.error) as exc:
+                    if logger:
+                        log_event(
+                            logger,
+                            "imap_watch_error",
+                            "imap watcher error; restarting",
+                            correlation_id=f"{label}|0|0",
+                            mailbox=label,
+                            error=str(exc),
+                            error_type=type(exc).__name__,
+                        )
+                except Exception as exc:
+                    if logger:
+                        log_event(
+                            logger,
+                            "imap_watch_crash",
+                            "imap watcher crashed; restarting",
+                            correlation_id=f"{label}|0|0",
+                            mailbox=label,
+                            error=str(exc),
+                            error_type=type(exc).__name__,
+                        )
+                finally:
+                    if client:
+                        try:
+                            client.close()
+                        except Exception:
+                            pass
+                if time.monotonic() - started < WATCHER_HEALTHY_SECONDS:
+                    time.sleep(WATCHER_RESTART_SECONDS)
+        finally:
+            try:
+                if conn:
+                    conn.close()
+            except Exception:
+                pass
+
+    t = threading.Thread(target=_runner, daemon=True)
+    t.start()
+    return t
+
+
+def _start_mirror_thread(mirror, service_manager, conn_factory, logger=None):
+    def _runner():
+        conn = conn_factory()
+        try:
+            while True:
+                if not run_mirror_step(conn, service_manager, mirror, logger=logger):
+                    time.sleep(MIRROR_SYNC_SECONDS)
+        finally:
+            conn.close()
+
+    t = threading.Thread(target=_runner, daemon=True)
+    t.start()
+    return t
 
 
 def start_watchers(
@@ -15,75 +106,52 @@ def start_watchers(
     replay_window_uids: int = 0,
     logger=None,
     conn_factory=None,
+    discovery_mode: str = DISCOVERY_MODE_FULL,
+    spool=None,
+    watch_mode: str = WATCH_MODE_PER_MAILBOX,
+    wakeup=None,
+    imap_standby: bool = False,
 ):
+    standby = None
+    if imap_standby:
+        # One warm spare session shared by every watcher for fast reconnects;
+        # it costs one more Yahoo login for as long as the process runs.
+        standby = StandbyConnection(imap_client_factory, logger=logger)
+        standby.start()
+    if watch_mode == WATCH_MODE_SHARED and mailboxes:
+        def _watch_shared(client, conn):
+            watch_mailboxes_shared(
+                client,
+                conn,
+                account_id,
+                mailboxes,
+                replay_window_uids=replay_window_uids,
+                logger=logger,
+                discovery_mode=discovery_mode,
+                spool=spool,
+                wakeup=wakeup,
+            )
+
+        label = ",".join(mailboxes)
+        return [_start_watcher_thread(label, _watch_shared, imap_client_factory, logger, conn_factory, standby)]
+
     threads = []
     for mailbox in mailboxes:
-        def _runner(mbox: str):
-            conn = conn_factory() if conn_factory else None
-            try:
-                while True:
-                    client = None
-                    try:
-                        client = imap_client_factory()
-                        watch_mailbox(
-                            client,
-                            conn,
-                            account_id,
-                            mbox,
-                            replay_window_uids=replay_window_uids,
-                            logger=logger,
-                        )
-                        if logger:
-                            log_event(
-                                logger,
-                                "imap_watch_exit",
-                                "imap watcher exited; restarting",
-                                correlation_id=f"{mbox}|0|0",
-                                mailbox=mbox,
-                            )
-                    except (OSError, imaplib.IMAP4.abort, imaplib.IMAP4.error) as exc:
-                        if logger:
-                            log_event(
-                                logger,
-                                "imap_watch_error",
-                                "imap watcher error; restarting",
-                                correlation_id=f"{mbox}|0|0",
-                                mailbox=mbox,
-                                error=str(exc),
-                                error_type=type(exc).__name__,
-                            )
-                    except Exception as exc:
-                        if logger:
-                            log_event(
-                                logger,
-                                "imap_watch_crash",
-                                "imap watcher crashed; restarting",
-                                correlation_id=f"{mbox}|0|0",
-                                mailbox=mbox,
-                                error=str(exc),
-                                error_type=type(exc).__name__,
-                            )
-                    finally:
-                        if client:
-                            try:
-                                client.close()
-                            except Exception:
-                                pass
-                    time.sleep(5)
-            finally:
-                try:
-                    if conn:
-                        conn.close()
-                except Exception:
-                    pass
+        def _watch(client, conn, mbox: str = mailbox):
+            watch_mailbox(
+                client,
+                conn,
+                account_id,
+                mbox,
+                replay_window_uids=replay_window_uids,
+                logger=logger,
+                discovery_mode=discovery_mode,
+                spool=spool,
+                standby=standby,
+                wakeup=wakeup,
+            )
 
-        t = threading.Thread(
-            target=_runner,
-            args=(mailbox,),
-            daemon=True,
-        )
-        t.start()
-        threads.append(t)
+        threads.append(_start_watcher_thread(mailbox, _watch, imap_client_factory, logger, conn_factory, standby))
     return threads
 
 
@@ -103,9 +171,19 @@ def run(
     logger=None,
     conn_factory=None,
     alert_manager=None,
+    discovery_mode: str = DISCOVERY_MODE_FULL,
+    spool=None,
+    imap_pool_size: int = 2,
+    watch_mode: str = WATCH_MODE_PER_MAILBOX,
+    delivery_concurrency: int = 1,
+    mirror=None,
+    imap_standby: bool = False,
 ):
     if conn_factory is None:
         raise ValueError("conn_factory is required")
+    wakeup = DeliveryWakeup()
+    if mirror is not None:
+        _start_mirror_thread(mirror, service_manager, conn_factory, logger=logger)
     threads = start_watchers(
         account_id,
         imap_client_factory,
@@ -113,6 +191,11 @@ def run(
         replay_window_uids=replay_window_uids,
         logger=logger,
         conn_factory=conn_factory,
+        discovery_mode=discovery_mode,
+        spool=spool,
+        watch_mode=watch_mode,
+        wakeup=wakeup,
+        imap_standby=imap_standby,
     )
     run_retry_loop(
         conn_factory(),
@@ -128,6 +211,12 @@ def run(
         account_id,
         logger=logger,
         alert_manager=alert_manager,
+        spool=spool,
+        imap_pool_size=imap_pool_size,
+        wakeup=wakeup,
+        conn_factory=conn_factory,
+        delivery_concurrency=delivery_concurrency,
+        mirror=mirror,
     )
     for t in threads:
         t.join()
@@ -1,12 +1,33 @@
+import hashlib
+import os
 import random
+import threading
 import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
+from typing import BinaryIO, Dict, Optional
 
-from app.imap.yahoo_client import YahooIMAPClient, YahooIMAPError
+from app.imap.headers import HeaderSummary, scan_headers
+from app.imap.pool import STALE_CONNECTION_ERRORS, IMAPSessionPool
+from app.imap.yahoo_client import RFC822_READ_CHUNK_BYTES, YahooIMAPClient, YahooIMAPError
+from app.store.models import RFC822_SHA256_PENDING
+from app.store.message_index import (
+    MissingMessageIDCache,
+    forget_gmail_thread,
+    lookup_gmail_message,
+    lookup_gmail_messages,
+)
 from app.store.lease import acquire_insert_lease, mark_failed_perm, mark_failed_retry, mark_inserted, mark_suppressed_duplicate, recover_stuck_insertions
-from app.gmail.gmail_client import find_message_by_rfc822msgid, find_thread_id_by_rfc822msgid
+from app.gmail.gmail_client import find_message_by_rfc822msgid, find_messages_by_rfc822msgids, thread_exists
 from app.gmail.oauth import OAuthError
-from app.sync.message_pipeline import extract_in_reply_to, extract_references, import_message, insert_message, insert_sent_message, prepare_raw_message
+from app.gmail.quota import is_throttled
+from app.sync.message_pipeline import (
+    import_message,
+    insert_message,
+    insert_sent_message,
+    prepare_raw_message_file,
+    read_header_block,
+)
 from app.log.logger import log_event
 
 try:
@@ -22,6 +43,27 @@ except Exception:  # pragma: no cover
 
 BACKOFF_SCHEDULE_SECONDS = [60, 120, 240, 480, 900, 1800, 3600]
 MAX_FETCH_RETRIES = 5
+# A delivery pass stops after this many bytes and re-selects, so mail that
+# arrived meanwhile is not queued behind a run of large messages.
+DELIVERY_PASS_MAX_BYTES = 32 * 1024 * 1024
+SIZE_BUCKETS = [
+    (100 * 1024, "<100KB"),
+    (1024 * 1024, "100KB-1MB"),
+    (10 * 1024 * 1024, "1MB-10MB"),
+]
+# Messages at least this large download in BODY.PEEK[]<offset.length> chunks
+# into the spool's partial/ directory, so a failed attempt resumes instead of
+# starting over. Needs the spool; without it they download in one FETCH.
+RESUMABLE_DOWNLOAD_MIN_BYTES = 8 * 1024 * 1024
+PARTIAL_FETCH_CHUNK_BYTES = 2 * 1024 * 1024
+LARGE_SIZE_BUCKET = ">=10MB"
+UNKNOWN_SIZE_BUCKET = "unknown"
+_AUTH_403_REASONS = ("insufficientpermissions", "autherror", "access_token_scope_insufficient")
+
+_latency_totals: Dict[str, Dict[str, float]] = {}
+_latency_totals_lock = threading.Lock()
+# Message-IDs Gmail did not find while resolving threads.
+_missing_msgids = MissingMessageIDCache()
 
 
 def _utc_now() -> datetime:
@@ -45,17 +87,31 @@ def _is_retryable_error(exc: Exception) -> bool:
         status = getattr(exc.resp, "status", None)
         if status is None:
             return True
-        if status in {429, 500, 502, 503, 504}:
+        if status in {429, 500, 502, 503, 504} or is_throttled(exc):
             return True
         if 400 <= status < 500:
             return False
     return True
 
 
+def _is_auth_failure(exc: Exception) -> bool:
+    # A 403 also carries rate limits and daily quota; only these reasons mean
+    # the token itself has to be replaced.
+    status = getattr(exc.resp, "status", None)
+    if status == 401:
+        return True
+    if status != 403:
+        return False
+    content = exc.content
+    if isinstance(content, bytes):
+        content = content.decode("utf-8", errors="replace")
+    content = str(content).lower()
+    return any(reason in content for reason in _AUTH_403_REASONS)
+
+
 def _should_alert_oauth_invalid(exc: Exception) -> bool:
     if HttpError and isinstance(exc, HttpError):
-        status = getattr(exc.resp, "status", None)
-        return status in {401, 403}
+        return _is_auth_failure(exc)
     if RefreshError and isinstance(exc, RefreshError):
         return "invalid_grant" in str(exc).lower()
     return "invalid_grant" in repr(exc).lower()
@@ -128,13 +184,56 @@ def _oauth_alert_payload(exc: Exception) -> tuple[str, str] | None:
         return ("oauth_client_mismatch", "OAuth client credentials do not match stored tokens")
     if "access_token_scope_insufficient" in text or "insufficient scope" in text:
         return ("oauth_scope_insufficient", "OAuth token scopes are insufficient")
-    if HttpError and isinstance(exc, HttpError):
-        status = getattr(exc.resp, "status", None)
-        if status in {401, 403}:
-            return ("oauth_invalid", f"Gmail API authorization failed ({status})")
+    if HttpError and isinstance(exc, HttpError) and _is_auth_failure(exc):
+        return ("oauth_invalid", f"Gmail API authorization failed ({exc.resp.status})")
     return None
 
 
+def _size_bucket(size: Optional[int]) -> str:
+    if size is None:
+        return UNKNOWN_SIZE_BUCKET
+    for limit, name in SIZE_BUCKETS:
+        if size < limit:
+            return name
+    return LARGE_SIZE_BUCKET
+
+
+def _record_delivery_latency(size: Optional[int], latency_seconds: float) -> None:
+    bucket = _size_bucket(size)
+    with _latency_totals_lock:
+        totals = _latency_totals.setdefault(bucket, {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+        totals["count"] += 1
+        totals["total_seconds"] += latency_seconds
+        totals["max_seconds"] = max(totals["max_seconds"], latency_seconds)
+
+
+def delivery_latency_summary() -> Dict[str, Dict[str, float]]:
+    with _latency_totals_lock:
+        return {
+            bucket: {
+                "count": int(totals["count"]),
+                "avg_seconds": round(totals["total_seconds"] / totals["count"], 1),
+                "max_seconds": round(totals["max_seconds"], 1),
+            }
+            for bucket, totals in _latency_totals.items()
+        }
+
+
+def _delivery_latency_seconds(row) -> Optional[float]:
+    try:
+        discovered_at = datetime.fromisoformat(str(row["created_at"]).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if discovered_at.tzinfo is None:
+        discovered_at = discovered_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (_utc_now() - discovered_at).total_seconds())
+
+
+def _schedule_by_size(rows):
+    # sorted() is stable, so equal sizes keep their due order.
+    return sorted(rows, key=lambda row: row["rfc822_size"] or 0)
+
+
 def _select_due_messages(conn, limit: int = 50):
     return conn.execute(
         """
@@ -150,30 +249,201 @@ def _select_due_messages(conn, limit: int = 50):
 
 def _fetch_rfc822(client: YahooIMAPClient, mailbox: str, uid: int):
     client.select(mailbox)
-    rfc822, flags_list, internal_value = client.fetch_rfc822(uid)
-    return rfc822, flags_list, internal_value
+    return client.fetch_rfc822_file(uid)
+
+
+def _sha256_file(handle: BinaryIO) -> str:
+    digest = hashlib.sha256()
+    while True:
+        chunk = handle.read(RFC822_READ_CHUNK_BYTES)
+        if not chunk:
+            break
+        digest.update(chunk)
+    handle.seek(0)
+    return digest.hexdigest()
+
+
+def _record_rfc822_sha256(conn, message_id: int, sha256_hex: str) -> None:
+    with conn:
+        conn.execute(
+            """
+            UPDATE messages
+               SET rfc822_sha256 = ?, updated_at = ?
+             WHERE id = ?
+            """,
+            (sha256_hex, _utc_now_iso(), message_id),
+        )
+
+
+def _record_download_offset(conn, message_id: int, offset: int) -> None:
+    with conn:
+        conn.execute(
+            """
+            UPDATE messages
+               SET download_offset = ?, updated_at = ?
+             WHERE id = ?
+            """,
+            (offset, _utc_now_iso(), message_id),
+        )
+
+
+def _download_resumable(conn, row, imap_client: YahooIMAPClient, spool) -> tuple[BinaryIO, str]:
+    imap_client.select(row["mailbox_name"])
+    name = str(row["id"])
+    path = spool.partial_path(name)
+    size = row["rfc822_size"] or 0
+    handle = open(path, "a+b")
+    try:
+        handle.seek(0, os.SEEK_END)
+        # Bytes past the recorded offset come from a chunk that never completed.
+        offset = min(row["download_offset"] or 0, handle.tell())
+        handle.truncate(offset)
+        while True:
+            written = imap_client.fetch_partial(row["uid"], offset, PARTIAL_FETCH_CHUNK_BYTES, handle)
+            handle.flush()
+            offset += written
+            _record_download_offset(conn, row["id"], offset)
+            if written < PARTIAL_FETCH_CHUNK_BYTES or (size and offset >= size):
+                break
+        if not offset:
+            raise YahooIMAPError("RFC822 body missing")
+        handle.seek(0)
+        actual = _sha256_file(handle)
+    except BaseException:
+        handle.close()
+        raise
+    expected = row["rfc822_sha256"]
+    if expected != RFC822_SHA256_PENDING and actual != expected:
+        handle.close()
+        spool.discard_partial(name)
+        _record_download_offset(conn, row["id"], 0)
+        raise YahooIMAPError("RFC822 SHA256 mismatch after resumed download")
+    if expected == RFC822_SHA256_PENDING:
+        _record_rfc822_sha256(conn, row["id"], actual)
+        expected = actual
+    # The open handle stays readable after the partial file is unlinked.
+    spool.discard_partial(name)
+    _record_download_offset(conn, row["id"], 0)
+    spool.put_file(actual, handle)
+    return handle, expected
+
+
+def _load_rfc822(conn, row, imap_client: YahooIMAPClient, spool=None) -> tuple[BinaryIO, str]:
+    expected = row["rfc822_sha256"]
+    if spool and expected != RFC822_SHA256_PENDING:
+        cached = spool.open(expected)
+        if cached is not None:
+            if _sha256_file(cached) == expected:
+                return cached, expected
+            cached.close()
+            spool.discard(expected)
+    if spool and (row["rfc822_size"] or 0) >= RESUMABLE_DOWNLOAD_MIN_BYTES:
+        return _download_resumable(conn, row, imap_client, spool)
+    download = _fetch_rfc822(imap_client, row["mailbox_name"], row["uid"])
+    actual = download.sha256_hex
+    if expected == RFC822_SHA256_PENDING:
+        # Header-only discovery: the first full download defines the content hash.
+        _record_rfc822_sha256(conn, row["id"], actual)
+        expected = actual
+    if spool and actual == expected:
+        spool.put_file(actual, download.file)
+    return download.file, expected
 
 
 def _is_sent_mailbox(mailbox_name: str) -> bool:
     return "sent" in mailbox_name.lower()
 
 
-def _resolve_thread_id(gmail_service, gmail_user_id: str, rfc822: bytes) -> str | None:
-    in_reply_to = extract_in_reply_to(rfc822)
-    if in_reply_to:
-        match = find_message_by_rfc822msgid(gmail_service, gmail_user_id, in_reply_to)
-        if match:
-            _, thread_id = match
-            return thread_id
-    refs = extract_references(rfc822)
-    for ref in reversed(refs):
-        match = find_message_by_rfc822msgid(gmail_service, gmail_user_id, ref)
+def _resolve_thread_id(
+    conn,
+    account_id: int,
+    gmail_service,
+    gmail_user_id: str,
+    headers: HeaderSummary,
+    mirror_covers=None,
+) -> str | None:
+    # In-Reply-To first, then References from the newest.
+    candidates = [msgid for msgid in dict.fromkeys([headers.in_reply_to, *reversed(headers.references)]) if msgid]
+    if not candidates:
+        return None
+    matches = lookup_gmail_messages(conn, account_id, candidates)
+    if not matches and mirror_covers is not None and mirror_covers():
+        # With a fresh mirror of the whole mailbox a local miss needs no
+        # search; the catch-up may just have indexed the parent.
+        matches = lookup_gmail_messages(conn, account_id, candidates)
+    elif not matches:
+        remote = [msgid for msgid in candidates if msgid not in _missing_msgids]
+        if remote:
+            matches = find_messages_by_rfc822msgids(gmail_service, gmail_user_id, remote)
+            for msgid in remote:
+                if msgid not in matches:
+                    _missing_msgids.add(msgid)
+    for msgid in candidates:
+        match = matches.get(msgid)
         if match:
             _, thread_id = match
             return thread_id
     return None
 
 
+def _is_stale_thread_error(exc: Exception) -> bool:
+    # Gmail answers 404, or 400 naming the threadId, once the thread is gone.
+    # Other 400s (a malformed message, say) must not cost the index its rows.
+    if not (HttpError and isinstance(exc, HttpError)):
+        return False
+    status = getattr(exc.resp, "status", None)
+    if status == 404:
+        return True
+    if status != 400:
+        return False
+    content = exc.content
+    if isinstance(content, bytes):
+        content = content.decode("utf-8", errors="replace")
+    content = str(content).lower()
+    return "threadid" in content or "thread_id" in content
+
+
+def _insert_threaded(
+    conn,
+    account_id: int,
+    gmail_service,
+    gmail_user_id: str,
+    thread_id: str | None,
+    insert,
+    logger=None,
+    correlation_id=None,
+):
+    try:
+        return insert(thread_id)
+    except Exception as exc:
+        if thread_id is None or not _is_stale_thread_error(exc):
+            raise
+        # Rows are only forgotten once Gmail confirms the thread is gone.
+        if thread_exists(gmail_service, gmail_user_id, thread_id):
+            raise
+        error = exc
+    with conn:
+        forget_gmail_thread(conn, account_id, thread_id)
+    if logger:
+        log_event(
+            logger,
+            "insert_thread_stale",
+            "gmail rejected indexed thread; retrying without threadId",
+            correlation_id=correlation_id,
+            gmail_thread_id=thread_id,
+            error=repr(error),
+        )
+    return insert(None)
+
+
+def _header_summary(row, rfc822: BinaryIO) -> HeaderSummary:
+    # Rows stored before the summary column existed are scanned once here.
+    summary = HeaderSummary.from_json(row["headers_json"])
+    if summary is None:
+        summary = scan_headers(read_header_block(rfc822), row["rfc822_size"])
+    return summary
+
+
 def _select_due_deletions(conn, limit: int = 50):
     return conn.execute(
         """
@@ -220,36 +490,116 @@ def _mark_yahoo_delete_failed(conn, message_id: int, last_error: str, next_attem
         )
 
 
-def _delete_yahoo_message(conn, row, imap_client: YahooIMAPClient, logger=None) -> None:
-    message_id = row["id"]
+def _record_yahoo_delete_success(conn, row, logger=None, spool=None, sha256_hex: str | None = None) -> None:
+    _mark_yahoo_deleted(conn, row["id"])
+    if spool:
+        spool.discard(sha256_hex or row["rfc822_sha256"])
+    if logger:
+        log_event(
+            logger,
+            "yahoo_delete_success",
+            "deleted yahoo message",
+            correlation_id=f"{row['mailbox_name']}|{row['uidvalidity']}|{row['uid']}",
+            mailbox=row["mailbox_name"],
+            uid=row["uid"],
+            uidvalidity=row["uidvalidity"],
+        )
+
+
+def _record_yahoo_delete_failure(conn, row, exc: Exception, logger=None) -> None:
+    next_attempt = _next_attempt_at(row["yahoo_delete_attempt_count"])
+    _mark_yahoo_delete_failed(conn, row["id"], repr(exc), next_attempt)
+    if logger:
+        log_event(
+            logger,
+            "yahoo_delete_failure",
+            "failed to delete yahoo message; retry scheduled",
+            correlation_id=f"{row['mailbox_name']}|{row['uidvalidity']}|{row['uid']}",
+            mailbox=row["mailbox_name"],
+            uid=row["uid"],
+            uidvalidity=row["uidvalidity"],
+            error=repr(exc),
+            next_attempt_at=next_attempt,
+        )
+
+
+def _delete_yahoo_message(
+    conn,
+    row,
+    imap_client: YahooIMAPClient,
+    logger=None,
+    spool=None,
+    sha256_hex: str | None = None,
+) -> bool:
     try:
         imap_client.delete_uid(row["mailbox_name"], row["uidvalidity"], row["uid"])
-        _mark_yahoo_deleted(conn, message_id)
-        if logger:
-            log_event(
-                logger,
-                "yahoo_delete_success",
-                "deleted yahoo message",
-                correlation_id=f"{row['mailbox_name']}|{row['uidvalidity']}|{row['uid']}",
-                mailbox=row["mailbox_name"],
-                uid=row["uid"],
-                uidvalidity=row["uidvalidity"],
-            )
     except Exception as exc:
-        next_attempt = _next_attempt_at(row["yahoo_delete_attempt_count"])
-        _mark_yahoo_delete_failed(conn, message_id, repr(exc), next_attempt)
+        _record_yahoo_delete_failure(conn, row, exc, logger=logger)
+        return isinstance(exc, STALE_CONNECTION_ERRORS)
+    _record_yahoo_delete_success(conn, row, logger=logger, spool=spool, sha256_hex=sha256_hex)
+    return False
+
+
+def _delete_pooled(
+    conn,
+    row,
+    imap_pool: IMAPSessionPool,
+    logger=None,
+    spool=None,
+    sha256_hex: str | None = None,
+) -> None:
+    # The Gmail side is already done, so failing to get a session only
+    # defers the delete to the delete pass.
+    try:
+        imap_client = imap_pool.acquire()
+    except Exception as exc:
+        _record_yahoo_delete_failure(conn, row, exc, logger=logger)
+        return
+    session_lost = True
+    try:
+        session_lost = _delete_yahoo_message(
+            conn, row, imap_client, logger=logger, spool=spool, sha256_hex=sha256_hex
+        )
+    finally:
+        imap_pool.release(imap_client, discard=session_lost)
+
+
+def _group_deletions(rows) -> dict[tuple[str, int], list]:
+    groups: dict[tuple[str, int], list] = {}
+    for row in rows:
+        groups.setdefault((row["mailbox_name"], row["uidvalidity"]), []).append(row)
+    return groups
+
+
+def _delete_yahoo_messages(conn, rows, imap_client: YahooIMAPClient, logger=None, spool=None) -> bool:
+    session_lost: Exception | None = None
+    for (mailbox_name, uidvalidity), group in _group_deletions(rows).items():
+        if session_lost is not None:
+            for row in group:
+                _record_yahoo_delete_failure(conn, row, session_lost, logger=logger)
+            continue
+        uids = [row["uid"] for row in group]
         if logger:
             log_event(
                 logger,
-                "yahoo_delete_failure",
-                "failed to delete yahoo message; retry scheduled",
-                correlation_id=f"{row['mailbox_name']}|{row['uidvalidity']}|{row['uid']}",
-                mailbox=row["mailbox_name"],
-                uid=row["uid"],
-                uidvalidity=row["uidvalidity"],
-                error=repr(exc),
-                next_attempt_at=next_attempt,
+                "yahoo_delete_attempt",
+                "deleting yahoo messages",
+                correlation_id=f"{mailbox_name}|{uidvalidity}|{min(uids)}",
+                mailbox=mailbox_name,
+                uidvalidity=uidvalidity,
+                uids=uids,
             )
+        try:
+            imap_client.delete_uids(mailbox_name, uidvalidity, uids)
+        except Exception as exc:
+            if isinstance(exc, STALE_CONNECTION_ERRORS):
+                session_lost = exc
+            for row in group:
+                _record_yahoo_delete_failure(conn, row, exc, logger=logger)
+            continue
+        for row in group:
+            _record_yahoo_delete_success(conn, row, logger=logger, spool=spool)
+    return session_lost is not None
 
 
 def _process_message(
@@ -263,8 +613,10 @@ def _process_message(
     unread_label_id: str,
     sent_label_id: str,
     delivery_mode: str,
-    imap_client: YahooIMAPClient,
+    imap_pool: IMAPSessionPool,
     logger=None,
+    spool=None,
+    mirror=None,
 ):
     use_import = delivery_mode == "import" and row["attempt_count"] == 0 and not _is_sent_mailbox(row["mailbox_name"])
     if logger:
@@ -278,54 +630,101 @@ def _process_message(
             uidvalidity=row["uidvalidity"],
             delivery_mode="import" if use_import else "insert",
         )
-    rfc822, flags_meta, _ = _fetch_rfc822(imap_client, row["mailbox_name"], row["uid"])
-    prepared = prepare_raw_message(
-        rfc822,
-        row["mailbox_name"],
-        row["uidvalidity"],
-        row["uid"],
-        row["rfc822_sha256"],
-    )
-
-    if _is_sent_mailbox(row["mailbox_name"]):
-        duplicate = find_message_by_rfc822msgid(gmail_service, gmail_user_id, row["message_id"])
-        if duplicate:
-            mark_suppressed_duplicate(conn, row["id"])
-            _delete_yahoo_message(conn, row, imap_client, logger=logger)
-            return
-        thread_id = _resolve_thread_id(gmail_service, gmail_user_id, rfc822)
-        gmail_message_id, gmail_thread_id = insert_sent_message(
-            gmail_service,
-            gmail_user_id,
-            prepared,
-            sent_label_id,
-            thread_id=thread_id,
-        )
-    elif use_import:
-        gmail_message_id, gmail_thread_id = import_message(
-            gmail_service,
-            gmail_user_id,
-            prepared,
-            label_id,
-            deliver_to_inbox,
-            row["imap_flags_json"],
-            inbox_label_id,
-            unread_label_id,
+    # A Yahoo session is held only while bytes move; Gmail calls can take
+    # far longer and must not starve the other workers of sessions.
+    with imap_pool.session() as imap_client:
+        rfc822, sha256_hex = _load_rfc822(conn, row, imap_client, spool=spool)
+    with rfc822:
+        headers = _header_summary(row, rfc822)
+        prepared = prepare_raw_message_file(
+            rfc822,
+            row["mailbox_name"],
+            row["uidvalidity"],
+            row["uid"],
+            sha256_hex,
         )
-    else:
-        thread_id = _resolve_thread_id(gmail_service, gmail_user_id, rfc822)
-        gmail_message_id, gmail_thread_id = insert_message(
-            gmail_service,
-            gmail_user_id,
-            prepared,
-            label_id,
-            deliver_to_inbox,
-            row["imap_flags_json"],
-            inbox_label_id,
-            unread_label_id,
-            thread_id=thread_id,
-        )
-    mark_inserted(conn, row["id"], gmail_message_id, gmail_thread_id)
+
+    def catch_up() -> bool:
+        # Only asked when a local miss would otherwise mean a Gmail search.
+        return mirror is not None and mirror.catch_up(conn, gmail_service, row["created_at"], logger=logger)
+
+    correlation_id = f"{row['mailbox_name']}|{row['uidvalidity']}|{row['uid']}"
+    with prepared:
+        if _is_sent_mailbox(row["mailbox_name"]):
+            mirrored = catch_up()
+            duplicate = lookup_gmail_message(conn, row["account_id"], row["message_id"])
+            if duplicate is None and not mirrored:
+                duplicate = find_message_by_rfc822msgid(gmail_service, gmail_user_id, row["message_id"])
+            if duplicate:
+                mark_suppressed_duplicate(conn, row["id"])
+                _delete_pooled(conn, row, imap_pool, logger=logger, spool=spool, sha256_hex=sha256_hex)
+                return
+            thread_id = _resolve_thread_id(
+                conn, row["account_id"], gmail_service, gmail_user_id, headers, mirror_covers=lambda: mirrored
+            )
+            gmail_message_id, gmail_thread_id = _insert_threaded(
+                conn,
+                row["account_id"],
+                gmail_service,
+                gmail_user_id,
+                thread_id,
+                lambda thread_id: insert_sent_message(
+                    gmail_service,
+                    gmail_user_id,
+                    prepared,
+                    sent_label_id,
+                    thread_id=thread_id,
+                ),
+                logger=logger,
+                correlation_id=correlation_id,
+            )
+        elif use_import:
+            gmail_message_id, gmail_thread_id = import_message(
+                gmail_service,
+                gmail_user_id,
+                prepared,
+                label_id,
+                deliver_to_inbox,
+                row["imap_flags_json"],
+                inbox_label_id,
+                unread_label_id,
+            )
+        else:
+            thread_id = _resolve_thread_id(
+                conn, row["account_id"], gmail_service, gmail_user_id, headers, mirror_covers=catch_up
+            )
+            gmail_message_id, gmail_thread_id = _insert_threaded(
+                conn,
+                row["account_id"],
+                gmail_service,
+                gmail_user_id,
+                thread_id,
+                lambda thread_id: insert_message(
+                    gmail_service,
+                    gmail_user_id,
+                    prepared,
+                    label_id,
+                    deliver_to_inbox,
+                    row["imap_flags_json"],
+                    inbox_label_id,
+                    unread_label_id,
+                    thread_id=thread_id,
+                ),
+                logger=logger,
+                correlation_id=correlation_id,
+            )
+    mark_inserted(
+        conn,
+        row["id"],
+        gmail_message_id,
+        gmail_thread_id,
+        account_id=row["account_id"],
+        rfc822_message_id=row["message_id"],
+    )
+    _missing_msgids.discard(row["message_id"])
+    latency_seconds = _delivery_latency_seconds(row)
+    if latency_seconds is not None:
+        _record_delivery_latency(row["rfc822_size"], latency_seconds)
     if logger:
         log_event(
             logger,
@@ -335,26 +734,14 @@ def _process_message(
             gmail_message_id=gmail_message_id,
             gmail_thread_id=gmail_thread_id,
             delivery_mode="import" if use_import else "insert",
+            rfc822_size=row["rfc822_size"],
+            size_bucket=_size_bucket(row["rfc822_size"]),
+            latency_seconds=latency_seconds,
         )
-    _delete_yahoo_message(conn, row, imap_client, logger=logger)
+    _delete_pooled(conn, row, imap_pool, logger=logger, spool=spool, sha256_hex=sha256_hex)
 
 
-def run_retry_loop(
-    conn,
-    service_manager,
-    gmail_user_id: str,
-    label_id: str | None,
-    deliver_to_inbox: bool,
-    inbox_label_id: str,
-    unread_label_id: str,
-    sent_label_id: str,
-    delivery_mode: str,
-    imap_client_factory,
-    account_id: int,
-    poll_interval: int = 10,
-    logger=None,
-    alert_manager=None,
-):
+def prepare_retry_worker(conn, logger=None, alert_manager=None) -> None:
     recovered = recover_stuck_insertions(conn)
     if logger and recovered:
         log_event(
@@ -371,6 +758,235 @@ def run_retry_loop(
             "reclassified terminal retry rows",
             reclassified=reclassified,
         )
+
+
+def _deliver_row(
+    conn,
+    row,
+    gmail_service,
+    gmail_user_id: str,
+    label_id: str | None,
+    deliver_to_inbox: bool,
+    inbox_label_id: str,
+    unread_label_id: str,
+    sent_label_id: str,
+    delivery_mode: str,
+    imap_pool: IMAPSessionPool,
+    logger=None,
+    alert_manager=None,
+    spool=None,
+    service_manager=None,
+    mirror=None,
+) -> None:
+    message_id = row["id"]
+    try:
+        if service_manager is not None:
+            # Pool threads each build their own Gmail service.
+            gmail_service = service_manager.get_service(conn)
+        _process_message(
+            conn,
+            row,
+            gmail_service=gmail_service,
+            gmail_user_id=gmail_user_id,
+            label_id=label_id,
+            deliver_to_inbox=deliver_to_inbox,
+            inbox_label_id=inbox_label_id,
+            unread_label_id=unread_label_id,
+            sent_label_id=sent_label_id,
+            delivery_mode=delivery_mode,
+            imap_pool=imap_pool,
+            logger=logger,
+            spool=spool,
+            mirror=mirror,
+        )
+    except Exception as exc:
+        payload = _oauth_alert_payload(exc)
+        if alert_manager and payload:
+            kind, detail = payload
+            alert_manager.send(
+                conn,
+                kind,
+                "Gmail OAuth requires re-authorization",
+                f"{detail}. Re-authorize via admin UI. Error: {exc}",
+                logger=logger,
+            )
+        use_import = delivery_mode == "import" and row["attempt_count"] == 0 and not _is_sent_mailbox(row["mailbox_name"])
+        if use_import:
+            next_attempt = _next_attempt_at(row["attempt_count"])
+            mark_failed_retry(conn, message_id, repr(exc), next_attempt)
+            if logger:
+                log_event(
+                    logger,
+                    "import_failure",
+                    "import failed, retry scheduled with insert fallback",
+                    correlation_id=f"{row['mailbox_name']}|{row['uidvalidity']}|{row['uid']}",
+                    error=repr(exc),
+                    next_attempt_at=next_attempt,
+                )
+        elif _is_retryable_error(exc):
+            if _should_mark_failed_perm(row, exc):
+                mark_failed_perm(conn, message_id, repr(exc))
+                _alert_terminal_fetch_failure(conn, row, alert_manager=alert_manager, logger=logger)
+                if logger:
+                    log_event(
+                        logger,
+                        "insert_failure_perm",
+                        "insert failed permanently",
+                        correlation_id=f"{row['mailbox_name']}|{row['uidvalidity']}|{row['uid']}",
+                        error=repr(exc),
+                    )
+            else:
+                next_attempt = _next_attempt_at(row["attempt_count"])
+                mark_failed_retry(conn, message_id, repr(exc), next_attempt)
+                if logger:
+                    log_event(
+                        logger,
+                        "insert_failure",
+                        "insert failed, retry scheduled",
+                        correlation_id=f"{row['mailbox_name']}|{row['uidvalidity']}|{row['uid']}",
+                        error=repr(exc),
+                        next_attempt_at=next_attempt,
+                    )
+        else:
+            mark_failed_perm(conn, message_id, repr(exc))
+            if logger:
+                log_event(
+                    logger,
+                    "insert_failure_perm",
+                    "insert failed permanently",
+                    correlation_id=f"{row['mailbox_name']}|{row['uidvalidity']}|{row['uid']}",
+                    error=repr(exc),
+                )
+
+
+class DeliveryPool:
+    # Delivers leased rows on a few threads. Each thread keeps its own SQLite
+    # connection and, through the service manager, its own Gmail service.
+    def __init__(self, conn_factory, service_manager, max_workers: int = 4):
+        self.service_manager = service_manager
+        self._conn_factory = conn_factory
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="y2g-deliver")
+        self._local = threading.local()
+        self._conns = []
+        self._conns_lock = threading.Lock()
+
+    def _call(self, func, *args, **kwargs):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._conn_factory()
+            self._local.conn = conn
+            with self._conns_lock:
+                self._conns.append(conn)
+        return func(conn, *args, **kwargs)
+
+    def submit(self, func, *args, **kwargs) -> Future:
+        return self._executor.submit(self._call, func, *args, **kwargs)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True)
+        with self._conns_lock:
+            conns, self._conns = self._conns, []
+        for conn in conns:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+
+def run_delivery_pass(
+    conn,
+    gmail_service,
+    gmail_user_id: str,
+    label_id: str | None,
+    deliver_to_inbox: bool,
+    inbox_label_id: str,
+    unread_label_id: str,
+    sent_label_id: str,
+    delivery_mode: str,
+    imap_pool: IMAPSessionPool,
+    logger=None,
+    alert_manager=None,
+    spool=None,
+    delivery_pool: Optional[DeliveryPool] = None,
+    mirror=None,
+) -> bool:
+    deliver_kwargs = dict(
+        gmail_user_id=gmail_user_id,
+        label_id=label_id,
+        deliver_to_inbox=deliver_to_inbox,
+        inbox_label_id=inbox_label_id,
+        unread_label_id=unread_label_id,
+        sent_label_id=sent_label_id,
+        delivery_mode=delivery_mode,
+        imap_pool=imap_pool,
+        logger=logger,
+        alert_manager=alert_manager,
+        spool=spool,
+        mirror=mirror,
+    )
+    rows = _select_due_messages(conn)
+    bytes_in_pass = 0
+    futures = []
+    for row in _schedule_by_size(rows):
+        if bytes_in_pass >= DELIVERY_PASS_MAX_BYTES:
+            break
+        # Leases are still taken here, one row at a time, before any worker sees the row.
+        if not acquire_insert_lease(conn, row["id"]):
+            continue
+        bytes_in_pass += row["rfc822_size"] or 0
+        if delivery_pool is None:
+            _deliver_row(conn, row, gmail_service, **deliver_kwargs)
+        else:
+            futures.append(
+                delivery_pool.submit(
+                    _deliver_row, row, None, service_manager=delivery_pool.service_manager, **deliver_kwargs
+                )
+            )
+    for future in futures:
+        future.result()
+    return bool(rows)
+
+
+def run_delete_pass(conn, imap_pool: IMAPSessionPool, logger=None, spool=None) -> bool:
+    delete_rows = _select_due_deletions(conn)
+    if not delete_rows:
+        return False
+    imap_client = imap_pool.acquire()
+    session_lost = True
+    try:
+        session_lost = _delete_yahoo_messages(conn, delete_rows, imap_client, logger=logger, spool=spool)
+    finally:
+        imap_pool.release(imap_client, discard=session_lost)
+    return True
+
+
+def run_retry_loop(
+    conn,
+    service_manager,
+    gmail_user_id: str,
+    label_id: str | None,
+    deliver_to_inbox: bool,
+    inbox_label_id: str,
+    unread_label_id: str,
+    sent_label_id: str,
+    delivery_mode: str,
+    imap_client_factory,
+    account_id: int,
+    poll_interval: int = 10,
+    logger=None,
+    alert_manager=None,
+    spool=None,
+    imap_pool_size: int = 2,
+    wakeup=None,
+    conn_factory=None,
+    delivery_concurrency: int = 1,
+    mirror=None,
+):
+    imap_pool = IMAPSessionPool(imap_client_factory, max_size=imap_pool_size, logger=logger)
+    delivery_pool = None
+    if conn_factory is not None and delivery_concurrency > 1:
+        delivery_pool = DeliveryPool(conn_factory, service_manager, max_workers=delivery_concurrency)
+    prepare_retry_worker(conn, logger=logger, alert_manager=alert_manager)
     while True:
         try:
             gmail_service = service_manager.get_service(conn)
@@ -384,115 +1000,28 @@ def run_retry_loop(
                 )
             time.sleep(poll_interval)
             continue
-        rows = _select_due_messages(conn)
-        delete_rows = _select_due_deletions(conn)
-        if not rows and not delete_rows:
-            time.sleep(poll_interval)
-            continue
-
-        for row in rows:
-            message_id = row["id"]
-            if not acquire_insert_lease(conn, message_id):
-                continue
-            imap_client: YahooIMAPClient | None = None
-            try:
-                imap_client = imap_client_factory()
-                _process_message(
-                    conn,
-                    row,
-                    gmail_service=gmail_service,
-                    gmail_user_id=gmail_user_id,
-                    label_id=label_id,
-                    deliver_to_inbox=deliver_to_inbox,
-                    inbox_label_id=inbox_label_id,
-                    unread_label_id=unread_label_id,
-                    sent_label_id=sent_label_id,
-                    delivery_mode=delivery_mode,
-                    imap_client=imap_client,
-                    logger=logger,
-                )
-            except Exception as exc:
-                payload = _oauth_alert_payload(exc)
-                if alert_manager and payload:
-                    kind, detail = payload
-                    alert_manager.send(
-                        conn,
-                        kind,
-                        "Gmail OAuth requires re-authorization",
-                        f"{detail}. Re-authorize via admin UI. Error: {exc}",
-                        logger=logger,
-                    )
-                use_import = delivery_mode == "import" and row["attempt_count"] == 0 and not _is_sent_mailbox(row["mailbox_name"])
-                if use_import:
-                    next_attempt = _next_attempt_at(row["attempt_count"])
-                    mark_failed_retry(conn, message_id, repr(exc), next_attempt)
-                    if logger:
-                        log_event(
-                            logger,
-                            "import_failure",
-                            "import failed, retry scheduled with insert fallback",
-                            correlation_id=f"{row['mailbox_name']}|{row['uidvalidity']}|{row['uid']}",
-                            error=repr(exc),
-                            next_attempt_at=next_attempt,
-                        )
-                elif _is_retryable_error(exc):
-                    if _should_mark_failed_perm(row, exc):
-                        mark_failed_perm(conn, message_id, repr(exc))
-                        _alert_terminal_fetch_failure(conn, row, alert_manager=alert_manager, logger=logger)
-                        if logger:
-                            log_event(
-                                logger,
-                                "insert_failure_perm",
-                                "insert failed permanently",
-                                correlation_id=f"{row['mailbox_name']}|{row['uidvalidity']}|{row['uid']}",
-                                error=repr(exc),
-                            )
-                    else:
-                        next_attempt = _next_attempt_at(row["attempt_count"])
-                        mark_failed_retry(conn, message_id, repr(exc), next_attempt)
-                        if logger:
-                            log_event(
-                                logger,
-                                "insert_failure",
-                                "insert failed, retry scheduled",
-                                correlation_id=f"{row['mailbox_name']}|{row['uidvalidity']}|{row['uid']}",
-                                error=repr(exc),
-                                next_attempt_at=next_attempt,
-                            )
-                else:
-                    mark_failed_perm(conn, message_id, repr(exc))
-                    if logger:
-                        log_event(
-                            logger,
-                            "insert_failure_perm",
-                            "insert failed permanently",
-                            correlation_id=f"{row['mailbox_name']}|{row['uidvalidity']}|{row['uid']}",
-                            error=repr(exc),
-                        )
-            finally:
-                if imap_client:
-                    try:
-                        imap_client.close()
-                    except Exception:
-                        pass
-
-        for row in delete_rows:
-            message_id = row["id"]
-            imap_client: YahooIMAPClient = imap_client_factory()
-            try:
-                if logger:
-                    log_event(
-                        logger,
-                        "yahoo_delete_attempt",
-                        "deleting yahoo message",
-                        correlation_id=f"{row['mailbox_name']}|{row['uidvalidity']}|{row['uid']}",
-                        mailbox=row["mailbox_name"],
-                        uid=row["uid"],
-                        uidvalidity=row["uidvalidity"],
-                    )
-                _delete_yahoo_message(conn, row, imap_client, logger=logger)
-            finally:
-                try:
-                    imap_client.close()
-                except Exception:
-                    pass
+        delivered = run_delivery_pass(
+            conn,
+            gmail_service,
+            gmail_user_id,
+            label_id,
+            deliver_to_inbox,
+            inbox_label_id,
+            unread_label_id,
+            sent_label_id,
+            delivery_mode,
+            imap_pool,
+            logger=logger,
+            alert_manager=alert_manager,
+            spool=spool,
+            delivery_pool=delivery_pool,
+            mirror=mirror,
+        )
+        deleted = run_delete_pass(conn, imap_pool, logger=logger, spool=spool)
+        if not delivered and not deleted:
+            imap_pool.prune()
+            if wakeup is not None:
+                # Watchers wake us as soon as they commit new rows.
+                wakeup.wait(poll_interval)
+            else:
+                time.sleep(poll_interval)
@@ -0,0 +1,41 @@
+import asyncio
+import threading
+
+
+class DeliveryWakeup:
+    # Watchers notify after committing new rows; the delivery loop waits here
+    # and only falls back to its poll interval when nothing arrives.
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._pending = False
+
+    def notify(self) -> None:
+        with self._cond:
+            self._pending = True
+            self._cond.notify_all()
+
+    def wait(self, timeout: float) -> bool:
+        with self._cond:
+            woken = self._cond.wait_for(lambda: self._pending, timeout)
+            self._pending = False
+            return woken
+
+
+class AsyncDeliveryWakeup:
+    # Same contract for the asyncio runner; notify() is called from the
+    # watcher executor threads.
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+        self._event = asyncio.Event()
+
+    def notify(self) -> None:
+        self._loop.call_soon_threadsafe(self._event.set)
+
+    async def wait(self, timeout: float) -> bool:
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self._event.clear()
@@ -0,0 +1,157 @@
+import asyncio
+
+from app.imap.async_client import AsyncYahooIMAPClient, BlockingIMAPClient
+
+RAW = b"Message-ID: <async@example.com>\r\n\r\nBody"
+
+RESPONSES = {
+    b"EXAMINE": b'* 3 EXISTS\r\n* OK [UIDVALIDITY 7] ok\r\n* OK [UIDNEXT 12] ok\r\n{tag} OK [READ-ONLY] done\r\n',
+    b"UID SEARCH": b"* SEARCH 10 11\r\n{tag} OK done\r\n",
+    b"UID FETCH 10:11 (UID RFC822.SIZE)": b"* 1 FETCH (UID 10 RFC822.SIZE 5)\r\n* 2 FETCH (UID 11 RFC822.SIZE 5)\r\n{tag} OK done\r\n",
+    b"UID FETCH 10:11 (UID BODY.PEEK[] FLAGS INTERNALDATE)": (
+        b"* 1 FETCH (UID 10 BODY[] {%d}\r\n" % len(RAW)
+        + RAW
+        + b" FLAGS (\\Seen))\r\n* 2 FETCH (UID 11 BODY[] {%d}\r\n" % len(RAW)
+        + RAW
+        + b")\r\n{tag} OK done\r\n"
+    ),
+    b"IDLE": b"+ idling\r\n* 2 EXPUNGE\r\n* 2 EXISTS\r\n* 4 EXISTS\r\n",
+    b"DONE": b"{idle_tag} OK IDLE terminated\r\n",
+}
+
+
+async def _serve(reader, writer):
+    idle_tag = b""
+    while True:
+        line = await reader.readline()
+        if not line:
+            break
+        line = line.rstrip(b"\r\n")
+        tag, _, command = line.partition(b" ")
+        if line == b"DONE":
+            command = b"DONE"
+        elif command == b"IDLE":
+            idle_tag = tag
+        for prefix, response in RESPONSES.items():
+            if command.startswith(prefix):
+                writer.write(response.replace(b"{tag}", tag).replace(b"{idle_tag}", idle_tag))
+                break
+        else:
+            writer.write(tag + b" OK done\r\n")
+        await writer.drain()
+
+
+async def _connected_client():
+    server = await asyncio.start_server(_serve, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    client = AsyncYahooIMAPClient("127.0.0.1", port, "user@example.com", "secret")
+    client._reader, client._writer = await asyncio.open_connection("127.0.0.1", port)
+    client.capabilities = ("IMAP4REV1", "IDLE")
+    return server, client
+
+
+def test_async_client_selects_searches_and_streams_fetches():
+    async def scenario():
+        server, client = await _connected_client()
+        async with server:
+            selected = await client.select_status("INBOX")
+            uids = await client.search_uids(10)
+            fetched = [item async for item in client.fetch_many(uids)]
+            await client.close()
+            return selected, uids, fetched
+
+    selected, uids, fetched = asyncio.run(scenario())
+
+    assert (selected.uidvalidity, selected.exists, selected.uidnext) == (7, 3, 12)
+    assert list(uids) == [10, 11]
+    assert [(uid, body, flags) for uid, body, flags, _ in fetched] == [(10, RAW, ["\\Seen"]), (11, RAW, [])]
+
+
+def test_async_idle_wakes_on_higher_exists_and_keeps_connection():
+    async def scenario():
+        server, client = await _connected_client()
+        async with server:
+            await client.select("INBOX")
+            result = await client.idle(timeout_seconds=5)
+            # The connection is still usable after DONE.
+            uids = await client.search_uids(1)
+            exists = client._selected.exists
+            await client.close()
+            return result, exists, uids
+
+    result, exists, uids = asyncio.run(scenario())
+
+    assert result.new_mail is True
+    assert [event.kind for event in result.events] == ["EXPUNGE", "EXISTS", "EXISTS"]
+    assert exists == 4
+    assert list(uids) == [10, 11]
+
+
+def test_blocking_client_drives_async_client_from_a_worker_thread():
+    async def scenario():
+        server, client = await _connected_client()
+        async with server:
+            blocking = BlockingIMAPClient(client, asyncio.get_running_loop())
+
+            def work():
+                uidvalidity, _ = blocking.select("INBOX")
+                return uidvalidity, [uid for uid, _, _, _ in blocking.fetch_many(blocking.search_uids(10))]
+
+            result = await asyncio.get_running_loop().run_in_executor(None, work)
+            await client.close()
+            return result
+
+    assert asyncio.run(scenario()) == (7, [10, 11])
+
+
+async def _scripted_client(handler, timeout=30):
+    server = await asyncio.start_server(handler, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    client = AsyncYahooIMAPClient("127.0.0.1", port, "user@example.com", "secret", timeout=timeout)
+    client._reader, client._writer = await asyncio.open_connection("127.0.0.1", port)
+    return server, client
+
+
+def test_async_search_reads_a_line_longer_than_the_stream_limit():
+    # Default StreamReader limit is 64 KiB; this line is about 140 KiB.
+    many = list(range(100000, 120000))
+
+    async def serve(reader, writer):
+        tag, _, _ = (await reader.readline()).partition(b" ")
+        writer.write(b"* SEARCH " + b" ".join(b"%d" % uid for uid in many) + b"\r\n" + tag + b" OK done\r\n")
+        await writer.drain()
+        await reader.read()
+
+    async def scenario():
+        server, client = await _scripted_client(serve)
+        async with server:
+            uids = await client.search_uids(1)
+            client._writer.close()
+            return uids
+
+    assert list(asyncio.run(scenario())) == many
+
+
+def test_async_literal_timeout_applies_per_chunk_not_to_the_whole_body():
+    body = b"Message-ID: <slow@example.com>\r\n\r\n" + b"x" * 4000
+
+    async def serve(reader, writer):
+        tag, _, _ = (await reader.readline()).partition(b" ")
+        writer.write(b"* 1 FETCH (UID 10 BODY[] {%d}\r\n" % len(body))
+        # The whole body takes longer than the client timeout to arrive.
+        for idx in range(0, len(body), 500):
+            writer.write(body[idx : idx + 500])
+            await writer.drain()
+            await asyncio.sleep(0.05)
+        writer.write(b")\r\n" + tag + b" OK done\r\n")
+        await writer.drain()
+        await reader.read()
+
+    async def scenario():
+        server, client = await _scripted_client(serve, timeout=0.2)
+        async with server:
+            fetched = await client.fetch_rfc822(10)
+            client._writer.close()
+            return fetched
+
+    assert asyncio.run(scenario())[0] == body
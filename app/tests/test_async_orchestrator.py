@@ -0,0 +1,117 @@
+import asyncio
+import os
+
+from app.imap.yahoo_client import IdleResult, MailboxStatus
+from app.store.db import connect
+from app.store.migrations import apply_migrations
+from app.sync import async_orchestrator
+from app.sync.async_orchestrator import ConnectionExecutor, _supervise_watcher, watch_mailbox_async
+from app.sync.wakeup import AsyncDeliveryWakeup
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "migrations")
+RAW = b"Message-ID: <async-%d@example.com>\r\n\r\nBody"
+
+
+def _db(tmp_path):
+    path = str(tmp_path / "app.db")
+    apply_migrations(path, MIGRATIONS_DIR)
+    conn = connect(path)
+    with conn:
+        conn.execute("INSERT INTO accounts(id, yahoo_email, gmail_user) VALUES (1, 'user@yahoo.com', 'me')")
+    conn.close()
+    return path
+
+
+class _FakeAsyncClient:
+    def __init__(self, uids):
+        self.uids = list(uids)
+        self.idle_calls = 0
+        self.connected = 0
+        self.closed = 0
+        self._blocked = asyncio.Event()
+
+    async def connect(self):
+        self.connected += 1
+
+    async def close(self):
+        self.closed += 1
+
+    def has_idle(self):
+        return True
+
+    async def select(self, mailbox, readonly=True, force=False):
+        return 7, len(self.uids)
+
+    async def select_status(self, mailbox, readonly=True, force=False):
+        return MailboxStatus(mailbox, readonly, 7, len(self.uids), uidnext=max(self.uids) + 1)
+
+    async def search_uids(self, since_uid):
+        return [uid for uid in self.uids if uid >= since_uid]
+
+    async def fetch_many(self, uids, sizes=None, max_batch_bytes=None):
+        for uid in uids:
+            yield uid, RAW % uid, [], None
+
+    async def idle(self, timeout_seconds=900):
+        self.idle_calls += 1
+        if self.idle_calls == 1:
+            self.uids.append(11)
+            return IdleResult(new_mail=True)
+        await self._blocked.wait()
+
+
+def test_watch_mailbox_async_stores_new_uids_after_idle_and_wakes_delivery(tmp_path):
+    path = _db(tmp_path)
+
+    async def scenario():
+        db = ConnectionExecutor(lambda: connect(path), name="test-watch")
+        wakeup = AsyncDeliveryWakeup(asyncio.get_running_loop())
+        client = _FakeAsyncClient([10])
+        task = asyncio.create_task(watch_mailbox_async(client, db, 1, "INBOX", wakeup=wakeup))
+        try:
+            # Once for the startup catch-up, once for the UID announced by IDLE.
+            woken = [await wakeup.wait(5)]
+            woken.append(await wakeup.wait(5))
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            db.shutdown()
+        return woken, client.idle_calls
+
+    woken, idle_calls = asyncio.run(scenario())
+
+    assert woken == [True, True]
+    assert idle_calls >= 1
+    conn = connect(path)
+    assert [row[0] for row in conn.execute("SELECT uid FROM messages ORDER BY uid")] == [10, 11]
+    assert conn.execute("SELECT last_seen_uid FROM mailboxes WHERE name = 'INBOX'").fetchone()[0] == 11
+
+
+def test_supervise_watcher_reconnects_with_a_fresh_client_after_errors(monkeypatch):
+    monkeypatch.setattr(async_orchestrator, "WATCHER_RESTART_SECONDS", 0)
+    clients = []
+
+    def factory():
+        clients.append(_FakeAsyncClient([1]))
+        return clients[-1]
+
+    async def scenario():
+        running = asyncio.Event()
+
+        async def watch(client):
+            if len(clients) == 1:
+                raise OSError("connection reset")
+            if len(clients) == 2:
+                raise RuntimeError("unexpected")
+            running.set()
+            await asyncio.Event().wait()
+
+        task = asyncio.create_task(_supervise_watcher("INBOX", factory, watch))
+        await asyncio.wait_for(running.wait(), 5)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(scenario())
+
+    assert len(clients) == 3
+    assert [(client.connected, client.closed) for client in clients] == [(1, 1), (1, 1), (1, 1)]
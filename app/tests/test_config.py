@@ -31,3 +31,13 @@ def test_config_summary_includes_replay_window():
     summary = config_summary(config)
 
     assert summary["yahoo_replay_window_uids"] == 500
+
+
+def test_load_config_leaves_imap_standby_off_by_default(monkeypatch):
+    assert load_config().yahoo_imap_standby is False
+
+    monkeypatch.setenv("YAHOO_IMAP_STANDBY", "true")
+    config = load_config()
+
+    assert config.yahoo_imap_standby is True
+    assert config_summary(config)["yahoo_imap_standby"] is True
@@ -1,4 +1,8 @@
-from app.gmail.gmail_client import find_message_by_rfc822msgid
+import httplib2
+from googleapiclient.errors import HttpError
+
+from app.gmail.gmail_client import find_message_by_rfc822msgid, find_messages_by_rfc822msgids
+from app.gmail.quota import GmailQuotaLimiter
 
 
 class _FakeRequest:
@@ -16,7 +20,11 @@ class _FakeMessagesAPI:
 
     def list(self, userId, q, maxResults):
         self.list_calls.append({"userId": userId, "q": q, "maxResults": maxResults})
-        return _FakeRequest({"messages": [{"id": "gmail-msg-1"}]})
+        if "throttled" in q and len(self.list_calls) == 1:
+            return _ThrottledOnceRequest({"status": 403, "retry-after": "2"}, content=b"rateLimitExceeded")
+        if "missing" in q:
+            return _FakeRequest({})
+        return _FakeRequest({"messages": [{"id": "gmail-msg-1", "threadId": "gmail-thread-1"}]})
 
     def get(self, userId, id, format):
         self.get_calls.append({"userId": userId, "id": id, "format": format})
@@ -31,13 +39,35 @@ class _FakeUsersAPI:
         return self._messages
 
 
+class _FakeBatch:
+    def __init__(self, service, callback):
+        self.service = service
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, request_id):
+        self.requests.append((request_id, request))
+
+    def execute(self):
+        self.service.batches.append(len(self.requests))
+        for request_id, request in self.requests:
+            try:
+                self.callback(request_id, request.execute(), None)
+            except HttpError as exc:
+                self.callback(request_id, None, exc)
+
+
 class _FakeGmailService:
     def __init__(self):
         self._users = _FakeUsersAPI()
+        self.batches = []
 
     def users(self):
         return self._users
 
+    def new_batch_http_request(self, callback):
+        return _FakeBatch(self, callback)
+
 
 def test_find_message_by_rfc822msgid_returns_message_and_thread_ids():
     service = _FakeGmailService()
@@ -45,3 +75,149 @@ def test_find_message_by_rfc822msgid_returns_message_and_thread_ids():
     result = find_message_by_rfc822msgid(service, "me", "<abc@example.com>")
 
     assert result == ("gmail-msg-1", "gmail-thread-1")
+    assert service.users().messages().get_calls == []
+
+
+def test_find_messages_by_rfc822msgids_looks_up_all_ids_in_one_batch():
+    service = _FakeGmailService()
+
+    result = find_messages_by_rfc822msgids(
+        service, "me", ["<a@example.com>", None, "<missing@example.com>", "<a@example.com>", "<b@example.com>"]
+    )
+
+    assert service.batches == [3]
+    assert result == {
+        "<a@example.com>": ("gmail-msg-1", "gmail-thread-1"),
+        "<b@example.com>": ("gmail-msg-1", "gmail-thread-1"),
+    }
+    assert service.users().messages().get_calls == []
+
+
+def test_find_messages_by_rfc822msgids_reports_throttled_batch_parts_and_retries_them(monkeypatch):
+    clock = _FakeClock()
+    limiter = GmailQuotaLimiter(max_rate=100, clock=clock, sleep=clock.sleep)
+    monkeypatch.setattr("app.gmail.quota._limiter", limiter)
+    service = _FakeGmailService()
+
+    result = find_messages_by_rfc822msgids(service, "me", ["<throttled@example.com>", "<b@example.com>"])
+
+    assert result == {
+        "<throttled@example.com>": ("gmail-msg-1", "gmail-thread-1"),
+        "<b@example.com>": ("gmail-msg-1", "gmail-thread-1"),
+    }
+    # The 403 rateLimitExceeded part slowed the limiter and was retried after Retry-After.
+    assert limiter.stats()["throttled"] == 1
+    assert 2 in clock.sleeps
+    assert [call["q"] for call in service.users().messages().list_calls].count("rfc822msgid:<throttled@example.com>") == 2
+
+
+class _FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class _ThrottledOnceRequest:
+    def __init__(self, headers, failures=1, content=b'{"error": {"code": 429}}'):
+        self.calls = 0
+        self.headers = headers
+        self.failures = failures
+        self.content = content
+
+    def execute(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise HttpError(httplib2.Response(self.headers), self.content)
+        return {"id": "gmail-1"}
+
+
+def test_quota_limiter_charges_units_and_waits_for_refill():
+    clock = _FakeClock()
+    limiter = GmailQuotaLimiter(max_rate=50, clock=clock, sleep=clock.sleep)
+
+    limiter.acquire(25)
+    limiter.acquire(25)
+    limiter.acquire(25)
+
+    assert clock.sleeps == [0.5]
+
+
+def test_quota_limiter_honours_retry_after_and_backs_off_multiplicatively():
+    clock = _FakeClock()
+    limiter = GmailQuotaLimiter(max_rate=100, clock=clock, sleep=clock.sleep)
+    request = _ThrottledOnceRequest({"status": 429, "retry-after": "3"})
+
+    assert limiter.execute("messages.get", request) == {"id": "gmail-1"}
+
+    assert request.calls == 2
+    assert clock.sleeps[0] == 3
+    # Halved on the 429, then one additive step for the retried success.
+    assert limiter.rate == 51
+    assert limiter.stats()["throttled"] == 1
+
+
+def test_quota_limiter_backs_off_exponentially_without_retry_after():
+    clock = _FakeClock()
+    limiter = GmailQuotaLimiter(max_rate=100, clock=clock, sleep=clock.sleep, jitter=lambda: 1.0)
+    request = _ThrottledOnceRequest({"status": 503}, failures=3)
+
+    assert limiter.execute("messages.get", request) == {"id": "gmail-1"}
+
+    assert request.calls == 4
+    assert clock.sleeps == [1.0, 2.0, 4.0]
+
+    limiter = GmailQuotaLimiter(max_rate=100, clock=clock, sleep=clock.sleep, jitter=lambda: 0.0)
+    request = _ThrottledOnceRequest({"status": 503}, failures=1)
+    clock.sleeps.clear()
+    limiter.execute("messages.get", request)
+    assert clock.sleeps == [0.5]
+
+
+def test_quota_limiter_does_not_retry_inserts_but_pauses_other_callers():
+    clock = _FakeClock()
+    limiter = GmailQuotaLimiter(max_rate=100, clock=clock, sleep=clock.sleep, jitter=lambda: 1.0)
+    request = _ThrottledOnceRequest({"status": 503})
+
+    try:
+        limiter.execute("messages.insert", request)
+    except HttpError as exc:
+        assert exc.resp.status == 503
+    else:
+        raise AssertionError("Expected HttpError")
+    assert request.calls == 1
+
+    limiter.acquire(5)
+    assert clock.sleeps == [1.0]
+
+
+def test_quota_limiter_retries_inserts_rejected_by_rate_limit():
+    clock = _FakeClock()
+    limiter = GmailQuotaLimiter(max_rate=100, clock=clock, sleep=clock.sleep, jitter=lambda: 1.0)
+    request = _ThrottledOnceRequest({"status": 429})
+
+    assert limiter.execute("messages.insert", request) == {"id": "gmail-1"}
+
+    assert request.calls == 2
+    assert clock.sleeps == [1.0]
+
+
+def test_quota_limiter_passes_through_non_throttle_errors():
+    clock = _FakeClock()
+    limiter = GmailQuotaLimiter(max_rate=100, clock=clock, sleep=clock.sleep)
+    request = _ThrottledOnceRequest({"status": 400})
+
+    try:
+        limiter.execute("messages.list", request)
+    except HttpError as exc:
+        assert exc.resp.status == 400
+    else:
+        raise AssertionError("Expected HttpError")
+    assert request.calls == 1
+    assert limiter.rate == 100
@@ -0,0 +1,271 @@
+import sqlite3
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+from app.gmail.mirror import GmailMirror, run_mirror_step
+from app.store.message_index import lookup_gmail_messages
+
+
+def _setup_db():
+    conn = sqlite3.connect(":memory:")
+    conn.execute(
+        """
+        CREATE TABLE gmail_message_index (
+          account_id INTEGER NOT NULL,
+          rfc822_message_id TEXT NOT NULL,
+          gmail_message_id TEXT NOT NULL,
+          gmail_thread_id TEXT NOT NULL,
+          created_at TEXT,
+          PRIMARY KEY (account_id, gmail_message_id)
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE gmail_mirror_state (
+          account_id INTEGER PRIMARY KEY,
+          history_id TEXT NOT NULL,
+          seed_page_token TEXT,
+          seeded INTEGER NOT NULL DEFAULT 0,
+          synced_at TEXT,
+          updated_at TEXT
+        )
+        """
+    )
+    return conn
+
+
+class _FakeRequest:
+    def __init__(self, payload=None, error=None):
+        self._payload = payload
+        self._error = error
+
+    def execute(self):
+        if self._error is not None:
+            raise self._error
+        return self._payload
+
+
+class _FakeGmail:
+    def __init__(self):
+        self.messages_by_id = {}
+        self.pages = {}
+        self.history_records = []
+        self.history_id = "100"
+        self.history_expired = False
+        self.calls = []
+
+    def add(self, gmail_id, msgid, thread_id):
+        self.messages_by_id[gmail_id] = (msgid, thread_id)
+
+    # users() / messages() / history() all resolve to this object.
+    def users(self):
+        return self
+
+    def messages(self):
+        return self
+
+    def history(self):
+        return self
+
+    def getProfile(self, userId):
+        self.calls.append("getProfile")
+        return _FakeRequest({"historyId": self.history_id})
+
+    def list(self, userId, maxResults, includeSpamTrash=None, pageToken=None, startHistoryId=None, historyTypes=None):
+        if startHistoryId is not None:
+            self.calls.append(("history.list", startHistoryId))
+            if self.history_expired:
+                return _FakeRequest(error=HttpError(httplib2.Response({"status": 404}), b"{}"))
+            return _FakeRequest({"history": self.history_records, "historyId": self.history_id})
+        self.calls.append(("messages.list", pageToken))
+        return _FakeRequest(self.pages[pageToken])
+
+    def get(self, userId, id, format, metadataHeaders):
+        self.calls.append(("messages.get", id))
+        if id not in self.messages_by_id:
+            return _FakeRequest(error=HttpError(httplib2.Response({"status": 404}), b"{}"))
+        msgid, thread_id = self.messages_by_id[id]
+        headers = [{"name": "Message-Id", "value": msgid}]
+        return _FakeRequest({"id": id, "threadId": thread_id, "payload": {"headers": headers}})
+
+    def new_batch_http_request(self, callback):
+        return _FakeBatch(callback)
+
+
+class _FakeBatch:
+    def __init__(self, callback):
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, request_id):
+        self.requests.append((request_id, request))
+
+    def execute(self):
+        for request_id, request in self.requests:
+            try:
+                self.callback(request_id, request.execute(), None)
+            except HttpError as exc:
+                self.callback(request_id, None, exc)
+
+
+def test_mirror_seeds_page_by_page_then_applies_history():
+    conn = _setup_db()
+    gmail = _FakeGmail()
+    gmail.add("g1", "<one@example.com>", "t1")
+    gmail.add("g2", " <two@example.com> ", "t2")
+    gmail.add("g3", "<three@example.com>", "t1")
+    gmail.pages = {
+        None: {"messages": [{"id": "g1"}, {"id": "g2"}], "nextPageToken": "p2"},
+        "p2": {"messages": [{"id": "g3"}, {"id": "gone"}]},
+    }
+    mirror = GmailMirror(1)
+
+    assert mirror.sync_once(conn, gmail) is True
+    assert mirror.sync_once(conn, gmail) is True
+    # Seeded, but nothing is trusted until the first history pass has run.
+    assert not mirror.covers(conn)
+    assert mirror.sync_once(conn, gmail) is False
+    assert mirror.covers(conn)
+    assert lookup_gmail_messages(conn, 1, ["<one@example.com>", "<two@example.com>", "<three@example.com>"]) == {
+        "<one@example.com>": ("g1", "t1"),
+        "<two@example.com>": ("g2", "t2"),
+        "<three@example.com>": ("g3", "t1"),
+    }
+    assert gmail.calls[0] == "getProfile"
+
+    gmail.add("g4", "<four@example.com>", "t4")
+    gmail.add("g5", "<five@example.com>", "t5")
+    gmail.history_records = [
+        {"messagesAdded": [{"message": {"id": "g4", "threadId": "t4"}}]},
+        {"messagesAdded": [{"message": {"id": "g5", "threadId": "t5"}}]},
+        {"messagesDeleted": [{"message": {"id": "g1"}}, {"message": {"id": "g5"}}]},
+    ]
+    gmail.history_id = "150"
+    gmail.calls.clear()
+
+    assert mirror.sync_once(conn, gmail) is False
+
+    assert gmail.calls == [("history.list", "100"), ("messages.get", "g4")]
+    assert lookup_gmail_messages(conn, 1, ["<one@example.com>", "<four@example.com>", "<five@example.com>"]) == {
+        "<four@example.com>": ("g4", "t4"),
+    }
+    assert conn.execute("SELECT history_id FROM gmail_mirror_state").fetchone()[0] == "150"
+
+
+def test_mirror_reseeds_when_history_has_expired():
+    conn = _setup_db()
+    gmail = _FakeGmail()
+    gmail.add("g1", "<one@example.com>", "t1")
+    gmail.pages = {None: {"messages": [{"id": "g1"}]}}
+    mirror = GmailMirror(1)
+    mirror.sync_once(conn, gmail)
+    mirror.sync_once(conn, gmail)
+    gmail.history_expired = True
+    gmail.history_id = "900"
+
+    # Deleted in Gmail while history was out of reach, so no delete was seen.
+    del gmail.messages_by_id["g1"]
+    gmail.add("g2", "<two@example.com>", "t2")
+    gmail.pages = {None: {"messages": [{"id": "g2"}]}}
+
+    assert mirror.sync_once(conn, gmail) is True
+
+    assert not mirror.covers(conn)
+    assert conn.execute("SELECT history_id, seeded FROM gmail_mirror_state").fetchone() == ("900", 0)
+    assert lookup_gmail_messages(conn, 1, ["<one@example.com>"]) == {}
+    gmail.history_expired = False
+    assert mirror.sync_once(conn, gmail) is True
+    assert mirror.sync_once(conn, gmail) is False
+    assert mirror.covers(conn)
+    assert lookup_gmail_messages(conn, 1, ["<one@example.com>", "<two@example.com>"]) == {
+        "<two@example.com>": ("g2", "t2")
+    }
+
+
+def test_mirror_keeps_message_id_while_another_gmail_copy_survives():
+    conn = _setup_db()
+    gmail = _FakeGmail()
+    gmail.add("inbox-copy", "<self@example.com>", "t1")
+    gmail.add("sent-copy", "<self@example.com>", "t1")
+    gmail.pages = {None: {"messages": [{"id": "inbox-copy"}, {"id": "sent-copy"}]}}
+    mirror = GmailMirror(1)
+    mirror.sync_once(conn, gmail)
+    mirror.sync_once(conn, gmail)
+    gmail.history_records = [{"messagesDeleted": [{"message": {"id": "sent-copy"}}]}]
+
+    mirror.sync_once(conn, gmail)
+
+    assert lookup_gmail_messages(conn, 1, ["<self@example.com>"]) == {"<self@example.com>": ("inbox-copy", "t1")}
+
+
+def test_mirror_catches_up_when_last_sync_is_older_than_the_row():
+    conn = _setup_db()
+    gmail = _FakeGmail()
+    gmail.pages = {None: {"messages": []}}
+    mirror = GmailMirror(1)
+    mirror.sync_once(conn, gmail)
+    mirror.sync_once(conn, gmail)
+    now = datetime.now(timezone.utc)
+    synced_at = (now - timedelta(seconds=30)).strftime("%Y-%m-%dT%H:%M:%SZ")
+    row_created_at = (now - timedelta(seconds=5)).strftime("%Y-%m-%dT%H:%M:%SZ")
+    conn.execute("UPDATE gmail_mirror_state SET synced_at = ?", (synced_at,))
+    # Sent from the Gmail UI after the last pass; Yahoo Sent already has it.
+    gmail.add("g9", "<sent-from-gmail@example.com>", "t9")
+    gmail.history_records = [{"messagesAdded": [{"message": {"id": "g9", "threadId": "t9"}}]}]
+    gmail.history_id = "200"
+
+    assert mirror.covers(conn)
+    assert not mirror.covers(conn, row_created_at)
+    assert mirror.catch_up(conn, gmail, row_created_at) is True
+
+    assert lookup_gmail_messages(conn, 1, ["<sent-from-gmail@example.com>"]) == {
+        "<sent-from-gmail@example.com>": ("g9", "t9")
+    }
+    gmail.calls.clear()
+    assert mirror.catch_up(conn, gmail, row_created_at) is True
+    assert gmail.calls == []
+
+
+def test_mirror_catch_up_failure_falls_back_to_gmail_search():
+    conn = _setup_db()
+    gmail = _FakeGmail()
+    gmail.pages = {None: {"messages": []}}
+    mirror = GmailMirror(1)
+
+    assert mirror.catch_up(conn, gmail, "2026-01-01T00:00:00Z") is False
+
+    mirror.sync_once(conn, gmail)
+    mirror.sync_once(conn, gmail)
+    conn.execute("UPDATE gmail_mirror_state SET synced_at = '2026-01-01T00:00:00Z'")
+    gmail.history_expired = True
+
+    assert mirror.catch_up(conn, gmail, "2026-01-01T00:00:05Z") is False
+
+
+def test_mirror_step_defers_seeding_while_messages_are_due():
+    conn = _setup_db()
+    conn.execute("CREATE TABLE messages (id INTEGER PRIMARY KEY, state TEXT NOT NULL, next_attempt_at TEXT)")
+    conn.execute("INSERT INTO messages(id, state) VALUES (1, 'FETCHED')")
+    gmail = _FakeGmail()
+    gmail.add("g1", "<one@example.com>", "t1")
+    gmail.pages = {None: {"messages": [{"id": "g1"}]}}
+    service_manager = SimpleNamespace(get_service=lambda conn: gmail)
+    mirror = GmailMirror(1)
+
+    assert run_mirror_step(conn, service_manager, mirror) is False
+    assert gmail.calls == []
+
+    conn.execute("UPDATE messages SET state = 'INSERTED'")
+    assert run_mirror_step(conn, service_manager, mirror) is True
+    assert run_mirror_step(conn, service_manager, mirror) is False
+    assert mirror.covers(conn)
+
+    # Once seeded, history passes keep running during a delivery backlog.
+    conn.execute("UPDATE messages SET state = 'FAILED_RETRY'")
+    gmail.calls.clear()
+    assert run_mirror_step(conn, service_manager, mirror) is False
+    assert gmail.calls == [("history.list", "100")]
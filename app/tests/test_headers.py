@@ -0,0 +1,42 @@
+from app.imap.headers import HeaderSummary, scan_headers
+
+
+def test_scan_headers_unfolds_decodes_and_stops_at_blank_line():
+    raw = (
+        b"Subject: =?utf-8?q?caf=C3=A9?=\r\n"
+        b"Message-ID:\r\n <folded@example.com>\r\n"
+        b"In-Reply-To: (comment) <parent@example.com>\r\n"
+        b"References: <a@example.com>\r\n\t<b@example.com> <c@example.com>\r\n"
+        b"Date: =?utf-8?q?Mon=2C?= 20 Apr 2026 10:00:00 +0000\r\n"
+        b"message-id: <second@example.com>\r\n"
+        b"\r\n"
+        b"Message-ID: <body@example.com>\r\n"
+        b"References: <body-ref@example.com>\r\n"
+    )
+
+    summary = scan_headers(raw, len(raw))
+
+    assert summary == HeaderSummary(
+        message_id="<folded@example.com>",
+        in_reply_to="<parent@example.com>",
+        references=("<a@example.com>", "<b@example.com>", "<c@example.com>"),
+        date="Mon, 20 Apr 2026 10:00:00 +0000",
+        size=len(raw),
+    )
+
+
+def test_scan_headers_handles_bare_lf_and_missing_headers():
+    summary = scan_headers(b"Message-ID: bare-id\n\nReferences: <body@example.com>\n")
+
+    assert summary.message_id == "bare-id"
+    assert summary.in_reply_to is None
+    assert summary.references == ()
+    assert scan_headers(b"\r\nMessage-ID: <body@example.com>\r\n") == HeaderSummary()
+
+
+def test_header_summary_round_trips_through_json():
+    summary = HeaderSummary("<m@example.com>", "<p@example.com>", ("<r@example.com>",), "today", 42)
+
+    assert HeaderSummary.from_json(summary.to_json()) == summary
+    assert HeaderSummary.from_json(None) is None
+    assert HeaderSummary.from_json("not json") is None
@@ -0,0 +1,155 @@
+import imaplib
+
+import pytest
+
+from app.imap import pool as pool_module
+from app.imap.pool import IMAPSessionPool
+from app.imap.standby import StandbyConnection
+from app.imap.yahoo_client import YahooIMAPClient
+
+
+class _FakeClient:
+    def __init__(self, name, noop_error=None):
+        self.name = name
+        self.noop_error = noop_error
+        self.noop_calls = 0
+        self.closed = False
+
+    def noop(self):
+        self.noop_calls += 1
+        if self.noop_error:
+            raise self.noop_error
+
+    def close(self):
+        self.closed = True
+
+
+class _Factory:
+    def __init__(self, **kwargs):
+        self.created = []
+        self.kwargs = kwargs
+
+    def __call__(self):
+        client = _FakeClient(f"c{len(self.created)}", **self.kwargs)
+        self.created.append(client)
+        return client
+
+
+def test_session_reuses_connection_across_uses():
+    factory = _Factory()
+    imap_pool = IMAPSessionPool(factory, max_size=2)
+
+    with imap_pool.session() as first:
+        pass
+    with imap_pool.session() as second:
+        pass
+
+    assert first is second
+    assert len(factory.created) == 1
+    assert imap_pool.open_count == 1
+
+
+def test_session_discards_connection_after_socket_error():
+    factory = _Factory()
+    imap_pool = IMAPSessionPool(factory, max_size=1)
+
+    with pytest.raises(imaplib.IMAP4.abort):
+        with imap_pool.session() as client:
+            raise imaplib.IMAP4.abort("socket error: EOF")
+
+    assert client.closed is True
+    assert imap_pool.open_count == 0
+    with imap_pool.session() as replacement:
+        assert replacement is not client
+
+
+def test_acquire_reconnects_when_health_check_fails(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(pool_module.time, "monotonic", lambda: now[0])
+    factory = _Factory(noop_error=imaplib.IMAP4.abort("stale"))
+    imap_pool = IMAPSessionPool(factory, max_size=1, health_check_after=30, max_idle_seconds=600)
+
+    stale = imap_pool.acquire()
+    imap_pool.release(stale)
+    now[0] += 60
+    fresh = imap_pool.acquire()
+
+    assert stale.noop_calls == 1
+    assert stale.closed is True
+    assert fresh is not stale
+    assert imap_pool.open_count == 1
+
+
+def test_acquire_caps_open_connections():
+    imap_pool = IMAPSessionPool(_Factory(), max_size=1)
+    imap_pool.acquire()
+
+    with pytest.raises(Exception, match="timed out"):
+        imap_pool.acquire(timeout=0.01)
+
+
+def test_prune_closes_sessions_idle_past_limit(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(pool_module.time, "monotonic", lambda: now[0])
+    imap_pool = IMAPSessionPool(_Factory(), max_size=2, max_idle_seconds=600)
+    client = imap_pool.acquire()
+    imap_pool.release(client)
+    now[0] += 601
+
+    assert imap_pool.prune() == 1
+    assert client.closed is True
+    assert imap_pool.open_count == 0
+
+
+def test_standby_hands_over_warm_session_and_refills():
+    factory = _Factory()
+    standby = StandbyConnection(factory, health_check_after=60)
+    standby.start()
+    assert standby.wait_ready(timeout=1)
+
+    client, from_standby = standby.take()
+
+    assert from_standby is True
+    assert client is factory.created[0]
+    assert client.noop_calls == 0
+    assert standby.wait_ready(timeout=1)
+    assert len(factory.created) == 2
+    standby.close()
+    assert factory.created[1].closed is True
+
+
+def test_standby_connects_inline_when_spare_is_stale():
+    factory = _Factory(noop_error=imaplib.IMAP4.abort("stale"))
+    standby = StandbyConnection(factory, health_check_after=0)
+    standby.start()
+    assert standby.wait_ready(timeout=1)
+    spare = factory.created[0]
+
+    client, from_standby = standby.take()
+
+    assert from_standby is False
+    assert spare.closed is True
+    assert client is not spare
+    standby.close()
+
+
+def test_adopt_takes_over_session_and_drops_old_socket():
+    class _Session:
+        def __init__(self):
+            self.shutdown_calls = 0
+
+        def shutdown(self):
+            self.shutdown_calls += 1
+
+    broken, warm = _Session(), _Session()
+    client = YahooIMAPClient("imap.example.com", 993, "user@example.com", "secret")
+    spare = YahooIMAPClient("imap.example.com", 993, "user@example.com", "secret")
+    client._imap, spare._imap = broken, warm
+    spare.condstore_enabled = True
+
+    client.adopt(spare)
+
+    assert client._imap is warm
+    assert spare._imap is None
+    assert client.condstore_enabled is True
+    assert broken.shutdown_calls == 1
@@ -1,14 +1,21 @@
 import sqlite3
-from email.header import Header
+from types import SimpleNamespace
 
 from app.admin.server import _fetch_status
+import pytest
+
 from app.imap.mailbox_watcher import (
+    KnownUIDIndex,
+    MailboxHeartbeats,
     YahooIMAPError,
-    _get_message_id,
     discover_mailboxes,
     initialize_mailbox_state,
     process_new_messages,
+    watch_mailbox,
+    watch_mailboxes_shared,
 )
+from app.imap.headers import HeaderSummary
+from app.imap.yahoo_client import IdleResult, MailboxStatus
 
 
 def _setup_db():
@@ -26,6 +33,9 @@ def _setup_db():
           last_success_at TEXT,
           last_error TEXT,
           last_error_at TEXT,
+          uidnext INTEGER,
+          highest_modseq INTEGER,
+          exists_count INTEGER,
           created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
           updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
           UNIQUE(account_id, name)
@@ -42,6 +52,8 @@ def _setup_db():
           uid INTEGER NOT NULL,
           message_id TEXT,
           rfc822_sha256 TEXT NOT NULL,
+          rfc822_size INTEGER,
+          headers_json TEXT,
           imap_internaldate TEXT,
           imap_flags_json TEXT,
           state TEXT NOT NULL,
@@ -85,16 +97,28 @@ def _setup_db():
 
 
 class _FakeClient:
-    def __init__(self, *, uidvalidity=6, initial_uids=None, fetch_map=None):
+    def __init__(self, *, uidvalidity=6, initial_uids=None, fetch_map=None, uidnext=None, highest_modseq=None):
         self.uidvalidity = uidvalidity
         self.initial_uids = initial_uids or []
         self.fetch_map = fetch_map or {}
-        self.noop_calls = 0
+        self.uidnext = uidnext
+        self.highest_modseq = highest_modseq
         self.search_calls = []
+        self.fetch_many_calls = []
 
     def select(self, mailbox: str, readonly: bool = True):
         return self.uidvalidity, len(self.initial_uids)
 
+    def select_status(self, mailbox: str, readonly: bool = True, force: bool = False):
+        return MailboxStatus(
+            mailbox,
+            readonly,
+            self.uidvalidity,
+            len(self.initial_uids),
+            uidnext=self.uidnext,
+            highest_modseq=self.highest_modseq,
+        )
+
     def search_uids(self, since_uid: int):
         self.search_calls.append(since_uid)
         return [uid for uid in self.initial_uids if uid >= since_uid]
@@ -105,8 +129,22 @@ class _FakeClient:
             raise value
         return value
 
-    def noop(self):
-        self.noop_calls += 1
+    def fetch_many(self, uids, sizes=None, max_batch_bytes=None):
+        self.fetch_many_calls.append(list(uids))
+        for uid in uids:
+            value = self.fetch_map[uid]
+            if isinstance(value, Exception):
+                continue
+            rfc822, flags, internaldate = value
+            yield uid, rfc822, flags, internaldate
+
+    def fetch_headers_many(self, uids):
+        for uid in uids:
+            value = self.fetch_map[uid]
+            if isinstance(value, Exception):
+                continue
+            headers, flags, internaldate = value
+            yield uid, headers, flags, internaldate, 4096
 
 
 def test_discover_mailboxes_includes_sent_folder():
@@ -115,26 +153,6 @@ def test_discover_mailboxes_includes_sent_folder():
     assert mailboxes == ["INBOX", "Bulk", "Sent"]
 
 
-def test_get_message_id_handles_header_objects(monkeypatch):
-    class _FakeMessage:
-        def get(self, name: str):
-            assert name == "Message-ID"
-            return Header("<header-object@example.com>")
-
-    class _FakeParser:
-        def __init__(self, policy):
-            self.policy = policy
-
-        def parsebytes(self, payload: bytes):
-            return _FakeMessage()
-
-    monkeypatch.setattr("app.imap.mailbox_watcher.BytesParser", _FakeParser)
-
-    message_id = _get_message_id(b"Message-ID: ignored\r\n\r\nBody")
-
-    assert message_id == "<header-object@example.com>"
-
-
 def test_initialize_mailbox_state_sets_health_fields():
     conn = _setup_db()
     client = _FakeClient(initial_uids=[10, 11, 12])
@@ -198,6 +216,32 @@ def test_process_new_messages_updates_health_fields_and_stores_messages():
     assert message["message_id"] == "<bulk@example.com>"
 
 
+def test_process_new_messages_header_discovery_defers_content_hash():
+    conn = _setup_db()
+    conn.execute(
+        """
+        INSERT INTO mailboxes(account_id, name, uidvalidity, last_seen_uid, created_at, updated_at)
+        VALUES (1, 'Bulk', 6, 0, '2026-04-20T00:00:00Z', '2026-04-20T00:00:00Z')
+        """
+    )
+    headers = b"Message-ID: <headers@example.com>\r\nReferences: <root@example.com>\r\n\r\n"
+    client = _FakeClient(initial_uids=[77], fetch_map={77: (headers, [], None)})
+
+    last_seen = process_new_messages(client, conn, 1, "Bulk", 6, 0, discovery_mode="headers")
+
+    message = conn.execute(
+        "SELECT state, message_id, rfc822_sha256, rfc822_size, headers_json FROM messages WHERE mailbox_name = 'Bulk'"
+    ).fetchone()
+    summary = HeaderSummary.from_json(message["headers_json"])
+    assert last_seen == 77
+    assert (summary.references, summary.size) == (("<root@example.com>",), 4096)
+    assert message["rfc822_size"] == 4096
+    assert client.fetch_many_calls == []
+    assert message["state"] == "FETCHED"
+    assert message["message_id"] == "<headers@example.com>"
+    assert message["rfc822_sha256"] == ""
+
+
 def test_process_new_messages_continues_after_uid_fetch_failure():
     conn = _setup_db()
     conn.execute(
@@ -289,6 +333,7 @@ def test_process_new_messages_fetches_missing_uid_behind_cursor_when_not_in_db()
 
     assert last_seen == 600
     assert client.search_calls[-1] == 100
+    assert client.fetch_many_calls == [[450]]
     assert [row["uid"] for row in rows] == [450, 600]
     assert rows[0]["message_id"] == "<old@example.com>"
 
@@ -326,6 +371,41 @@ def test_process_new_messages_skips_uid_behind_cursor_when_already_in_db():
     assert len(rows) == 1
 
 
+def test_known_uid_index_loads_once_and_tracks_stored_uids():
+    conn = _setup_db()
+    conn.execute(
+        """
+        INSERT INTO mailboxes(account_id, name, uidvalidity, last_seen_uid, created_at, updated_at)
+        VALUES (1, 'Bulk', 6, 10, '2026-04-20T00:00:00Z', '2026-04-20T00:00:00Z')
+        """
+    )
+    conn.execute(
+        """
+        INSERT INTO messages(
+          account_id, mailbox_name, uidvalidity, uid, message_id, rfc822_sha256, imap_internaldate,
+          imap_flags_json, state, created_at, updated_at
+        ) VALUES (1, 'Bulk', 6, 10, '<old@example.com>', 'x', NULL, '[]', 'FETCHED', 't', 't')
+        """
+    )
+    raw = b"Message-ID: <new@example.com>\r\n\r\nBody"
+    client = _FakeClient(initial_uids=[10, 11], fetch_map={11: (raw, [], None)})
+    uid_queries = []
+    conn.set_trace_callback(lambda sql: uid_queries.append(sql) if "SELECT uid FROM messages" in sql else None)
+    known_uids = KnownUIDIndex()
+
+    last_seen = process_new_messages(client, conn, 1, "Bulk", 6, 10, replay_window_uids=500, known_uids=known_uids)
+    client.initial_uids.append(12)
+    client.fetch_map[12] = (raw.replace(b"new", b"newer"), [], None)
+    last_seen = process_new_messages(
+        client, conn, 1, "Bulk", 6, last_seen, replay_window_uids=500, known_uids=known_uids
+    )
+
+    assert last_seen == 12
+    assert client.fetch_many_calls == [[11], [12]]
+    assert len(uid_queries) == 1
+    assert known_uids.get(conn, 1, "Bulk", 6).ranges == ((10, 12),)
+
+
 def test_replay_window_recovers_message_missed_before_cursor_advanced():
     conn = _setup_db()
     conn.execute(
@@ -365,6 +445,285 @@ def test_replay_window_recovers_message_missed_before_cursor_advanced():
     assert [row["uid"] for row in rows] == [450, 600]
 
 
+def test_process_new_messages_skips_search_while_uidnext_unchanged():
+    conn = _setup_db()
+    conn.execute(
+        """
+        INSERT INTO mailboxes(account_id, name, uidvalidity, last_seen_uid, created_at, updated_at)
+        VALUES (1, 'Bulk', 6, 0, '2026-04-20T00:00:00Z', '2026-04-20T00:00:00Z')
+        """
+    )
+    raw = b"Message-ID: <marker@example.com>\r\n\r\nBody"
+    client = _FakeClient(initial_uids=[30], fetch_map={30: (raw, [], None), 31: (raw, [], None)}, uidnext=31)
+
+    last_seen = process_new_messages(client, conn, 1, "Bulk", 6, 0)
+    last_seen = process_new_messages(client, conn, 1, "Bulk", 6, last_seen)
+    assert client.search_calls == [1]
+
+    client.initial_uids.append(31)
+    client.uidnext = 32
+    last_seen = process_new_messages(client, conn, 1, "Bulk", 6, last_seen)
+
+    marker = conn.execute("SELECT uidnext, exists_count FROM mailboxes WHERE name = 'Bulk'").fetchone()
+    assert client.search_calls == [1, 30]
+    assert last_seen == 31
+    assert (marker["uidnext"], marker["exists_count"]) == (32, 2)
+
+
+def test_process_new_messages_commits_once_per_poll_and_coalesces_heartbeats():
+    conn = _setup_db()
+    conn.execute(
+        """
+        INSERT INTO mailboxes(account_id, name, uidvalidity, last_seen_uid, created_at, updated_at)
+        VALUES (1, 'Bulk', 6, 0, '2026-04-20T00:00:00Z', '2026-04-20T00:00:00Z')
+        """
+    )
+    conn.commit()
+    raw = b"Message-ID: <batch-%d@example.com>\r\n\r\nBody"
+    client = _FakeClient(
+        initial_uids=[40, 41, 42],
+        fetch_map={uid: (raw % uid, [], None) for uid in (40, 41, 42)},
+        uidnext=43,
+    )
+    commits = []
+    conn.set_trace_callback(lambda sql: commits.append(sql) if sql.strip().upper() == "COMMIT" else None)
+    heartbeats = MailboxHeartbeats(flush_interval=3600)
+    wakeup = SimpleNamespace(count=0)
+    wakeup.notify = lambda: setattr(wakeup, "count", wakeup.count + 1)
+
+    last_seen = process_new_messages(client, conn, 1, "Bulk", 6, 0, heartbeats=heartbeats, wakeup=wakeup)
+    assert len(commits) == 1
+    assert wakeup.count == 1
+    first_poll = conn.execute("SELECT last_poll_at FROM mailboxes WHERE name = 'Bulk'").fetchone()[0]
+
+    for _ in range(3):
+        last_seen = process_new_messages(
+            client, conn, 1, "Bulk", 6, last_seen, heartbeats=heartbeats, wakeup=wakeup
+        )
+
+    stored = conn.execute("SELECT COUNT(*) FROM messages WHERE mailbox_name = 'Bulk'").fetchone()[0]
+    assert stored == 3
+    assert (len(commits), wakeup.count) == (1, 1)
+    assert conn.execute("SELECT last_poll_at FROM mailboxes WHERE name = 'Bulk'").fetchone()[0] == first_poll
+
+    heartbeats.flush_interval = 0
+    process_new_messages(client, conn, 1, "Bulk", 6, last_seen, heartbeats=heartbeats)
+    assert len(commits) == 2
+
+
+def test_process_new_messages_commits_and_wakes_delivery_per_chunk():
+    conn = _setup_db()
+    conn.execute(
+        """
+        INSERT INTO mailboxes(account_id, name, uidvalidity, last_seen_uid, created_at, updated_at)
+        VALUES (1, 'Bulk', 6, 0, '2026-04-20T00:00:00Z', '2026-04-20T00:00:00Z')
+        """
+    )
+    conn.commit()
+    raw = b"Message-ID: <chunk-%d@example.com>\r\n\r\nBody"
+    client = _FakeClient(
+        initial_uids=[40, 41, 42],
+        fetch_map={uid: (raw % uid, [], None) for uid in (40, 41, 42)},
+        uidnext=43,
+    )
+    seen = []
+
+    def _notify():
+        seen.append(
+            (
+                conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0],
+                tuple(conn.execute("SELECT last_seen_uid, uidnext FROM mailboxes WHERE name = 'Bulk'").fetchone()),
+            )
+        )
+
+    wakeup = SimpleNamespace(notify=_notify)
+
+    last_seen = process_new_messages(client, conn, 1, "Bulk", 6, 0, wakeup=wakeup, commit_rows=2)
+
+    assert last_seen == 42
+    # The first chunk is visible to delivery before the rest is fetched; the
+    # cursor and change marker only move with the last one.
+    assert seen == [(2, (0, None)), (3, (42, 43))]
+
+
+class _ProcessKilled(BaseException):
+    pass
+
+
+def test_process_new_messages_crash_mid_catch_up_keeps_unfetched_low_uids():
+    conn = _setup_db()
+    conn.execute(
+        """
+        INSERT INTO mailboxes(account_id, name, uidvalidity, last_seen_uid, created_at, updated_at)
+        VALUES (1, 'Bulk', 6, 1000, '2026-04-20T00:00:00Z', '2026-04-20T00:00:00Z')
+        """
+    )
+    conn.commit()
+    uids = list(range(1001, 1007))
+    # UID 1001 is the largest message, so a size-ordered fetch reaches it last.
+    sizes = {uid: 2000 - uid for uid in uids}
+    body = b"Message-ID: <m%d@example.com>\r\n\r\n"
+    client = _FakeClient(
+        initial_uids=uids,
+        fetch_map={uid: (body % uid + b"x" * sizes[uid], [], None) for uid in uids},
+        uidnext=1007,
+    )
+
+    def fetch_by_size(wanted, sizes=None, max_batch_bytes=None):
+        for uid in sorted(wanted, key=lambda uid: (len(client.fetch_map[uid][0]), uid)):
+            if uid == 1001:
+                raise _ProcessKilled()
+            rfc822, flags, internaldate = client.fetch_map[uid]
+            yield uid, rfc822, flags, internaldate
+
+    client.fetch_many = fetch_by_size
+    with pytest.raises(_ProcessKilled):
+        process_new_messages(client, conn, 1, "Bulk", 6, 1000, commit_rows=2)
+
+    stored = [row[0] for row in conn.execute("SELECT uid FROM messages ORDER BY uid")]
+    assert stored == [1003, 1004, 1005, 1006]
+    last_seen = conn.execute("SELECT last_seen_uid FROM mailboxes WHERE name = 'Bulk'").fetchone()[0]
+    assert last_seen == 1000
+
+    del client.fetch_many
+    assert process_new_messages(client, conn, 1, "Bulk", 6, last_seen) == 1006
+    stored = [row[0] for row in conn.execute("SELECT uid FROM messages ORDER BY uid")]
+    assert stored == uids
+
+
+def test_process_new_messages_keeps_old_marker_after_fetch_failure():
+    conn = _setup_db()
+    conn.execute(
+        """
+        INSERT INTO mailboxes(account_id, name, uidvalidity, last_seen_uid, uidnext, created_at, updated_at)
+        VALUES (1, 'Bulk', 6, 0, 40, '2026-04-20T00:00:00Z', '2026-04-20T00:00:00Z')
+        """
+    )
+    client = _FakeClient(
+        initial_uids=[40],
+        fetch_map={40: YahooIMAPError("RFC822 body missing")},
+        uidnext=41,
+    )
+
+    process_new_messages(client, conn, 1, "Bulk", 6, 0)
+    process_new_messages(client, conn, 1, "Bulk", 6, 40)
+
+    marker = conn.execute("SELECT uidnext FROM mailboxes WHERE name = 'Bulk'").fetchone()
+    assert marker["uidnext"] == 40
+    assert client.search_calls == [1, 40]
+
+
+class _StopWatching(Exception):
+    pass
+
+
+class _FakeIdleClient(_FakeClient):
+    def __init__(self, idle_results, **kwargs):
+        super().__init__(**kwargs)
+        self.idle_results = list(idle_results)
+        self.connects = 0
+
+    def has_idle(self):
+        return True
+
+    def idle(self, timeout_seconds):
+        if not self.idle_results:
+            raise _StopWatching()
+        result = self.idle_results.pop(0)
+        self.initial_uids.extend(result.pop("arrived", []))
+        return IdleResult(new_mail=result["new_mail"])
+
+    def connect(self):
+        self.connects += 1
+
+    def close(self):
+        pass
+
+
+def test_watch_mailbox_reenters_idle_on_same_connection_after_notifications():
+    conn = _setup_db()
+    raw = b"Message-ID: <idle@example.com>\r\n\r\nBody"
+    client = _FakeIdleClient(
+        [{"new_mail": True, "arrived": [21]}, {"new_mail": False}, {"new_mail": True}],
+        initial_uids=[20],
+        fetch_map={21: (raw, [], None)},
+    )
+
+    with pytest.raises(_StopWatching):
+        watch_mailbox(client, conn, 1, "INBOX", poll_interval=0)
+
+    rows = conn.execute("SELECT uid FROM messages").fetchall()
+    assert client.connects == 0
+    assert [row["uid"] for row in rows] == [21]
+    assert len(client.search_calls) == 5
+
+
+class _FakeSharedClient:
+    def __init__(self, mailboxes, idle_arrivals):
+        self.mailboxes = mailboxes
+        self.idle_arrivals = list(idle_arrivals)
+        self.selected = None
+        self.status_calls = []
+        self.search_calls = []
+        self.clock = 0.0
+
+    def has_idle(self):
+        return True
+
+    def _status(self, mailbox):
+        uids = self.mailboxes[mailbox]
+        return MailboxStatus(mailbox, True, 6, len(uids), uidnext=max(uids, default=0) + 1)
+
+    def select(self, mailbox, readonly=True):
+        self.selected = mailbox
+        return 6, len(self.mailboxes[mailbox])
+
+    def select_status(self, mailbox, readonly=True, force=False):
+        self.selected = mailbox
+        return self._status(mailbox)
+
+    def mailbox_status(self, mailbox):
+        self.status_calls.append(mailbox)
+        return self._status(mailbox)
+
+    def search_uids(self, since_uid):
+        self.search_calls.append(self.selected)
+        return [uid for uid in self.mailboxes[self.selected] if uid >= since_uid]
+
+    def fetch_many(self, uids, sizes=None, max_batch_bytes=None):
+        for uid in uids:
+            yield uid, f"Message-ID: <{self.selected}-{uid}@example.com>\r\n\r\n".encode(), [], None
+
+    def idle(self, timeout_seconds):
+        assert self.selected == "INBOX"
+        if not self.idle_arrivals:
+            raise _StopWatching()
+        self.clock += timeout_seconds
+        arrivals = self.idle_arrivals.pop(0)
+        for mailbox, uid in arrivals:
+            self.mailboxes[mailbox].append(uid)
+        return IdleResult(new_mail=any(mailbox == "INBOX" for mailbox, _ in arrivals))
+
+
+def test_watch_mailboxes_shared_idles_on_inbox_and_status_checks_others(monkeypatch):
+    conn = _setup_db()
+    client = _FakeSharedClient({"INBOX": [1], "Bulk": [5]}, [[], [("Bulk", 6)], [("INBOX", 2)]])
+    monkeypatch.setattr(
+        "app.imap.mailbox_watcher.time",
+        SimpleNamespace(monotonic=lambda: client.clock, sleep=lambda _: None),
+    )
+
+    with pytest.raises(_StopWatching):
+        watch_mailboxes_shared(client, conn, 1, ["Bulk", "INBOX"], poll_interval=30)
+
+    rows = conn.execute("SELECT mailbox_name, uid FROM messages ORDER BY mailbox_name, uid").fetchall()
+    assert [(row["mailbox_name"], row["uid"]) for row in rows] == [("Bulk", 5), ("Bulk", 6), ("INBOX", 1), ("INBOX", 2)]
+    assert client.status_calls == ["Bulk", "Bulk", "Bulk"]
+    # Initial scan and catch-up for each, then one search per actual change.
+    assert client.search_calls.count("Bulk") == 3
+    assert client.search_calls.count("INBOX") == 3
+
+
 def test_fetch_status_includes_mailbox_health():
     conn = _setup_db()
     conn.execute(
@@ -1,6 +1,14 @@
 import hashlib
+import io
 
-from app.sync.message_pipeline import add_headers, build_label_ids, build_sent_label_ids, prepare_raw_message
+from app.sync.message_pipeline import (
+    add_headers,
+    build_label_ids,
+    build_sent_label_ids,
+    prepare_raw_message,
+    prepare_raw_message_file,
+    read_header_block,
+)
 
 
 def _sha256_hex(payload: bytes) -> str:
@@ -27,6 +35,17 @@ def test_prepare_raw_message_sha_mismatch():
         raise AssertionError("Expected SHA mismatch")
 
 
+def test_prepare_raw_message_file_matches_in_memory_version():
+    raw = b"Subject: hi\r\nIn-Reply-To: <p@example.com>\r\n\r\nBody line\r\n\r\nMore"
+    sha = _sha256_hex(raw)
+    source = io.BytesIO(raw)
+
+    assert read_header_block(source) == b"Subject: hi\r\nIn-Reply-To: <p@example.com>\r\n\r\n"
+    with prepare_raw_message_file(source, "INBOX", 1, 10, sha, max_memory_bytes=16) as out:
+        assert out.read() == prepare_raw_message(raw, "INBOX", 1, 10, sha)
+    assert source.tell() == 0
+
+
 def test_build_label_ids_seen():
     labels = build_label_ids(
         "custom",
@@ -1,3 +1,6 @@
+import httplib2
+from googleapiclient.errors import HttpError
+
 from app.sync.retry_worker import _oauth_alert_payload
 
 
@@ -14,3 +17,16 @@ def test_invalid_client_maps_to_client_mismatch():
 def test_scope_insufficient_maps_to_scope_alert():
     kind, _ = _oauth_alert_payload(Exception("ACCESS_TOKEN_SCOPE_INSUFFICIENT"))
     assert kind == "oauth_scope_insufficient"
+
+
+def test_only_auth_reason_403s_raise_an_oauth_alert():
+    rate_limited = HttpError(
+        httplib2.Response({"status": 403}), b'{"error": {"errors": [{"reason": "rateLimitExceeded"}]}}'
+    )
+    forbidden = HttpError(
+        httplib2.Response({"status": 403}), b'{"error": {"errors": [{"reason": "insufficientPermissions"}]}}'
+    )
+
+    assert _oauth_alert_payload(rate_limited) is None
+    assert _oauth_alert_payload(forbidden)[0] == "oauth_invalid"
+    assert _oauth_alert_payload(HttpError(httplib2.Response({"status": 401}), b"{}"))[0] == "oauth_invalid"
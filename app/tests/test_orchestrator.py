@@ -1,13 +1,15 @@
 import threading
+import time
 
 from app.sync import orchestrator
+from app.sync.wakeup import DeliveryWakeup
 
 
 def test_start_watchers_restarts_mailbox_after_unexpected_exception(monkeypatch):
     calls = []
     stop = threading.Event()
 
-    def fake_watch_mailbox(client, conn, account_id, mailbox, replay_window_uids=0, logger=None):
+    def fake_watch_mailbox(client, conn, account_id, mailbox, replay_window_uids=0, logger=None, **kwargs):
         calls.append(mailbox)
         assert replay_window_uids == 0
         if len(calls) == 1:
@@ -29,3 +31,44 @@ def test_start_watchers_restarts_mailbox_after_unexpected_exception(monkeypatch)
 
     assert stop.wait(timeout=1)
     assert calls[:2] == ["Bulk", "Bulk"]
+
+
+def test_start_watchers_opens_standby_session_only_when_enabled(monkeypatch):
+    started = []
+
+    class FakeStandby:
+        def __init__(self, factory, logger=None):
+            pass
+
+        def start(self):
+            started.append(True)
+
+    monkeypatch.setattr(orchestrator, "StandbyConnection", FakeStandby)
+    monkeypatch.setattr(orchestrator, "_start_watcher_thread", lambda *args: args[-1])
+
+    standbys = orchestrator.start_watchers(1, lambda: object(), ["INBOX"], conn_factory=lambda: object())
+    assert standbys == [None]
+    assert started == []
+
+    standbys = orchestrator.start_watchers(
+        1, lambda: object(), ["INBOX"], conn_factory=lambda: object(), imap_standby=True
+    )
+    assert isinstance(standbys[0], FakeStandby)
+    assert started == [True]
+
+
+def test_delivery_wakeup_releases_waiting_worker_promptly():
+    wakeup = DeliveryWakeup()
+    woken = []
+    waiter = threading.Thread(target=lambda: woken.append(wakeup.wait(30)))
+    waiter.start()
+    started = time.monotonic()
+    wakeup.notify()
+    waiter.join(timeout=5)
+
+    assert woken == [True]
+    assert time.monotonic() - started < 5
+    # A notification that lands while the worker is busy is not lost.
+    wakeup.notify()
+    assert wakeup.wait(0) is True
+    assert wakeup.wait(0) is False
@@ -1,6 +1,8 @@
+import imaplib
 import sqlite3
 
-from app.sync.retry_worker import _select_due_deletions
+from app.imap.yahoo_client import YahooIMAPError
+from app.sync.retry_worker import _delete_yahoo_messages, _select_due_deletions
 from app.store.models import MessageState
 
 
@@ -37,3 +39,74 @@ def test_select_due_deletions_includes_suppressed_duplicate_rows():
     rows = _select_due_deletions(conn)
 
     assert [row["id"] for row in rows] == [1]
+
+
+def _setup_full_db():
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    conn.execute(
+        """
+        CREATE TABLE messages (
+          id INTEGER PRIMARY KEY,
+          mailbox_name TEXT NOT NULL,
+          uidvalidity INTEGER NOT NULL,
+          uid INTEGER NOT NULL,
+          rfc822_sha256 TEXT NOT NULL DEFAULT '',
+          rfc822_size INTEGER,
+          headers_json TEXT,
+          state TEXT NOT NULL,
+          yahoo_deleted_at TEXT,
+          yahoo_delete_attempt_count INTEGER NOT NULL DEFAULT 0,
+          yahoo_delete_next_attempt_at TEXT,
+          yahoo_delete_last_error TEXT,
+          updated_at TEXT NOT NULL DEFAULT '2026-03-28T00:00:00Z'
+        )
+        """
+    )
+    rows = [(1, "INBOX", 5, 10), (2, "INBOX", 5, 11), (3, "Bulk", 8, 20), (4, "INBOX", 6, 12)]
+    for message_id, mailbox, uidvalidity, uid in rows:
+        conn.execute(
+            "INSERT INTO messages(id, mailbox_name, uidvalidity, uid, state) VALUES (?, ?, ?, ?, ?)",
+            (message_id, mailbox, uidvalidity, uid, MessageState.INSERTED),
+        )
+    return conn
+
+
+class _BulkDeleteClient:
+    def __init__(self, errors=None):
+        self.calls = []
+        self.errors = errors or {}
+
+    def delete_uids(self, mailbox, uidvalidity, uids):
+        self.calls.append((mailbox, uidvalidity, list(uids)))
+        error = self.errors.get((mailbox, uidvalidity))
+        if error:
+            raise error
+
+
+def test_delete_yahoo_messages_groups_rows_by_mailbox_and_uidvalidity():
+    conn = _setup_full_db()
+    client = _BulkDeleteClient(errors={("INBOX", 6): YahooIMAPError("UIDVALIDITY changed; refusing to delete")})
+
+    session_lost = _delete_yahoo_messages(conn, _select_due_deletions(conn), client)
+
+    states = {
+        row["id"]: (row["yahoo_deleted_at"] is not None, row["yahoo_delete_attempt_count"])
+        for row in conn.execute("SELECT * FROM messages")
+    }
+    assert sorted(client.calls) == [("Bulk", 8, [20]), ("INBOX", 5, [10, 11]), ("INBOX", 6, [12])]
+    assert states == {1: (True, 0), 2: (True, 0), 3: (True, 0), 4: (False, 1)}
+    assert session_lost is False
+
+
+def test_delete_yahoo_messages_stops_using_lost_session():
+    conn = _setup_full_db()
+    client = _BulkDeleteClient(errors={("INBOX", 5): imaplib.IMAP4.abort("socket error: EOF")})
+    rows = sorted(_select_due_deletions(conn), key=lambda row: row["id"])
+
+    session_lost = _delete_yahoo_messages(conn, rows, client)
+
+    attempts = [row["yahoo_delete_attempt_count"] for row in conn.execute("SELECT * FROM messages ORDER BY id")]
+    assert client.calls == [("INBOX", 5, [10, 11])]
+    assert attempts == [1, 1, 1, 1]
+    assert session_lost is True
@@ -0,0 +1,264 @@
+import hashlib
+import io
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from app.imap.pool import IMAPSessionPool
+from app.imap.yahoo_client import RFC822Download
+from app.store.lease import acquire_insert_lease
+from app.store.models import MessageState
+from app.sync.retry_worker import DeliveryPool, _process_message, _size_bucket, run_delivery_pass
+
+
+def _setup_db(path=":memory:"):
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    conn.execute(
+        """
+        CREATE TABLE messages (
+          id INTEGER PRIMARY KEY,
+          account_id INTEGER,
+          mailbox_name TEXT NOT NULL,
+          uidvalidity INTEGER NOT NULL,
+          uid INTEGER NOT NULL,
+          message_id TEXT,
+          rfc822_sha256 TEXT NOT NULL,
+          rfc822_size INTEGER,
+          headers_json TEXT,
+          imap_internaldate TEXT,
+          imap_flags_json TEXT,
+          state TEXT NOT NULL,
+          attempt_count INTEGER NOT NULL DEFAULT 0,
+          next_attempt_at TEXT,
+          last_error TEXT,
+          gmail_message_id TEXT,
+          gmail_thread_id TEXT,
+          yahoo_deleted_at TEXT,
+          yahoo_delete_attempt_count INTEGER NOT NULL DEFAULT 0,
+          yahoo_delete_next_attempt_at TEXT,
+          yahoo_delete_last_error TEXT,
+          created_at TEXT,
+          updated_at TEXT
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE gmail_message_index (
+          account_id INTEGER NOT NULL,
+          rfc822_message_id TEXT NOT NULL,
+          gmail_message_id TEXT NOT NULL,
+          gmail_thread_id TEXT NOT NULL,
+          created_at TEXT,
+          PRIMARY KEY (account_id, gmail_message_id)
+        )
+        """
+    )
+    return conn
+
+
+class _FakeImapClient:
+    def __init__(self, raw_bytes: bytes):
+        self.raw_bytes = raw_bytes
+        self.deleted = []
+
+    def select(self, mailbox: str):
+        return None
+
+    def fetch_rfc822_file(self, uid: int):
+        return RFC822Download(io.BytesIO(self.raw_bytes), len(self.raw_bytes), hashlib.sha256(self.raw_bytes).hexdigest())
+
+    def delete_uid(self, mailbox: str, uidvalidity: int, uid: int):
+        self.deleted.append((mailbox, uidvalidity, uid))
+
+
+def test_process_message_hashes_header_discovered_row_on_first_download(monkeypatch):
+    raw = b"Message-ID: <late@example.com>\r\nSubject: hi\r\n\r\nBody"
+    conn = _setup_db()
+    conn.execute(
+        """
+        INSERT INTO messages(
+          id, account_id, mailbox_name, uidvalidity, uid, message_id, rfc822_sha256,
+          imap_flags_json, state, created_at, updated_at
+        ) VALUES (1, 1, 'INBOX', 5, 9, '<late@example.com>', '', '[]', ?, '2026-04-20T00:00:00Z', '2026-04-20T00:00:00Z')
+        """,
+        (MessageState.FETCHED,),
+    )
+    acquire_insert_lease(conn, 1)
+    row = conn.execute("SELECT * FROM messages WHERE id = 1").fetchone()
+    inserted = []
+
+    monkeypatch.setattr("app.sync.retry_worker._resolve_thread_id", lambda *args, **kwargs: None)
+    monkeypatch.setattr(
+        "app.sync.retry_worker.insert_message",
+        lambda service, user_id, raw_bytes, *args, **kwargs: inserted.append(raw_bytes.read()) or ("gmail-1", "thread-1"),
+    )
+
+    _process_message(
+        conn,
+        row,
+        gmail_service=object(),
+        gmail_user_id="me",
+        label_id=None,
+        deliver_to_inbox=True,
+        inbox_label_id="INBOX_ID",
+        unread_label_id="UNREAD_ID",
+        sent_label_id="SENT_ID",
+        delivery_mode="insert",
+        imap_pool=IMAPSessionPool(lambda: _FakeImapClient(raw)),
+    )
+
+    stored = conn.execute("SELECT state, rfc822_sha256 FROM messages WHERE id = 1").fetchone()
+    expected = hashlib.sha256(raw).hexdigest()
+    assert stored["state"] == MessageState.INSERTED
+    assert stored["rfc822_sha256"] == expected
+    assert f"X-Y2G-RFC822-SHA256: {expected}".encode() in inserted[0]
+
+
+def test_process_message_frees_the_imap_session_while_gmail_is_called(monkeypatch):
+    raw = b"Message-ID: <held@example.com>\r\n\r\nBody"
+    conn = _setup_db()
+    conn.execute(
+        """
+        INSERT INTO messages(
+          id, account_id, mailbox_name, uidvalidity, uid, message_id, rfc822_sha256,
+          imap_flags_json, state, created_at, updated_at
+        ) VALUES (1, 1, 'INBOX', 5, 9, '<held@example.com>', '', '[]', ?, '2026-04-20T00:00:00Z', '2026-04-20T00:00:00Z')
+        """,
+        (MessageState.FETCHED,),
+    )
+    acquire_insert_lease(conn, 1)
+    row = conn.execute("SELECT * FROM messages WHERE id = 1").fetchone()
+    imap_client = _FakeImapClient(raw)
+    imap_pool = IMAPSessionPool(lambda: imap_client, max_size=1)
+
+    def insert(service, user_id, raw_bytes, *args, **kwargs):
+        # Another worker can take the only session while this one waits on Gmail.
+        imap_pool.release(imap_pool.acquire(timeout=0))
+        return "gmail-1", "thread-1"
+
+    monkeypatch.setattr("app.sync.retry_worker._resolve_thread_id", lambda *args, **kwargs: None)
+    monkeypatch.setattr("app.sync.retry_worker.insert_message", insert)
+
+    _process_message(
+        conn,
+        row,
+        gmail_service=object(),
+        gmail_user_id="me",
+        label_id=None,
+        deliver_to_inbox=True,
+        inbox_label_id="INBOX_ID",
+        unread_label_id="UNREAD_ID",
+        sent_label_id="SENT_ID",
+        delivery_mode="insert",
+        imap_pool=imap_pool,
+    )
+
+    assert conn.execute("SELECT state FROM messages WHERE id = 1").fetchone()["state"] == MessageState.INSERTED
+    assert imap_client.deleted == [("INBOX", 5, 9)]
+    assert imap_pool.open_count == 1
+
+
+def test_delivery_pass_sends_small_messages_first_and_caps_bytes(monkeypatch):
+    conn = _setup_db()
+    sizes = {1: 30 * 1024 * 1024, 2: 10 * 1024, 3: 2 * 1024, 4: 40 * 1024 * 1024}
+    for message_id, size in sizes.items():
+        conn.execute(
+            """
+            INSERT INTO messages(
+              id, account_id, mailbox_name, uidvalidity, uid, message_id, rfc822_sha256, rfc822_size,
+              imap_flags_json, state, created_at, updated_at
+            ) VALUES (?, 1, 'INBOX', 5, ?, NULL, 'x', ?, '[]', ?, '2026-04-20T00:00:00Z', '2026-04-20T00:00:00Z')
+            """,
+            (message_id, message_id, size, MessageState.FETCHED),
+        )
+    processed = []
+
+    class _Pool:
+        @contextmanager
+        def session(self):
+            yield object()
+
+    monkeypatch.setattr("app.sync.retry_worker.DELIVERY_PASS_MAX_BYTES", 1024 * 1024)
+    monkeypatch.setattr("app.sync.retry_worker._process_message", lambda conn, row, **kwargs: processed.append(row["id"]))
+
+    worked = run_delivery_pass(
+        conn,
+        object(),
+        "me",
+        None,
+        True,
+        "INBOX_ID",
+        "UNREAD_ID",
+        "SENT_ID",
+        "insert",
+        _Pool(),
+    )
+
+    assert worked is True
+    assert processed == [3, 2, 1]
+    assert _size_bucket(sizes[3]) == "<100KB"
+    assert _size_bucket(sizes[1]) == ">=10MB"
+    assert _size_bucket(None) == "unknown"
+
+
+def test_delivery_pass_runs_leased_rows_on_pool_threads_with_their_own_service(monkeypatch, tmp_path):
+    db_path = str(tmp_path / "app.db")
+    conn = _setup_db(db_path)
+    for message_id in (1, 2, 3, 4):
+        conn.execute(
+            """
+            INSERT INTO messages(
+              id, account_id, mailbox_name, uidvalidity, uid, message_id, rfc822_sha256, rfc822_size,
+              imap_flags_json, state, created_at, updated_at
+            ) VALUES (?, 1, 'INBOX', 5, ?, NULL, 'x', 10, '[]', ?, '2026-04-20T00:00:00Z', '2026-04-20T00:00:00Z')
+            """,
+            (message_id, message_id, MessageState.FETCHED),
+        )
+    conn.commit()
+    both_running = threading.Barrier(2, timeout=5)
+    delivered = []
+
+    class _ServiceManager:
+        def get_service(self, conn):
+            return ("service", threading.get_ident())
+
+    class _Pool:
+        @contextmanager
+        def session(self):
+            yield object()
+
+    def fake_process(conn, row, gmail_service, **kwargs):
+        # Two workers must be inside a delivery at the same time to pass.
+        both_running.wait()
+        delivered.append((row["id"], gmail_service[1] == threading.get_ident(), row["state"]))
+
+    def connect():
+        worker_conn = sqlite3.connect(db_path)
+        worker_conn.row_factory = sqlite3.Row
+        return worker_conn
+
+    monkeypatch.setattr("app.sync.retry_worker._process_message", fake_process)
+    pool = DeliveryPool(connect, _ServiceManager(), max_workers=2)
+    try:
+        worked = run_delivery_pass(
+            conn,
+            None,
+            "me",
+            None,
+            True,
+            "INBOX_ID",
+            "UNREAD_ID",
+            "SENT_ID",
+            "insert",
+            _Pool(),
+            delivery_pool=pool,
+        )
+    finally:
+        pool.shutdown()
+
+    assert worked is True
+    assert sorted(delivered) == [(uid, True, MessageState.FETCHED) for uid in (1, 2, 3, 4)]
+    states = {row["state"] for row in conn.execute("SELECT state FROM messages")}
+    assert states == {MessageState.INSERTING}
@@ -1,9 +1,17 @@
 import hashlib
+import io
 import sqlite3
 
+import httplib2
+from googleapiclient.errors import HttpError
+
+from app.imap.headers import HeaderSummary
+from app.imap.pool import IMAPSessionPool
+from app.imap.yahoo_client import RFC822Download
 from app.store.lease import acquire_insert_lease
+from app.store.message_index import MissingMessageIDCache, lookup_gmail_message, record_gmail_message
 from app.store.models import MessageState
-from app.sync.retry_worker import _process_message
+from app.sync.retry_worker import _insert_threaded, _process_message, _resolve_thread_id
 
 
 def _sha256_hex(payload: bytes) -> str:
@@ -23,6 +31,8 @@ def _setup_db():
           uid INTEGER NOT NULL,
           message_id TEXT,
           rfc822_sha256 TEXT NOT NULL,
+          rfc822_size INTEGER,
+          headers_json TEXT,
           imap_internaldate TEXT,
           imap_flags_json TEXT,
           state TEXT NOT NULL,
@@ -40,6 +50,18 @@ def _setup_db():
         )
         """
     )
+    conn.execute(
+        """
+        CREATE TABLE gmail_message_index (
+          account_id INTEGER NOT NULL,
+          rfc822_message_id TEXT NOT NULL,
+          gmail_message_id TEXT NOT NULL,
+          gmail_thread_id TEXT NOT NULL,
+          created_at TEXT,
+          PRIMARY KEY (account_id, gmail_message_id)
+        )
+        """
+    )
     return conn
 
 
@@ -64,8 +86,8 @@ class _FakeImapClient:
     def select(self, mailbox: str):
         self.selected.append(mailbox)
 
-    def fetch_rfc822(self, uid: int):
-        return self.raw_bytes, ["\\Seen"], None
+    def fetch_rfc822_file(self, uid: int):
+        return RFC822Download(io.BytesIO(self.raw_bytes), len(self.raw_bytes), hashlib.sha256(self.raw_bytes).hexdigest())
 
     def delete_uid(self, mailbox: str, uidvalidity: int, uid: int):
         self.deleted.append((mailbox, uidvalidity, uid))
@@ -103,7 +125,7 @@ def test_process_message_suppresses_duplicate_sent_message(monkeypatch):
         unread_label_id="UNREAD_ID",
         sent_label_id="SENT_ID",
         delivery_mode="insert",
-        imap_client=imap_client,
+        imap_pool=IMAPSessionPool(lambda: imap_client),
     )
 
     stored = conn.execute(
@@ -134,6 +156,10 @@ def test_process_message_inserts_sent_message_with_resolved_thread(monkeypatch):
         "app.sync.retry_worker.find_message_by_rfc822msgid",
         lambda service, user_id, msgid: None if msgid == "<new@example.com>" else ("gmail-parent", "thread-123"),
     )
+    monkeypatch.setattr(
+        "app.sync.retry_worker.find_messages_by_rfc822msgids",
+        lambda service, user_id, msgids: {msgid: ("gmail-parent", "thread-123") for msgid in msgids if msgid},
+    )
     monkeypatch.setattr(
         "app.sync.retry_worker.insert_sent_message",
         lambda service, user_id, raw_bytes, sent_label_id, thread_id=None: sent_calls.append(
@@ -153,7 +179,7 @@ def test_process_message_inserts_sent_message_with_resolved_thread(monkeypatch):
         unread_label_id="UNREAD_ID",
         sent_label_id="SENT_ID",
         delivery_mode="insert",
-        imap_client=imap_client,
+        imap_pool=IMAPSessionPool(lambda: imap_client),
     )
 
     stored = conn.execute(
@@ -164,3 +190,249 @@ def test_process_message_inserts_sent_message_with_resolved_thread(monkeypatch):
     assert stored["gmail_thread_id"] == "thread-123"
     assert stored["yahoo_deleted_at"] is not None
     assert sent_calls == [{"label_id": "SENT_ID", "thread_id": "thread-123"}]
+
+
+def test_process_message_resolves_thread_from_local_index_without_gmail_lookups(monkeypatch):
+    raw = (
+        b"Message-ID: <reply@example.com>\r\n"
+        b"In-Reply-To: <ours@example.com>\r\n"
+        b"Subject: Re: hi\r\n"
+        b"\r\n"
+        b"Body"
+    )
+    conn = _setup_db()
+    _insert_message(conn, raw, "Sent", "<reply@example.com>")
+    record_gmail_message(conn, 1, "<ours@example.com>", "gmail-ours", "thread-ours")
+    acquire_insert_lease(conn, 1)
+    row = conn.execute("SELECT * FROM messages WHERE id = 1").fetchone()
+    sent_calls = []
+
+    def no_remote_lookup(*args, **kwargs):
+        raise AssertionError("unexpected Gmail lookup")
+
+    monkeypatch.setattr("app.sync.retry_worker.find_messages_by_rfc822msgids", no_remote_lookup)
+    monkeypatch.setattr("app.sync.retry_worker.find_message_by_rfc822msgid", lambda service, user_id, msgid: None)
+    monkeypatch.setattr(
+        "app.sync.retry_worker.insert_sent_message",
+        lambda service, user_id, raw_bytes, sent_label_id, thread_id=None: sent_calls.append(thread_id)
+        or ("gmail-reply", thread_id),
+    )
+
+    _process_message(
+        conn,
+        row,
+        gmail_service=object(),
+        gmail_user_id="me",
+        label_id="custom",
+        deliver_to_inbox=True,
+        inbox_label_id="INBOX_ID",
+        unread_label_id="UNREAD_ID",
+        sent_label_id="SENT_ID",
+        delivery_mode="insert",
+        imap_pool=IMAPSessionPool(lambda: _FakeImapClient(raw)),
+    )
+
+    assert sent_calls == ["thread-ours"]
+    assert lookup_gmail_message(conn, 1, "<reply@example.com>") == ("gmail-reply", "thread-ours")
+
+
+def test_missing_message_id_cache_expires_and_stays_bounded(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("app.store.message_index.time.monotonic", lambda: now[0])
+    cache = MissingMessageIDCache(ttl_seconds=60, max_entries=2)
+
+    cache.add("<a@example.com>")
+    cache.add("<b@example.com>")
+    assert "<a@example.com>" in cache
+    cache.add("<c@example.com>")
+
+    assert "<b@example.com>" not in cache
+    assert "<a@example.com>" in cache
+    now[0] += 61
+    assert "<c@example.com>" not in cache
+
+
+def test_process_message_trusts_caught_up_mirror_for_sent_duplicates_and_threads(monkeypatch):
+    raw = (
+        b"Message-ID: <new@example.com>\r\n"
+        b"In-Reply-To: <unknown@example.com>\r\n"
+        b"Subject: Re: hi\r\n"
+        b"\r\n"
+        b"Body"
+    )
+    conn = _setup_db()
+    _insert_message(conn, raw, "Sent", "<new@example.com>")
+    acquire_insert_lease(conn, 1)
+    row = conn.execute("SELECT * FROM messages WHERE id = 1").fetchone()
+    sent_calls = []
+
+    caught_up = []
+
+    class _FreshMirror:
+        def catch_up(self, conn, service, since, logger=None):
+            caught_up.append(since)
+            return True
+
+    def no_remote_lookup(*args, **kwargs):
+        raise AssertionError("unexpected Gmail lookup")
+
+    monkeypatch.setattr("app.sync.retry_worker.find_messages_by_rfc822msgids", no_remote_lookup)
+    monkeypatch.setattr("app.sync.retry_worker.find_message_by_rfc822msgid", no_remote_lookup)
+    monkeypatch.setattr(
+        "app.sync.retry_worker.insert_sent_message",
+        lambda service, user_id, raw_bytes, sent_label_id, thread_id=None: sent_calls.append(thread_id)
+        or ("gmail-new", "thread-new"),
+    )
+
+    _process_message(
+        conn,
+        row,
+        gmail_service=object(),
+        gmail_user_id="me",
+        label_id="custom",
+        deliver_to_inbox=True,
+        inbox_label_id="INBOX_ID",
+        unread_label_id="UNREAD_ID",
+        sent_label_id="SENT_ID",
+        delivery_mode="insert",
+        imap_pool=IMAPSessionPool(lambda: _FakeImapClient(raw)),
+        mirror=_FreshMirror(),
+    )
+
+    assert sent_calls == [None]
+    assert caught_up == ["2026-03-28T00:00:00Z"]
+    assert lookup_gmail_message(conn, 1, "<new@example.com>") == ("gmail-new", "thread-new")
+
+
+def test_inbox_message_asks_the_mirror_only_after_a_local_miss_on_thread_candidates(monkeypatch):
+    raw = b"Message-ID: <fresh@example.com>\r\nSubject: hi\r\n\r\nBody"
+    conn = _setup_db()
+    _insert_message(conn, raw, "INBOX", "<fresh@example.com>")
+    record_gmail_message(conn, 1, "<parent@example.com>", "gmail-parent", "thread-parent")
+    acquire_insert_lease(conn, 1)
+    row = conn.execute("SELECT * FROM messages WHERE id = 1").fetchone()
+    caught_up = []
+
+    class _Mirror:
+        def catch_up(self, conn, service, since, logger=None):
+            caught_up.append(since)
+            return True
+
+    def no_gmail_call(*args, **kwargs):
+        raise AssertionError("unexpected Gmail call")
+
+    monkeypatch.setattr("app.sync.retry_worker.find_messages_by_rfc822msgids", no_gmail_call)
+    monkeypatch.setattr("app.sync.retry_worker.find_message_by_rfc822msgid", no_gmail_call)
+    monkeypatch.setattr(
+        "app.sync.retry_worker.insert_message", lambda service, user_id, raw_bytes, *args, **kwargs: ("g-new", "t-new")
+    )
+
+    _process_message(
+        conn,
+        row,
+        gmail_service=object(),
+        gmail_user_id="me",
+        label_id=None,
+        deliver_to_inbox=True,
+        inbox_label_id="INBOX_ID",
+        unread_label_id="UNREAD_ID",
+        sent_label_id="SENT_ID",
+        delivery_mode="insert",
+        imap_pool=IMAPSessionPool(lambda: _FakeImapClient(raw)),
+        mirror=_Mirror(),
+    )
+
+    assert caught_up == []
+    assert conn.execute("SELECT state FROM messages WHERE id = 1").fetchone()["state"] == MessageState.INSERTED
+
+    reply = HeaderSummary(in_reply_to="<parent@example.com>")
+    unknown = HeaderSummary(in_reply_to="<unknown@example.com>")
+
+    def covers():
+        caught_up.append("asked")
+        return True
+
+    assert _resolve_thread_id(conn, 1, object(), "me", reply, mirror_covers=covers) == "thread-parent"
+    assert caught_up == []
+    assert _resolve_thread_id(conn, 1, object(), "me", unknown, mirror_covers=covers) is None
+    assert caught_up == ["asked"]
+
+
+def test_process_message_retries_without_stale_indexed_thread(monkeypatch):
+    raw = (
+        b"Message-ID: <reply@example.com>\r\n"
+        b"In-Reply-To: <deleted@example.com>\r\n"
+        b"Subject: Re: hi\r\n"
+        b"\r\n"
+        b"Body"
+    )
+    conn = _setup_db()
+    _insert_message(conn, raw, "Sent", "<reply@example.com>")
+    record_gmail_message(conn, 1, "<deleted@example.com>", "gmail-deleted", "thread-deleted")
+    acquire_insert_lease(conn, 1)
+    row = conn.execute("SELECT * FROM messages WHERE id = 1").fetchone()
+    sent_calls = []
+
+    def insert_sent(service, user_id, raw_bytes, sent_label_id, thread_id=None):
+        sent_calls.append(thread_id)
+        if thread_id is not None:
+            raise HttpError(httplib2.Response({"status": 404}), b'{"error": {"code": 404}}')
+        return "gmail-reply", "thread-new"
+
+    checked = []
+    monkeypatch.setattr("app.sync.retry_worker.find_message_by_rfc822msgid", lambda service, user_id, msgid: None)
+    monkeypatch.setattr("app.sync.retry_worker.insert_sent_message", insert_sent)
+    monkeypatch.setattr(
+        "app.sync.retry_worker.thread_exists", lambda service, user_id, thread_id: checked.append(thread_id) or False
+    )
+
+    _process_message(
+        conn,
+        row,
+        gmail_service=object(),
+        gmail_user_id="me",
+        label_id="custom",
+        deliver_to_inbox=True,
+        inbox_label_id="INBOX_ID",
+        unread_label_id="UNREAD_ID",
+        sent_label_id="SENT_ID",
+        delivery_mode="insert",
+        imap_pool=IMAPSessionPool(lambda: _FakeImapClient(raw)),
+    )
+
+    assert sent_calls == ["thread-deleted", None]
+    assert checked == ["thread-deleted"]
+    assert lookup_gmail_message(conn, 1, "<deleted@example.com>") is None
+    stored = conn.execute("SELECT state, gmail_thread_id FROM messages WHERE id = 1").fetchone()
+    assert tuple(stored) == (MessageState.INSERTED, "thread-new")
+
+
+def test_insert_threaded_keeps_the_index_unless_gmail_confirms_the_thread_is_gone(monkeypatch):
+    conn = _setup_db()
+    record_gmail_message(conn, 1, "<parent@example.com>", "gmail-parent", "thread-live")
+    invalid_thread = HttpError(
+        httplib2.Response({"status": 400}), b'{"error": {"code": 400, "message": "Invalid threadId value"}}'
+    )
+    bad_request = HttpError(
+        httplib2.Response({"status": 400}), b'{"error": {"code": 400, "message": "Invalid To header"}}'
+    )
+    checked = []
+    monkeypatch.setattr(
+        "app.sync.retry_worker.thread_exists", lambda service, user_id, thread_id: checked.append(thread_id) or True
+    )
+
+    for error in (invalid_thread, bad_request):
+
+        def insert(thread_id, error=error):
+            raise error
+
+        try:
+            _insert_threaded(conn, 1, object(), "me", "thread-live", insert)
+        except HttpError as exc:
+            assert exc is error
+        else:
+            raise AssertionError("Expected HttpError")
+
+    # Only the threadId error was worth checking, and the thread still exists.
+    assert checked == ["thread-live"]
+    assert lookup_gmail_message(conn, 1, "<parent@example.com>") == ("gmail-parent", "thread-live")
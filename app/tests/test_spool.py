@@ -0,0 +1,143 @@
+import hashlib
+import io
+import os
+import sqlite3
+
+from app.imap.yahoo_client import RFC822Download
+from app.store.spool import RFC822Spool
+from app.imap.yahoo_client import YahooIMAPError
+from app.sync.retry_worker import _load_rfc822
+
+
+def _sha(payload: bytes) -> str:
+    return hashlib.sha256(payload).hexdigest()
+
+
+def test_spool_round_trips_message_by_content_hash(tmp_path):
+    spool = RFC822Spool(str(tmp_path), 1024)
+    raw = b"Subject: hi\r\n\r\nBody"
+
+    assert spool.put(_sha(raw), raw) is True
+
+    assert spool.get(_sha(raw)) == raw
+    assert spool.total_bytes == len(raw)
+
+
+def test_spool_evicts_least_recently_used_over_cap(tmp_path):
+    spool = RFC822Spool(str(tmp_path), 20)
+    first, second, third = b"a" * 8, b"b" * 8, b"c" * 8
+    spool.put(_sha(first), first)
+    spool.put(_sha(second), second)
+    spool.get(_sha(first))
+
+    spool.put(_sha(third), third)
+
+    assert spool.get(_sha(second)) is None
+    assert spool.get(_sha(first)) == first
+    assert spool.get(_sha(third)) == third
+    assert spool.total_bytes == 16
+
+
+def test_spool_reloads_index_and_discards(tmp_path):
+    raw = b"x" * 10
+    RFC822Spool(str(tmp_path), 100).put(_sha(raw), raw)
+    spool = RFC822Spool(str(tmp_path), 100)
+
+    assert spool.total_bytes == 10
+    spool.discard(_sha(raw))
+
+    assert spool.get(_sha(raw)) is None
+    assert not os.path.exists(os.path.join(str(tmp_path), _sha(raw)[:2], _sha(raw)))
+
+
+def test_load_rfc822_prefers_spool_over_imap(tmp_path):
+    raw = b"Subject: cached\r\n\r\nBody"
+    spool = RFC822Spool(str(tmp_path), 1024)
+    spool.put(_sha(raw), raw)
+
+    class _NoFetchClient:
+        def select(self, mailbox):
+            raise AssertionError("spool hit must not touch IMAP")
+
+    row = {"id": 1, "mailbox_name": "INBOX", "uid": 5, "rfc822_sha256": _sha(raw)}
+
+    handle, sha256_hex = _load_rfc822(None, row, _NoFetchClient(), spool=spool)
+
+    with handle:
+        assert (handle.read(), sha256_hex) == (raw, _sha(raw))
+
+
+def test_load_rfc822_spools_imap_download_on_miss(tmp_path):
+    raw = b"Subject: fresh\r\n\r\nBody"
+    spool = RFC822Spool(str(tmp_path), 1024)
+
+    class _Client:
+        def select(self, mailbox):
+            return None
+
+        def fetch_rfc822_file(self, uid):
+            return RFC822Download(io.BytesIO(raw), len(raw), _sha(raw))
+
+    row = {"id": 1, "mailbox_name": "INBOX", "uid": 5, "rfc822_sha256": _sha(raw), "rfc822_size": len(raw)}
+
+    _load_rfc822(None, row, _Client(), spool=spool)
+
+    assert spool.get(_sha(raw)) == raw
+
+
+def test_load_rfc822_resumes_large_download_from_recorded_offset(tmp_path, monkeypatch):
+    raw = bytes(range(256)) * 40
+    spool = RFC822Spool(str(tmp_path), 1024 * 1024)
+    monkeypatch.setattr("app.sync.retry_worker.RESUMABLE_DOWNLOAD_MIN_BYTES", 1024)
+    monkeypatch.setattr("app.sync.retry_worker.PARTIAL_FETCH_CHUNK_BYTES", 4096)
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    conn.execute(
+        """
+        CREATE TABLE messages (
+          id INTEGER PRIMARY KEY, mailbox_name TEXT, uid INTEGER, rfc822_sha256 TEXT,
+          rfc822_size INTEGER, download_offset INTEGER NOT NULL DEFAULT 0, updated_at TEXT
+        )
+        """
+    )
+    conn.execute(
+        "INSERT INTO messages(id, mailbox_name, uid, rfc822_sha256, rfc822_size) VALUES (3, 'INBOX', 9, ?, ?)",
+        (_sha(raw), len(raw)),
+    )
+
+    class _FlakyClient:
+        def __init__(self):
+            self.requests = []
+            self.fail_after_bytes = 100
+
+        def select(self, mailbox):
+            return None
+
+        def fetch_partial(self, uid, offset, length, sink):
+            self.requests.append(offset)
+            chunk = raw[offset : offset + length]
+            if self.fail_after_bytes is not None and offset > 0:
+                sink.write(chunk[: self.fail_after_bytes])
+                self.fail_after_bytes = None
+                raise YahooIMAPError("connection dropped")
+            sink.write(chunk)
+            return len(chunk)
+
+    client = _FlakyClient()
+    row = conn.execute("SELECT * FROM messages WHERE id = 3").fetchone()
+    try:
+        _load_rfc822(conn, row, client, spool=spool)
+    except YahooIMAPError:
+        pass
+    assert conn.execute("SELECT download_offset FROM messages WHERE id = 3").fetchone()[0] == 4096
+
+    row = conn.execute("SELECT * FROM messages WHERE id = 3").fetchone()
+    handle, sha256_hex = _load_rfc822(conn, row, client, spool=spool)
+
+    with handle:
+        assert handle.read() == raw
+    assert sha256_hex == _sha(raw)
+    assert client.requests == [0, 4096, 4096, 8192]
+    assert conn.execute("SELECT download_offset FROM messages WHERE id = 3").fetchone()[0] == 0
+    assert spool.get(_sha(raw)) == raw
+    assert not os.path.exists(spool.partial_path("3"))
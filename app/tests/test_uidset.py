@@ -0,0 +1,34 @@
+from app.imap.uidset import UIDSet
+
+
+def test_uidset_parses_and_formats_sequence_sets():
+    uids = UIDSet.parse(b"7,1:3,4,9:8")
+
+    assert uids.ranges == ((1, 4), (7, 9))
+    assert str(uids) == "1:4,7:9"
+    assert len(uids) == 7
+    assert (uids.first, uids.last) == (1, 9)
+    assert list(uids) == [1, 2, 3, 4, 7, 8, 9]
+    assert UIDSet.from_uids([9, 8, 7, 4, 3, 2, 1]) == uids
+
+
+def test_uidset_membership_and_difference_work_on_ranges():
+    window = UIDSet([(1, 500)])
+    known = UIDSet([(1, 120), (122, 499)])
+
+    assert 121 in window - known
+    assert 5 not in window - known
+    assert (window - known).ranges == ((121, 121), (500, 500))
+    assert (UIDSet([(1, 10)]) - UIDSet([(3, 4), (8, 20)])).ranges == ((1, 2), (5, 7))
+    assert (known | UIDSet([(121, 121)])).ranges == ((1, 499),)
+
+
+def test_uidset_add_merges_neighbouring_ranges():
+    uids = UIDSet()
+    for uid in (5, 7, 6, 1, 9, 2):
+        uids.add(uid)
+
+    assert uids.ranges == ((1, 2), (5, 7), (9, 9))
+    uids.add(6)
+    uids.add(8)
+    assert uids.ranges == ((1, 2), (5, 9))
@@ -0,0 +1,477 @@
+import hashlib
+import io
+import zlib
+
+import pytest
+
+from app.imap.yahoo_client import (
+    MailboxStatus,
+    YahooIMAPClient,
+    _batch_uids_by_size,
+    _MeteredIMAP4_SSL,
+    _uid_set,
+)
+
+
+class _FakeStreamingIMAP:
+    def __init__(self, responses, sizes):
+        self.responses = list(responses)
+        self.sizes = sizes
+        self.tagged_commands = {}
+        self.untagged_responses = {}
+        self.commands = []
+
+    def uid(self, command, uid_set, items):
+        self.commands.append((command, uid_set, items))
+        data = [f"1 (UID {uid} RFC822.SIZE {size})".encode() for uid, size in self.sizes.items()]
+        return "OK", data
+
+    def _command(self, name, command, uid_set, items):
+        self.commands.append((command, uid_set, items))
+        self.tagged_commands["A1"] = None
+        return "A1"
+
+    def _get_response(self):
+        if not self.responses:
+            self.tagged_commands["A1"] = ("OK", [b"FETCH completed"])
+            return b"A1 OK"
+        self.untagged_responses.setdefault("FETCH", []).extend(self.responses.pop(0))
+        return b"* FETCH"
+
+
+def _client(fake):
+    client = YahooIMAPClient("imap.example.com", 993, "user@example.com", "secret")
+    client._imap = fake
+    return client
+
+
+def test_uid_set_compresses_consecutive_ranges():
+    assert _uid_set([7, 1, 2, 3, 5, 9, 8]) == "1:3,5,7:9"
+    assert _uid_set([]) == ""
+
+
+def test_batch_uids_by_size_caps_total_bytes():
+    batches = _batch_uids_by_size([1, 2, 3, 4], {1: 600, 2: 500, 3: 100, 4: 2000}, 1000)
+
+    assert batches == [[1], [2, 3], [4]]
+
+
+def test_fetch_many_streams_each_literal_with_trailing_flags():
+    fake = _FakeStreamingIMAP(
+        responses=[
+            [(b'1 (UID 10 BODY[] {4}', b"abcd"), b' FLAGS (\\Seen) INTERNALDATE "01-Jan-2026 00:00:00 +0000")'],
+            [(b"2 (UID 11 FLAGS () BODY[] {2}", b"ef"), b")"],
+        ],
+        sizes={10: 4, 11: 2},
+    )
+    client = _client(fake)
+
+    results = list(client.fetch_many([11, 10]))
+
+    assert results == [
+        (10, b"abcd", ["\\Seen"], "01-Jan-2026 00:00:00 +0000"),
+        (11, b"ef", [], None),
+    ]
+    assert fake.commands[-1] == ("FETCH", "10:11", "(UID BODY.PEEK[] FLAGS INTERNALDATE)")
+
+
+def test_fetch_many_splits_batches_by_reported_size():
+    fake = _FakeStreamingIMAP(responses=[], sizes={})
+    client = _client(fake)
+
+    list(client.fetch_many([1, 2, 3], sizes={1: 10, 2: 10, 3: 10}, max_batch_bytes=20))
+
+    assert [cmd[1] for cmd in fake.commands] == ["1:2", "3"]
+
+
+def test_fetch_many_fetches_small_messages_before_large_ones():
+    fake = _FakeStreamingIMAP(responses=[], sizes={})
+    client = _client(fake)
+
+    sizes = {1: 30_000_000, 2: 2_000, 3: 9_000_000, 4: 5_000}
+
+    list(client.fetch_many([1, 2, 3, 4], sizes=sizes, max_batch_bytes=8_000_000))
+
+    assert [cmd[1] for cmd in fake.commands] == ["2,4", "3", "1"]
+
+
+def test_fetch_headers_many_returns_size_and_header_fields():
+    fake = _FakeStreamingIMAP(
+        responses=[
+            [
+                (
+                    b"1 (UID 42 RFC822.SIZE 31457280 FLAGS (\\Seen) "
+                    b"BODY[HEADER.FIELDS (MESSAGE-ID IN-REPLY-TO REFERENCES DATE)] {27}",
+                    b"Message-ID: <a@example.com>",
+                ),
+                b")",
+            ],
+        ],
+        sizes={},
+    )
+    client = _client(fake)
+
+    results = list(client.fetch_headers_many([42]))
+
+    assert results == [(42, b"Message-ID: <a@example.com>", ["\\Seen"], None, 31457280)]
+    assert "BODY.PEEK[HEADER.FIELDS (MESSAGE-ID IN-REPLY-TO REFERENCES DATE)]" in fake.commands[-1][2]
+
+
+class _FakeSelectIMAP:
+    def __init__(self, uidvalidity=7):
+        self.uidvalidity = uidvalidity
+        self.selects = []
+        self.commands = []
+
+    def select(self, mailbox, readonly=False):
+        self.selects.append((mailbox, readonly))
+        return "OK", [b"3", f"[UIDVALIDITY {self.uidvalidity}]".encode()]
+
+    def uid(self, command, *args):
+        self.commands.append((command,) + args)
+        return "OK", [b""]
+
+    def expunge(self):
+        self.commands.append(("EXPUNGE",))
+        return "OK", [b""]
+
+
+def test_select_skips_repeat_and_upgrades_to_read_write_only_when_needed():
+    fake = _FakeSelectIMAP()
+    client = _client(fake)
+
+    assert client.select("INBOX") == (7, 3)
+    client.select("INBOX")
+    client.delete_uid("INBOX", 7, 10)
+    client.select("INBOX")
+    client.delete_uid("INBOX", 7, 11)
+
+    assert fake.selects == [('"INBOX"', True), ('"INBOX"', False)]
+    assert client.selected_mailbox == "INBOX"
+
+
+def test_select_reselects_after_mailbox_change_and_close():
+    fake = _FakeSelectIMAP()
+    client = _client(fake)
+
+    client.select("INBOX")
+    client.select("Bulk")
+    client.select("INBOX", force=True)
+
+    assert [name for name, _ in fake.selects] == ['"INBOX"', '"Bulk"', '"INBOX"']
+
+    fake.logout = lambda: ("BYE", [b""])
+    client.close()
+    assert client.selected_mailbox is None
+
+
+def test_select_status_reads_response_codes_without_status_round_trip():
+    fake = _FakeSelectIMAP()
+    fake.untagged_responses = {"UIDVALIDITY": [b"9"], "UIDNEXT": [b"42"], "HIGHESTMODSEQ": [b"123456"]}
+    fake.status = lambda *args: pytest.fail("STATUS should not be needed")
+    client = _client(fake)
+
+    selected = client.select_status("INBOX")
+
+    assert (selected.uidvalidity, selected.exists) == (9, 3)
+    assert (selected.uidnext, selected.highest_modseq) == (42, 123456)
+
+
+def test_search_uids_uses_esearch_ranges_when_advertised():
+    fake = _FakeSelectIMAP()
+    fake.capabilities = ("IMAP4REV1", "ESEARCH")
+    fake.untagged_responses = {}
+    searches = []
+
+    def uid(command, *args):
+        searches.append((command,) + args)
+        fake.untagged_responses["ESEARCH"] = [b'(TAG "A5") UID ALL 4:480,482']
+        return "OK", [None]
+
+    fake.uid = uid
+    client = YahooIMAPClient("imap.example.com", 993, "user@example.com", "secret")
+    client._imap = fake
+
+    uids = client.search_uids(4)
+
+    assert searches == [("SEARCH", "RETURN", "(ALL)", "UID 4:*")]
+    assert uids.ranges == ((4, 480), (482, 482))
+    assert len(uids) == 478
+    assert "ESEARCH" not in fake.untagged_responses
+
+
+def test_mailbox_status_parses_status_items_for_unselected_mailbox():
+    fake = _FakeSelectIMAP()
+    requests = []
+
+    def _status(mailbox, items):
+        requests.append((mailbox, items))
+        return "OK", [b'"Bulk" (MESSAGES 4 UIDNEXT 123 UIDVALIDITY 6)']
+
+    fake.status = _status
+    client = _client(fake)
+    client.select("INBOX")
+
+    status = client.mailbox_status("Bulk")
+
+    assert requests == [('"Bulk"', "(MESSAGES UIDNEXT UIDVALIDITY)")]
+    assert (status.uidvalidity, status.exists, status.uidnext) == (6, 4, 123)
+    assert client.selected_mailbox == "INBOX"
+
+
+def test_connect_enables_qresync_when_advertised(monkeypatch):
+    enabled = []
+
+    class _FakeLoginIMAP(_FakeSelectIMAP):
+        capabilities = ("IMAP4REV1", "ENABLE", "CONDSTORE", "QRESYNC")
+
+        def __init__(self, *args, **kwargs):
+            super().__init__()
+
+        def login(self, user, password):
+            return "OK", [b"logged in"]
+
+        def enable(self, capability):
+            enabled.append(capability)
+            return "OK", [b"ENABLED"]
+
+    monkeypatch.setattr("app.imap.yahoo_client._MeteredIMAP4_SSL", _FakeLoginIMAP)
+    client = YahooIMAPClient("imap.example.com", 993, "user@example.com", "secret")
+
+    client.connect()
+
+    assert enabled == ["QRESYNC"]
+    assert client.condstore_enabled is True
+
+
+class _FakeWireSocket:
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+        self.sent = []
+
+    def recv(self, size):
+        return self.chunks.pop(0) if self.chunks else b""
+
+    def sendall(self, data):
+        self.sent.append(data)
+
+    def pending(self):
+        return 0
+
+
+def _metered_imap(chunks):
+    imap = _MeteredIMAP4_SSL.__new__(_MeteredIMAP4_SSL)
+    imap._inbuf = bytearray()
+    imap._compressor = None
+    imap._decompressor = None
+    imap.wire_bytes_in = imap.decoded_bytes_in = imap.wire_bytes_out = imap.decoded_bytes_out = 0
+    imap.sock = _FakeWireSocket(chunks)
+    imap.tagged_commands = {}
+    imap.untagged_responses = {}
+    imap.capabilities = ("IMAP4REV1", "COMPRESS=DEFLATE")
+    imap.tagnum = 1
+    imap._encoding = "ascii"
+    imap.tagpre = b"T"
+    imap.debug = 0
+    imap._cmd_log, imap._cmd_log_idx, imap._cmd_log_len = {}, 0, 10
+    return imap
+
+
+def test_compress_deflate_switches_stream_and_counts_wire_bytes():
+    server = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+    body = b"Subject: " + b"x" * 4000 + b"\r\n"
+    compressed = server.compress(b"* 1 FETCH (UID 7 BODY[] {%d}\r\n" % len(body) + body + b")\r\n")
+    compressed += server.flush(zlib.Z_SYNC_FLUSH)
+    # The tagged OK and the first compressed bytes arrive in one read.
+    imap = _metered_imap([b"T1 OK DEFLATE active\r\n" + compressed[:10], compressed[10:]])
+    client = YahooIMAPClient("imap.example.com", 993, "user@example.com", "secret")
+    client._imap = imap
+
+    client._start_compression()
+
+    assert client.compressed is True
+    assert imap.sock.sent == [b"T1 COMPRESS DEFLATE\r\n"]
+    assert imap.readline().endswith(b"{%d}\r\n" % len(body))
+    assert imap.read(len(body)) == body
+    assert imap.readline() == b")\r\n"
+
+    imap.send(b"T2 NOOP\r\n")
+    assert zlib.decompressobj(-15).decompress(imap.sock.sent[-1]) == b"T2 NOOP\r\n"
+
+    stats = client.transfer_stats()
+    assert stats["wire_bytes_in"] < stats["decoded_bytes_in"]
+    assert stats["decoded_bytes_out"] == len(b"T1 COMPRESS DEFLATE\r\n") + len(b"T2 NOOP\r\n")
+
+
+def test_compress_is_skipped_when_not_advertised():
+    imap = _metered_imap([])
+    imap.capabilities = ("IMAP4REV1",)
+    client = YahooIMAPClient("imap.example.com", 993, "user@example.com", "secret")
+    client._imap = imap
+
+    client._start_compression()
+
+    assert client.compressed is False
+    assert imap.sock.sent == []
+
+
+def test_delete_uids_uses_single_store_and_uid_expunge_with_uidplus():
+    fake = _FakeSelectIMAP()
+    fake.capabilities = ("IMAP4REV1", "UIDPLUS")
+    client = _client(fake)
+
+    client.delete_uids("INBOX", 7, [12, 10, 11, 15])
+
+    assert fake.commands == [
+        ("STORE", "10:12,15", "+FLAGS.SILENT", r"(\Deleted)"),
+        ("EXPUNGE", "10:12,15"),
+    ]
+
+
+class _FakeIdleSocket:
+    def __init__(self, buffered):
+        self.buffered = buffered
+
+    def pending(self):
+        return self.buffered()
+
+
+class _FakeIdleIMAP:
+    def __init__(self, lines, untagged=None):
+        self.lines = list(lines)
+        self.sent = []
+        self.untagged_responses = untagged or {}
+        self.sock = _FakeIdleSocket(lambda: bool(self.lines))
+
+    def _new_tag(self):
+        return b"A7"
+
+    def send(self, data):
+        self.sent.append(data)
+
+    def _get_line(self):
+        return self.lines.pop(0)
+
+    def _get_tagged_response(self, tag):
+        self.lines.clear()
+        return "OK", [b"IDLE terminated"]
+
+
+def test_idle_ignores_expunge_and_wakes_on_higher_exists(monkeypatch):
+    monkeypatch.setattr("app.imap.yahoo_client.select.select", lambda r, w, x, timeout: ([], [], []))
+    fake = _FakeIdleIMAP([b"+ idling", b"* 3 EXPUNGE", b"* 4 EXISTS", b"* 5 EXISTS", b"* 9 EXISTS"])
+    client = _client(fake)
+    client._selected = MailboxStatus("INBOX", True, 7, 5)
+
+    result = client.idle(timeout_seconds=60)
+
+    assert result.new_mail is True
+    assert [event.kind for event in result.events] == ["EXPUNGE", "EXISTS", "EXISTS"]
+    assert fake.sent == [b"A7 IDLE\r\n", b"DONE\r\n"]
+    assert client._selected.exists == 5
+
+
+def test_idle_times_out_without_new_mail_and_keeps_connection(monkeypatch):
+    monkeypatch.setattr("app.imap.yahoo_client.select.select", lambda r, w, x, timeout: ([], [], []))
+    fake = _FakeIdleIMAP([b"+ idling"], untagged={"EXISTS": [b"8"], "EXPUNGE": [b"2"]})
+    client = _client(fake)
+    client._selected = MailboxStatus("INBOX", True, 7, 5)
+
+    result = client.idle(timeout_seconds=60)
+
+    assert result.new_mail is False
+    assert result.events == []
+    assert client._selected.exists == 7
+
+
+class _FakeLiteralIMAP:
+    def __init__(self, lines, literal):
+        self.lines = list(lines)
+        self.literal = literal
+        self.reads = []
+        self.tagged_commands = {}
+
+    def _command(self, *args):
+        self.tagged_commands[b"A9"] = None
+        return b"A9"
+
+    def _get_line(self):
+        return self.lines.pop(0)
+
+    def read(self, size):
+        self.reads.append(size)
+        chunk, self.literal = self.literal[:size], self.literal[size:]
+        return chunk
+
+
+def test_fetch_rfc822_file_streams_literal_in_chunks_and_hashes_it(monkeypatch):
+    monkeypatch.setattr("app.imap.yahoo_client.RFC822_READ_CHUNK_BYTES", 4)
+    raw = b"Subject: hi\r\n\r\nBody"
+    fake = _FakeLiteralIMAP(
+        [
+            b"* 3 EXISTS",
+            f"* 1 FETCH (UID 42 BODY[] {{{len(raw)}}}".encode(),
+            b' FLAGS (\\Seen) INTERNALDATE "17-Jul-1996 02:44:25 -0700")',
+            b"A9 OK FETCH completed",
+        ],
+        raw,
+    )
+    client = _client(fake)
+
+    download = client.fetch_rfc822_file(42, max_memory_bytes=8)
+
+    with download.file:
+        assert download.file.read() == raw
+        assert download.file._rolled is True
+    assert download.size == len(raw)
+    assert download.sha256_hex == hashlib.sha256(raw).hexdigest()
+    assert download.flags == ["\\Seen"]
+    assert download.internaldate == "17-Jul-1996 02:44:25 -0700"
+    assert max(fake.reads) == 4
+    assert fake.tagged_commands == {}
+
+
+def test_fetch_partial_appends_requested_range_to_sink():
+    fake = _FakeLiteralIMAP(
+        [b"* 1 FETCH (UID 42 BODY[]<4> {6}", b")", b"A9 OK FETCH completed"],
+        b"ect: h",
+    )
+    commands = []
+
+    def _command(*args):
+        commands.append(args)
+        fake.tagged_commands[b"A9"] = None
+        return b"A9"
+
+    fake._command = _command
+    client = _client(fake)
+    sink = io.BytesIO(b"Subj")
+    sink.seek(0, io.SEEK_END)
+
+    written = client.fetch_partial(42, 4, 6, sink)
+
+    assert written == 6
+    assert sink.getvalue() == b"Subject: h"
+    assert commands == [("UID", "FETCH", "42", "(UID BODY.PEEK[]<4.6>)")]
+
+
+def test_fetch_partial_keeps_a_literal_pushed_for_another_uid_out_of_the_sink():
+    fake = _FakeLiteralIMAP(
+        [
+            b"* 2 FETCH (BODY[]<4> {5}",
+            b" UID 99)",
+            b"* 1 FETCH (UID 42 BODY[]<4> {6}",
+            b")",
+            b"A9 OK FETCH completed",
+        ],
+        b"OTHERect: h",
+    )
+    client = _client(fake)
+    sink = io.BytesIO(b"Subj")
+    sink.seek(0, io.SEEK_END)
+
+    written = client.fetch_partial(42, 4, 6, sink)
+
+    assert written == 6
+    assert sink.getvalue() == b"Subject: h"
+    assert fake.tagged_commands == {}
@@ -0,0 +1,3 @@
+ALTER TABLE mailboxes ADD COLUMN uidnext INTEGER;
+ALTER TABLE mailboxes ADD COLUMN highest_modseq INTEGER;
+ALTER TABLE mailboxes ADD COLUMN exists_count INTEGER;
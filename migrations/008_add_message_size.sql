@@ -0,0 +1 @@
+ALTER TABLE messages ADD COLUMN rfc822_size INTEGER;
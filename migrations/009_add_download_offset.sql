@@ -0,0 +1 @@
+ALTER TABLE messages ADD COLUMN download_offset INTEGER NOT NULL DEFAULT 0;
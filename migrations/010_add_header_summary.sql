@@ -0,0 +1 @@
+ALTER TABLE messages ADD COLUMN headers_json TEXT;
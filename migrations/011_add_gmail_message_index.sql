@@ -0,0 +1,19 @@
+-- Message-ID -> Gmail ids for messages we delivered ourselves, consulted
+-- before asking Gmail to resolve threads or detect Sent duplicates.
+
+CREATE TABLE IF NOT EXISTS gmail_message_index (
+  account_id INTEGER NOT NULL,
+  rfc822_message_id TEXT NOT NULL,
+  gmail_message_id TEXT NOT NULL,
+  gmail_thread_id TEXT NOT NULL,
+  created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (account_id, rfc822_message_id)
+);
+
+INSERT OR IGNORE INTO gmail_message_index(account_id, rfc822_message_id, gmail_message_id, gmail_thread_id)
+SELECT account_id, message_id, gmail_message_id, gmail_thread_id
+  FROM messages
+ WHERE state = 'INSERTED'
+   AND message_id IS NOT NULL
+   AND gmail_message_id IS NOT NULL
+   AND gmail_thread_id IS NOT NULL;
@@ -0,0 +1,14 @@
+-- Progress of the background Gmail mirror that fills gmail_message_index with
+-- every message in the mailbox, not just the ones we delivered.
+
+CREATE TABLE IF NOT EXISTS gmail_mirror_state (
+  account_id INTEGER PRIMARY KEY,
+  history_id TEXT NOT NULL,
+  seed_page_token TEXT,
+  seeded INTEGER NOT NULL DEFAULT 0,
+  synced_at TEXT,
+  updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_gmail_message_index_gmail_id
+  ON gmail_message_index(account_id, gmail_message_id);
@@ -0,0 +1,24 @@
+-- Gmail can hold several copies of one Message-ID (the INBOX and Sent copies
+-- of self-addressed mail, for example). Key the index by Gmail id so deleting
+-- one copy leaves the others findable by Message-ID.
+
+CREATE TABLE gmail_message_index_new (
+  account_id INTEGER NOT NULL,
+  rfc822_message_id TEXT NOT NULL,
+  gmail_message_id TEXT NOT NULL,
+  gmail_thread_id TEXT NOT NULL,
+  created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (account_id, gmail_message_id)
+);
+
+INSERT OR IGNORE INTO gmail_message_index_new(
+  account_id, rfc822_message_id, gmail_message_id, gmail_thread_id, created_at
+)
+SELECT account_id, rfc822_message_id, gmail_message_id, gmail_thread_id, created_at
+  FROM gmail_message_index;
+
+DROP TABLE gmail_message_index;
+ALTER TABLE gmail_message_index_new RENAME TO gmail_message_index;
+
+CREATE INDEX IF NOT EXISTS idx_gmail_message_index_rfc822_id
+  ON gmail_message_index(account_id, rfc822_message_id);